@@ -3,11 +3,19 @@ Chat & Query Routes — BAAP AI v2
 Thin HTTP adapter. All business logic lives in core/smart_router.py.
 """
 
-from fastapi import APIRouter, HTTPException
+import json
+import queue
+import threading
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Literal, Optional
 
 from core.smart_router import route
+from processing.query_guard import QueryGuardError
+from processing.result_store import get_result_page
+from processing.result_stream import open_export_stream, open_result_stream
 from rag.vector_store import get_store_stats
 
 router = APIRouter()
@@ -20,6 +28,8 @@ class DBConfig(BaseModel):
     username: str
     password: str
     database: str
+    pool_min_size: Optional[int] = None
+    pool_max_size: Optional[int] = None
 
 
 class QueryRequest(BaseModel):
@@ -27,6 +37,33 @@ class QueryRequest(BaseModel):
     question: str
     sql_override: Optional[str] = None
     chat_context: Optional[str] = None
+    # "columnar": data = one array per column, low-cardinality text dictionary-encoded
+    result_format: Literal["rows", "columnar"] = "rows"
+
+
+class StreamRequest(BaseModel):
+    db_config: DBConfig
+    sql: str                                        # e.g. sql_query from a previous /query response
+    format: Literal["arrow", "ndjson"] = "arrow"    # arrow falls back to ndjson without pyarrow
+    max_rows: Optional[int] = None                  # None = the complete result
+
+
+class ExportRequest(BaseModel):
+    db_config: DBConfig
+    sql: str
+    format: Literal["csv", "parquet"] = "csv"
+
+
+def _error_detail(e: Exception) -> str:
+    error_msg = str(e)
+    if "429" in error_msg or "Resource exhausted" in error_msg:
+        return "Google Gemini Free-Tier limit reached. The AI requires a short cooldown. Please wait 1 minute and try your question again!"
+    return error_msg
+
+
+def _sse(event: str, payload: Any) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n".encode("utf-8")
+
 
 @router.get("/documents")
 def list_documents():
@@ -59,12 +96,103 @@ def run_query(req: QueryRequest):
             db_config=req.db_config.model_dump(),
             sql_override=req.sql_override,
             chat_context=req.chat_context,
+            result_format=req.result_format,
         )
         return result
     except Exception as e:
-        error_msg = str(e)
-        if "429" in error_msg or "Resource exhausted" in error_msg:
-            friendly_msg = "Google Gemini Free-Tier limit reached. The AI requires a short cooldown. Please wait 1 minute and try your question again!"
-            raise HTTPException(status_code=500, detail=friendly_msg)
-            
-        raise HTTPException(status_code=500, detail=error_msg)
+        raise HTTPException(status_code=500, detail=_error_detail(e))
+
+
+@router.post("/query/events")
+def run_query_events(req: QueryRequest):
+    """
+    /query as server-sent events: each pipeline stage is sent as soon as it is
+    done (intent, sql_query, data, metrics, chart_config, insights, suggestions —
+    see core/smart_router.py), then "done" with the complete /query response,
+    or "error" with {"message"}.
+    """
+    events: "queue.Queue" = queue.Queue()
+
+    def _run():
+        try:
+            result = route(
+                question=req.question,
+                db_config=req.db_config.model_dump(),
+                sql_override=req.sql_override,
+                chat_context=req.chat_context,
+                result_format=req.result_format,
+                on_event=lambda event, payload: events.put((event, payload)),
+            )
+            events.put(("done", result))
+        except Exception as e:
+            events.put(("error", {"message": _error_detail(e)}))
+        finally:
+            events.put(None)
+
+    threading.Thread(target=_run, name="query-events", daemon=True).start()
+
+    def _body():
+        while True:
+            try:
+                item = events.get(timeout=15)
+            except queue.Empty:
+                yield b": keep-alive\n\n"   # comment line — keeps proxies from closing an idle stream
+                continue
+            if item is None:
+                return
+            yield _sse(*item)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(_body(), media_type="text/event-stream", headers=headers)
+
+
+@router.post("/query/stream")
+def stream_query_results(req: StreamRequest):
+    """
+    Streams the complete result of a SELECT as Arrow IPC record batches
+    (or NDJSON rows), straight from a server-side cursor.
+    """
+    try:
+        media_type, body = open_result_stream(
+            req.db_config.model_dump(), req.sql, req.format, req.max_rows
+        )
+    except QueryGuardError as e:
+        raise HTTPException(status_code=422, detail=e.to_dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    # Content-Type tells the client which format it actually got
+    return StreamingResponse(body, media_type=media_type)
+
+
+@router.post("/export")
+def export_results(req: ExportRequest):
+    """
+    Downloads the complete result of a SELECT as CSV or Parquet, streamed
+    in chunks from a server-side cursor (no 500-row cap).
+    """
+    try:
+        media_type, body = open_export_stream(req.db_config.model_dump(), req.sql, req.format)
+    except QueryGuardError as e:
+        raise HTTPException(status_code=422, detail=e.to_dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    headers = {"Content-Disposition": f'attachment; filename="query_result.{req.format}"'}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
+@router.get("/results/{result_id}")
+def get_results(result_id: str, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1)):
+    """
+    Serves one page of a stored query result (result_id from /query).
+    Capped results start with status "preview" (the rows /query returned). The
+    first page past them spills the full result to disk in the background; until
+    that finishes such pages are empty and status is "materializing".
+    """
+    page = get_result_page(result_id, offset, limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired. Run the query again.")
+    return page
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, HTTPException, File, UploadFile, Form
 from pydantic import BaseModel
+from typing import Optional
 import json
 import logging
 
-from ingestion.db_loader import get_connection, get_schema
+from ingestion.db_loader import get_connection
+from ingestion.schema_cache import get_cached_schema, invalidate_schema
+from processing.query_cache import invalidate_tables
 from ingestion.csv_loader import load_csv_excel
 from ingestion.pdf_loader import load_pdf
 from ingestion.docx_loader import load_docx
@@ -21,14 +24,18 @@ class DBConfig(BaseModel):
     username: str
     password: str
     database: str
+    pool_min_size: Optional[int] = None
+    pool_max_size: Optional[int] = None
 
 @router.post("/connect")
 def connect_database(config: DBConfig):
     """Test DB connection and return schema"""
     try:
         conn = get_connection(config.model_dump())
-        schema = get_schema(conn, config.db_type)
-        conn.close()
+        try:
+            schema = get_cached_schema(conn, config.model_dump())
+        finally:
+            conn.close()
         return {
             "status": "connected",
             "database": config.database,
@@ -52,14 +59,16 @@ async def upload_file(
         # Read file bytes once for reuse across DB + RAG pipeline
         file_bytes = await file.read()
 
-        # Connect to DB
-        conn = get_connection(db_config)
-        
         if filename.endswith(('.csv', '.xlsx', '.xls')):
             import io
             file.file = io.BytesIO(file_bytes)  # rewind for csv_loader
-            result = load_csv_excel(file, db_config, conn)
-            conn.close()
+            conn = get_connection(db_config)
+            try:
+                result = load_csv_excel(file, db_config, conn)
+            finally:
+                conn.close()
+            invalidate_schema(db_config)
+            invalidate_tables(db_config, [result["table"]])   # the table was replaced
             return result
             
         elif filename.endswith(('.pdf', '.docx')):
@@ -70,47 +79,52 @@ async def upload_file(
             else:
                 text_content = load_docx(file)
 
-            cursor = conn.cursor()
+            conn = get_connection(db_config)
+            try:
+                cursor = conn.cursor()
             
-            # Create table if not exists
-            if db_config['db_type'] == 'mysql':
-                create_table_sql = """
-                CREATE TABLE IF NOT EXISTS uploaded_documents (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    filename VARCHAR(255),
-                    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    content_text LONGTEXT
-                );
-                """
-            elif db_config['db_type'] == 'sqlite':
-                create_table_sql = """
-                CREATE TABLE IF NOT EXISTS uploaded_documents (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    filename VARCHAR(255),
-                    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    content_text TEXT
-                );
-                """
-            else:
-                create_table_sql = """
-                CREATE TABLE IF NOT EXISTS uploaded_documents (
-                    id SERIAL PRIMARY KEY,
-                    filename VARCHAR(255),
-                    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    content_text TEXT
-                );
-                """
+                # Create table if not exists
+                if db_config['db_type'] == 'mysql':
+                    create_table_sql = """
+                    CREATE TABLE IF NOT EXISTS uploaded_documents (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        filename VARCHAR(255),
+                        upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        content_text LONGTEXT
+                    );
+                    """
+                elif db_config['db_type'] == 'sqlite':
+                    create_table_sql = """
+                    CREATE TABLE IF NOT EXISTS uploaded_documents (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        filename VARCHAR(255),
+                        upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        content_text TEXT
+                    );
+                    """
+                else:
+                    create_table_sql = """
+                    CREATE TABLE IF NOT EXISTS uploaded_documents (
+                        id SERIAL PRIMARY KEY,
+                        filename VARCHAR(255),
+                        upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        content_text TEXT
+                    );
+                    """
             
-            cursor.execute(create_table_sql)
+                cursor.execute(create_table_sql)
             
-            # Insert document
-            if db_config['db_type'] == 'sqlite':
-                insert_sql = "INSERT INTO uploaded_documents (filename, content_text) VALUES (?, ?)"
-            else:
-                insert_sql = "INSERT INTO uploaded_documents (filename, content_text) VALUES (%s, %s)"
-            cursor.execute(insert_sql, (filename, text_content))
-            conn.commit()
-            conn.close()
+                # Insert document
+                if db_config['db_type'] == 'sqlite':
+                    insert_sql = "INSERT INTO uploaded_documents (filename, content_text) VALUES (?, ?)"
+                else:
+                    insert_sql = "INSERT INTO uploaded_documents (filename, content_text) VALUES (%s, %s)"
+                cursor.execute(insert_sql, (filename, text_content))
+                conn.commit()
+            finally:
+                conn.close()
+            invalidate_schema(db_config)
+            invalidate_tables(db_config, ["uploaded_documents"])
 
             # ── RAG Indexing (non-blocking — failure won't break upload) ──
             rag_indexed = False
@@ -133,7 +147,6 @@ async def upload_file(
             }
 
         else:
-            conn.close()
             raise HTTPException(status_code=400, detail="Unsupported file format. Please upload CSV, Excel, PDF, or Docx.")
 
     except Exception as e:
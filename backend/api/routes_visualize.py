@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from ingestion.db_loader import get_connection, get_schema
+from typing import Optional
+from ingestion.db_loader import get_connection
+from ingestion.schema_cache import get_cached_schema
 
 router = APIRouter()
 
@@ -11,14 +13,18 @@ class DBConfig(BaseModel):
     username: str
     password: str
     database: str
+    pool_min_size: Optional[int] = None
+    pool_max_size: Optional[int] = None
 
 @router.post("/schema")
 def get_db_schema(config: DBConfig):
     """Get database schema only"""
     try:
         conn = get_connection(config.model_dump())
-        schema = get_schema(conn, config.db_type)
-        conn.close()
+        try:
+            schema = get_cached_schema(conn, config.model_dump())
+        finally:
+            conn.close()
         return {"schema": schema}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,69 @@
+"""
+Serialization Benchmark — BAAP AI v2
+Compares the old per-cell conversion loop with processing.result_serializer
+on synthetic driver rows (ints, floats, text, dates, Decimals, NULLs).
+
+Run from backend/:
+    python -m benchmarks.bench_serialization [rows]
+"""
+
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from processing.result_serializer import serialize_rows
+
+COLUMNS = ["id", "customer", "amount", "price", "ordered_at", "shipped_on", "note"]
+
+
+def _make_rows(n: int):
+    start = datetime(2024, 1, 1)
+    return [
+        (
+            i,
+            f"customer_{i % 997}",
+            i * 1.25,
+            Decimal(i % 1000) / 100,
+            start + timedelta(minutes=i),
+            (start + timedelta(days=i % 365)).date() if i % 7 else None,
+            None if i % 3 else "gift",
+        )
+        for i in range(n)
+    ]
+
+
+def _per_cell(rows):
+    """The conversion loop execute_query used before result_serializer."""
+    clean_rows = []
+    for row in rows:
+        clean_row = []
+        for val in row:
+            if val is None:
+                clean_row.append(None)
+            elif hasattr(val, "isoformat"):
+                clean_row.append(val.isoformat())
+            elif isinstance(val, bytes):
+                clean_row.append(val.decode("utf-8", errors="replace"))
+            elif isinstance(val, (int, float, str, bool)):
+                clean_row.append(val)
+            else:
+                clean_row.append(str(val))
+        clean_rows.append(tuple(clean_row))
+    return clean_rows
+
+
+def main(n: int = 100_000, repeat: int = 5) -> None:
+    rows = _make_rows(n)
+    plain = [r[:4:2] + (r[1],) for r in rows]   # int / float / text only
+    assert _per_cell(rows) == serialize_rows(COLUMNS, rows)
+
+    print(f"{n:,} rows, best of {repeat}")
+    for label, data in (("mixed types", rows), ("JSON-safe only", plain)):
+        old = min(timeit.repeat(lambda: _per_cell(data), number=1, repeat=repeat))
+        new = min(timeit.repeat(lambda: serialize_rows(COLUMNS, data), number=1, repeat=repeat))
+        print(f"  {label:<15} per-cell {old * 1000:8.1f} ms   column-wise {new * 1000:8.1f} ms   ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -1,10 +1,13 @@
 import os
 from dotenv import load_dotenv
 
-def load_environment():
-    """Loads environment variables from .env file"""
-    env_path = os.path.join(os.path.dirname(__file__), ".env")
-    load_dotenv(dotenv_path=env_path)
+def env_file_path() -> str:
+    """Path of the backend .env file"""
+    return os.path.join(os.path.dirname(__file__), ".env")
+
+def load_environment(override: bool = False):
+    """Loads environment variables from .env file (override=True: .env wins over the current values)"""
+    load_dotenv(dotenv_path=env_file_path(), override=override)
 
 def get_db_url(db_config: dict) -> str:
     """Helper to construct SQL Alchemy DB URL from config"""
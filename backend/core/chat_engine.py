@@ -5,7 +5,9 @@ Uses a professional BAAP AI system prompt injected into every Gemini call.
 """
 
 import logging
-from core.llm import get_llm_model
+from typing import Callable, Optional
+
+from core.llm import generate_text, get_llm_model
 
 logger = logging.getLogger(__name__)
 
@@ -35,17 +37,18 @@ Format guidelines:
 
 # ── Engine ────────────────────────────────────────────────────────────────────
 
-def handle_chat(question: str) -> str:
+def handle_chat(question: str, on_token: Optional[Callable[[str], None]] = None) -> str:
     """
     Generate a conversational response using Gemini with the BAAP AI system prompt.
 
     Args:
         question: The user's free-form question or message.
+        on_token: Optional callback; the response is streamed to it chunk by chunk.
 
     Returns:
         A natural language response string.
     """
-    model = get_llm_model()
+    model = get_llm_model("chat")
 
     full_prompt = f"""{SYSTEM_PROMPT}
 
@@ -54,8 +57,7 @@ USER: {question}
 BAAP AI:"""
 
     try:
-        response = model.generate_content(full_prompt)
-        answer = response.text.strip()
+        answer = generate_text(model, full_prompt, on_token).strip()
         logger.info("Chat engine responded successfully.")
         return answer
 
@@ -72,10 +74,11 @@ BAAP AI:"""
         return f"I encountered an error processing your message. Please try again."
 
 
-def handle_greeting(question: str) -> str:
+def handle_greeting(question: str, on_token: Optional[Callable[[str], None]] = None) -> str:
     """
     Specific handler for greetings — lightweight, fast response.
     Falls back to handle_chat if LLM errors out.
+    on_token: optional callback; the response is streamed to it chunk by chunk.
     """
     greetings_prompt = f"""{SYSTEM_PROMPT}
 
@@ -86,10 +89,9 @@ USER: {question}
 
 BAAP AI:"""
 
-    model = get_llm_model()
+    model = get_llm_model("greeting")
     try:
-        response = model.generate_content(greetings_prompt)
-        return response.text.strip()
+        return generate_text(model, greetings_prompt, on_token).strip()
     except Exception as e:
         logger.warning("Greeting handler fallback: %s", str(e))
         return (
@@ -1,12 +1,280 @@
+"""
+LLM Client — BAAP AI v2
+Process-wide Gemini client manager.
+
+get_llm_model(caller) hands out one shared model per (model name, API key,
+generation settings) instead of configuring the SDK and building a new
+GenerativeModel on every call — genai.configure() resets the SDK's clients, so
+calling it once keeps the underlying gRPC channel / connections alive.
+
+Hot reload: settings are read from the environment on every call, and the .env
+file is re-read when it changes (checked at most every LLM_RELOAD_INTERVAL
+seconds, default 5). A new key, MODEL_NAME, LLM_TEMPERATURE or
+LLM_MAX_OUTPUT_TOKENS takes effect on the next call; reload_llm() forces it.
+
+Repeated prompts are answered from core.llm_cache. Every other
+generate_content call goes through core.rate_limiter (priority, quota,
+429 backoff and retries) and is counted per model and caller (sql, insights,
+suggestions, commentary, chat, rag, ...) with token usage and a latency
+histogram — see get_llm_stats().
+"""
+
+import logging
 import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
 import google.generativeai as genai
 
-def get_llm_model():
-    """Configures and returns the Gemini GenerativeModel"""
+from config import env_file_path, load_environment
+from core import llm_cache, rate_limiter
+from utils.helpers import env_float, env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+# Latency histogram bucket upper bounds, in milliseconds (last bucket: +Inf)
+_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+# ── Module State ──────────────────────────────────────────────────────────────
+
+_models: Dict[Tuple, Any] = {}           # settings key → GenerativeModel
+_configured_key: Optional[str] = None    # API key genai is configured with
+_env_mtime: Optional[float] = None
+_env_checked_at = 0.0
+_lock = threading.Lock()
+_stats: Dict[Tuple[str, str], Dict[str, Any]] = {}   # (model, caller) → counters
+_stats_lock = threading.Lock()
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _maybe_reload_env() -> None:
+    """Re-read .env when the file changed since the last check."""
+    global _env_mtime, _env_checked_at
+    now = time.monotonic()
+    if now - _env_checked_at < env_float("LLM_RELOAD_INTERVAL", 5.0):
+        return
+    _env_checked_at = now
+    try:
+        mtime = os.path.getmtime(env_file_path())
+    except OSError:
+        return
+    if _env_mtime is not None and mtime != _env_mtime:
+        load_environment(override=True)
+        logger.info("LLM settings reloaded from .env")
+    _env_mtime = mtime
+
+
+def _settings() -> Tuple[str, str, Optional[Dict[str, Any]]]:
     api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY or GOOGLE_API_KEY is not set in environment or .env file")
+    generation_config = {}
+    if os.getenv("LLM_TEMPERATURE"):
+        generation_config["temperature"] = env_float("LLM_TEMPERATURE", 1.0)
+    if os.getenv("LLM_MAX_OUTPUT_TOKENS"):
+        generation_config["max_output_tokens"] = env_int("LLM_MAX_OUTPUT_TOKENS", 2048)
+    return api_key, env_str("MODEL_NAME", "gemini-1.5-flash"), generation_config or None
+
+
+def _usage(response, prompt: Any, text: str) -> Tuple[int, int]:
+    """(prompt, output) tokens as reported by the API, else estimated at ~4 characters per token."""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    return prompt_tokens or len(str(prompt)) // 4, output_tokens or len(text) // 4
+
+
+def _record(
+    model_name: str,
+    caller: str,
+    started: float,
+    error: bool,
+    streamed: bool,
+    tokens: Tuple[int, int] = (0, 0),
+) -> None:
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    bucket = next((i for i, bound in enumerate(_BUCKETS_MS) if elapsed_ms <= bound), len(_BUCKETS_MS))
+    with _stats_lock:
+        entry = _stats.setdefault((model_name, caller), {
+            "calls": 0, "errors": 0, "streamed": 0, "total_ms": 0.0, "max_ms": 0.0,
+            "prompt_tokens": 0, "output_tokens": 0,
+            "buckets": [0] * (len(_BUCKETS_MS) + 1),
+        })
+        entry["calls"] += 1
+        entry["errors"] += int(error)
+        entry["streamed"] += int(streamed)
+        entry["prompt_tokens"] += tokens[0]
+        entry["output_tokens"] += tokens[1]
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        entry["buckets"][bucket] += 1
+
+
+class _CachedResponse:
+    """Stands in for a GenerateContentResponse (or stream chunk) served from llm_cache."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _InstrumentedModel:
+    """GenerativeModel proxy that times every generate_content call for one caller."""
+
+    def __init__(self, model, model_name: str, caller: str, settings_key: Tuple, use_cache: bool):
+        self._model = model
+        self.model_name = model_name
+        self.caller = caller
+        self._settings_key = settings_key
+        self._use_cache = use_cache
+
+    def generate_content(self, *args, **kwargs):
+        streamed = bool(kwargs.get("stream"))
+        prompt = args[0] if args else kwargs.get("contents", "")
+
+        cache_key = None
+        if self._use_cache and isinstance(prompt, str) and llm_cache.ttl_for(self.caller) > 0:
+            cache_key = llm_cache.make_key(self.model_name, self._settings_key, prompt)
+            text = llm_cache.lookup(self.caller, cache_key)
+            if text is not None:
+                return iter([_CachedResponse(text)]) if streamed else _CachedResponse(text)
+
+        # Admission, retries after 429s and backoff are handled by core.rate_limiter
+        tokens = rate_limiter.estimate_tokens(prompt)
+        optional = rate_limiter.caller_priority(self.caller) == rate_limiter.PRIORITY_OPTIONAL
+        retries = 0 if optional else env_int("LLM_MAX_RETRIES", 2)
+        for attempt in range(retries + 1):
+            rate_limiter.acquire(self.caller, tokens)
+            started = time.perf_counter()
+            try:
+                response = self._model.generate_content(*args, **kwargs)
+            except Exception as e:
+                throttled = rate_limiter.is_throttle_error(e)
+                rate_limiter.release(throttled=throttled)
+                _record(self.model_name, self.caller, started, error=True, streamed=streamed)
+                if throttled and attempt < retries:
+                    continue   # the next acquire waits out the cooldown
+                raise
+            if not streamed:
+                rate_limiter.release()
+                try:
+                    text = response.text
+                except ValueError:   # blocked / empty candidate — nothing worth caching
+                    text = None
+                _record(self.model_name, self.caller, started, error=False, streamed=False,
+                        tokens=_usage(response, prompt, text or ""))
+                if cache_key is not None and text is not None:
+                    llm_cache.store(self.caller, cache_key, text)
+                return response
+            return self._timed_stream(response, started, prompt, cache_key)
+
+    def _timed_stream(self, response, started: float, prompt: Any, cache_key: Optional[str]) -> Iterator[Any]:
+        # A streamed call holds its slot and lasts until its last chunk has been read
+        error = None
+        parts = []
+        chunk = None
+        try:
+            for chunk in response:
+                try:
+                    parts.append(chunk.text)
+                except ValueError:
+                    pass
+                yield chunk
+        except BaseException as e:   # GeneratorExit too: a partial answer is not cached
+            error = e
+            raise
+        finally:
+            text = "".join(parts)
+            throttled = isinstance(error, Exception) and rate_limiter.is_throttle_error(error)
+            rate_limiter.release(throttled=throttled)
+            _record(self.model_name, self.caller, started, error=isinstance(error, Exception), streamed=True,
+                    tokens=_usage(chunk, prompt, text))   # the last chunk carries the usage totals
+            if error is None and cache_key is not None:
+                llm_cache.store(self.caller, cache_key, text)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def get_llm_model(caller: str = "default", cache: bool = True):
+    """
+    Shared Gemini model for the current settings, instrumented for caller.
+    cache=False opts this caller's calls out of the response cache (core/llm_cache.py).
+
+    Raises:
+        ValueError: no GEMINI_API_KEY / GOOGLE_API_KEY is set.
+    """
+    global _configured_key
+    with _lock:
+        _maybe_reload_env()
+        api_key, model_name, generation_config = _settings()
+        if api_key != _configured_key:
+            genai.configure(api_key=api_key)
+            _models.clear()   # models hold the client of the previous key
+            _configured_key = api_key
+        key = (model_name, tuple(sorted((generation_config or {}).items())))
+        model = _models.get(key)
+        if model is None:
+            model = genai.GenerativeModel(model_name, generation_config=generation_config)
+            _models[key] = model
+            logger.info("LLM model ready: %s %s", model_name, generation_config or "")
+    return _InstrumentedModel(model, model_name, caller, key, cache)
+
+
+def reload_llm() -> None:
+    """Re-read .env and rebuild the SDK client and models on the next call."""
+    global _configured_key, _env_mtime
+    load_environment(override=True)
+    with _lock:
+        _models.clear()
+        _configured_key = None
+        _env_mtime = None
+
+
+def get_llm_stats() -> Dict[str, Any]:
+    """Per model / caller call counts, token usage and latency histograms, for /health."""
+    labels = [f"le_{bound}ms" for bound in _BUCKETS_MS] + ["le_inf"]
+    models: Dict[str, Dict[str, Any]] = {}
+    with _stats_lock:
+        for (model_name, caller), entry in _stats.items():
+            models.setdefault(model_name, {})[caller] = {
+                "calls": entry["calls"],
+                "errors": entry["errors"],
+                "streamed": entry["streamed"],
+                "avg_ms": round(entry["total_ms"] / entry["calls"], 1) if entry["calls"] else 0.0,
+                "max_ms": round(entry["max_ms"], 1),
+                "prompt_tokens": entry["prompt_tokens"],
+                "output_tokens": entry["output_tokens"],
+                "latency_histogram": dict(zip(labels, entry["buckets"])),
+            }
+    with _lock:
+        cached = len(_models)
+    return {
+        "cached_models": cached,
+        "models": models,
+        "rate_limiter": rate_limiter.get_rate_limiter_stats(),
+        "response_cache": llm_cache.get_llm_cache_stats(),
+    }
+
 
-    genai.configure(api_key=api_key)
-    model_name = os.getenv("MODEL_NAME", "gemini-1.5-flash")
-    return genai.GenerativeModel(model_name)
+def generate_text(model, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Response text for prompt. With on_token the response is streamed and every
+    chunk is passed to on_token as it arrives; the full text is still returned.
+    """
+    if on_token is None:
+        return model.generate_content(prompt).text
+    parts = []
+    for chunk in model.generate_content(prompt, stream=True):
+        try:
+            text = chunk.text
+        except ValueError:   # chunk without text parts (finish reason / safety metadata only)
+            continue
+        if text:
+            parts.append(text)
+            on_token(text)
+    return "".join(parts)
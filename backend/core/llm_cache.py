@@ -0,0 +1,213 @@
+"""
+LLM Cache — BAAP AI v2
+Response cache for core.llm: a repeated prompt skips the Gemini round trip and
+does not use rate-limited quota.
+
+Key: SHA-256 of (model name, generation settings, prompt). Only the response text
+is kept, which is all callers read.
+
+Tiers:
+    memory  — LRU of LLM_CACHE_MEMORY_ENTRIES responses (default 1000)
+    disk    — SQLite at LLM_CACHE_PATH (default <tmp>/baap_llm_cache/responses.sqlite,
+              outside the source tree: responses contain query data),
+              survives restarts; trimmed to LLM_CACHE_DISK_ENTRIES (default 20000)
+
+TTL per call site, in seconds (0 = never cached), overridable with
+LLM_CACHE_TTL_<CALLER> (e.g. LLM_CACHE_TTL_RAG=600):
+    greeting 7 days · chat, sql, insights, suggestions, commentary 1 day · everything else 1 hour
+
+Opt-out: LLM_CACHE_ENABLED=false for everything, or get_llm_model(caller, cache=False).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.helpers import env_bool, env_float, env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_TTLS = {
+    "greeting": 7 * 86400,
+    "chat": 86400,
+    "sql": 86400,
+    "insights": 86400,
+    "suggestions": 86400,
+    "commentary": 86400,
+}
+_DEFAULT_TTL = 3600
+_TRIM_EVERY = 200   # disk writes between expiry / size trims
+
+
+# ── Module State ──────────────────────────────────────────────────────────────
+
+_memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()   # key → (text, expires_at)
+_lock = threading.Lock()
+_db: Optional[sqlite3.Connection] = None
+_db_failed = False
+_writes = 0
+_stats: Dict[str, Dict[str, int]] = {}   # caller → counters
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _count(caller: str, counter: str) -> None:
+    entry = _stats.setdefault(caller, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0})
+    entry[counter] += 1
+
+
+def _db_path() -> str:
+    default = os.path.join(tempfile.gettempdir(), "baap_llm_cache", "responses.sqlite")
+    return env_str("LLM_CACHE_PATH", default)
+
+
+def _get_db_locked() -> Optional[sqlite3.Connection]:
+    """Shared SQLite connection (used under _lock). None if the file cannot be opened."""
+    global _db, _db_failed
+    if _db is not None or _db_failed:
+        return _db
+    path = _db_path()
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        _db = sqlite3.connect(path, check_same_thread=False)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, caller TEXT, response TEXT,"
+            " expires_at REAL, accessed_at REAL)"
+        )
+        _db.commit()
+    except sqlite3.Error as e:
+        logger.warning("LLM cache: disk tier disabled (%s): %s", path, e)
+        _db, _db_failed = None, True
+    return _db
+
+
+def _remember_locked(key: str, text: str, expires_at: float) -> None:
+    _memory[key] = (text, expires_at)
+    _memory.move_to_end(key)
+    while len(_memory) > env_int("LLM_CACHE_MEMORY_ENTRIES", 1000):
+        _memory.popitem(last=False)
+
+
+def _trim_locked(db: sqlite3.Connection) -> None:
+    db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+    db.execute(
+        "DELETE FROM responses WHERE key NOT IN"
+        " (SELECT key FROM responses ORDER BY accessed_at DESC LIMIT ?)",
+        (env_int("LLM_CACHE_DISK_ENTRIES", 20000),),
+    )
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def ttl_for(caller: str) -> float:
+    """Cache lifetime for caller's responses in seconds; 0 = not cached."""
+    if not env_bool("LLM_CACHE_ENABLED", True):
+        return 0.0
+    return env_float(f"LLM_CACHE_TTL_{caller.upper()}", _DEFAULT_TTLS.get(caller, _DEFAULT_TTL))
+
+
+def make_key(model_name: str, settings: Any, prompt: str) -> str:
+    payload = json.dumps([model_name, settings, prompt], default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def lookup(caller: str, key: str) -> Optional[str]:
+    """Cached response text for key, or None."""
+    now = time.time()
+    with _lock:
+        hit = _memory.get(key)
+        if hit is not None and hit[1] > now:
+            _memory.move_to_end(key)
+            _count(caller, "memory_hits")
+            return hit[0]
+        if hit is not None:
+            del _memory[key]
+
+        db = _get_db_locked()
+        row = None
+        if db is not None:
+            try:
+                row = db.execute(
+                    "SELECT response, expires_at FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    db.commit()
+            except sqlite3.Error as e:
+                logger.warning("LLM cache: disk lookup failed: %s", e)
+                row = None
+        if row is None:
+            _count(caller, "misses")
+            return None
+        _remember_locked(key, row[0], row[1])
+        _count(caller, "disk_hits")
+        return row[0]
+
+
+def store(caller: str, key: str, text: str) -> None:
+    """Cache a response for caller's TTL (no-op when the TTL is 0)."""
+    global _writes
+    ttl = ttl_for(caller)
+    if ttl <= 0 or not text:
+        return
+    now = time.time()
+    with _lock:
+        _remember_locked(key, text, now + ttl)
+        _count(caller, "stores")
+        db = _get_db_locked()
+        if db is None:
+            return
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, caller, response, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, caller, text, now + ttl, now),
+            )
+            _writes += 1
+            if _writes % _TRIM_EVERY == 0:
+                _trim_locked(db)
+            db.commit()
+        except sqlite3.Error as e:
+            logger.warning("LLM cache: disk write failed: %s", e)
+
+
+def clear_llm_cache() -> None:
+    """Drop every cached response, in memory and on disk."""
+    with _lock:
+        _memory.clear()
+        db = _get_db_locked()
+        if db is not None:
+            db.execute("DELETE FROM responses")
+            db.commit()
+
+
+def get_llm_cache_stats() -> Dict[str, Any]:
+    """Hits / misses per caller, for /health."""
+    with _lock:
+        disk_entries = None
+        db = _db   # not opened just for stats
+        if db is not None:
+            try:
+                disk_entries = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            except sqlite3.Error:
+                pass
+        callers = {}
+        for caller, counters in _stats.items():
+            hits = counters["memory_hits"] + counters["disk_hits"]
+            lookups = hits + counters["misses"]
+            callers[caller] = {**counters, "hit_rate": round(hits / lookups, 4) if lookups else 0.0}
+        return {
+            "enabled": env_bool("LLM_CACHE_ENABLED", True),
+            "memory_entries": len(_memory),
+            "disk_entries": disk_entries,
+            "callers": callers,
+        }
@@ -0,0 +1,238 @@
+"""
+Rate Limiter — BAAP AI v2
+One admission gate in front of every Gemini call (core.llm wraps generate_content).
+
+Limits (environment, read at call time):
+    LLM_RPM              — requests per minute (default 15, the Gemini free tier)
+    LLM_TPM              — prompt + response tokens per minute (default 1,000,000;
+                           estimated at ~4 characters per token)
+    LLM_MAX_CONCURRENCY  — calls in flight at once (default 4)
+
+Priority queue — waiting calls are admitted strictly by priority, FIFO within one:
+    0  sql                        the answer depends on it
+    1  chat, greeting, rag, ...   user-facing text
+    2  insights, suggestions,     optional — dropped instead of queued for long
+       commentary
+
+Adaptive backoff: a 429 / "resource exhausted" answer pauses all admissions for
+an exponentially growing cooldown (LLM_BACKOFF_BASE … LLM_BACKOFF_MAX seconds)
+and halves the request rate; every successful call wins back 5% of it.
+
+Waiting is event driven: a waiter parks on its own Event and is woken by the
+call that frees a slot or by a single timer set for the next refill / end of
+cooldown — there is no sleep-and-retry loop. Optional calls wait at most
+LLM_OPTIONAL_QUEUE_TIMEOUT seconds (default 5), everything else LLM_QUEUE_TIMEOUT
+(default 60); after that LLMRateLimitError is raised.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from utils.helpers import env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_SQL = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_OPTIONAL = 2
+
+_CALLER_PRIORITIES = {
+    "sql": PRIORITY_SQL,
+    "insights": PRIORITY_OPTIONAL,
+    "suggestions": PRIORITY_OPTIONAL,
+    "commentary": PRIORITY_OPTIONAL,
+}
+
+_MIN_RATE_FACTOR = 0.25
+_BURST_SECONDS = 10.0   # bucket capacity = this many seconds of refill
+
+
+class LLMRateLimitError(RuntimeError):
+    """No LLM capacity within the caller's wait budget. The message mentions 429 so
+    existing rate-limit handling (chat fallbacks, API error text) applies."""
+
+
+# ── Module State ──────────────────────────────────────────────────────────────
+
+_lock = threading.Lock()
+_queue: list = []                    # heap of (priority, seq, waiter)
+_seq = itertools.count()
+_timer: Optional[threading.Timer] = None
+_timer_at = 0.0                      # monotonic time _timer fires at
+_state = {
+    "requests": None,        # request bucket level (None = not started, i.e. full)
+    "tokens": None,          # token bucket level
+    "refilled_at": time.monotonic(),
+    "active": 0,
+    "cooldown_until": 0.0,
+    "throttle_streak": 0,
+    "rate_factor": 1.0,
+}
+_stats = {"admitted": 0, "throttled": 0, "timed_out": 0, "wait_seconds": 0.0}
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _limits() -> Dict[str, float]:
+    factor = _state["rate_factor"]
+    rpm = max(env_float("LLM_RPM", 15.0), 0.1) * factor
+    tpm = max(env_float("LLM_TPM", 1_000_000.0), 1.0) * factor
+    return {
+        "request_rate": rpm / 60.0,
+        "request_capacity": max(1.0, rpm / 60.0 * _BURST_SECONDS),
+        "token_rate": tpm / 60.0,
+        "token_capacity": max(1.0, tpm / 60.0 * _BURST_SECONDS),
+        "concurrency": max(1, env_int("LLM_MAX_CONCURRENCY", 4)),
+    }
+
+
+def _refill_locked(limits: Dict[str, float], now: float) -> None:
+    elapsed = now - _state["refilled_at"]
+    _state["refilled_at"] = now
+    for level, rate, capacity in (
+        ("requests", limits["request_rate"], limits["request_capacity"]),
+        ("tokens", limits["token_rate"], limits["token_capacity"]),
+    ):
+        current = capacity if _state[level] is None else _state[level]
+        _state[level] = min(capacity, current + elapsed * rate)
+
+
+def _schedule_locked(delay: float) -> None:
+    global _timer, _timer_at
+    delay = max(delay, 0.01)
+    fire_at = time.monotonic() + delay
+    if _timer is not None:
+        if fire_at >= _timer_at:
+            return
+        _timer.cancel()   # capacity frees up sooner than the pending wake-up
+    _timer = threading.Timer(delay, _on_timer)
+    _timer_at = fire_at
+    _timer.daemon = True
+    _timer.start()
+
+
+def _on_timer() -> None:
+    global _timer
+    with _lock:
+        if threading.current_thread() is _timer:   # not a timer replaced while it fired
+            _timer = None
+        _dispatch_locked()
+
+
+def _dispatch_locked() -> None:
+    """Admit queued waiters in priority order while capacity allows."""
+    now = time.monotonic()
+    limits = _limits()
+    _refill_locked(limits, now)
+    while _queue:
+        _priority, _s, waiter = _queue[0]
+        if waiter["cancelled"]:
+            heapq.heappop(_queue)
+            continue
+        if _state["active"] >= limits["concurrency"]:
+            return   # release() dispatches again
+        tokens = min(waiter["tokens"], limits["token_capacity"])
+        delay = max(
+            _state["cooldown_until"] - now,
+            (1.0 - _state["requests"]) / limits["request_rate"],
+            (tokens - _state["tokens"]) / limits["token_rate"],
+        )
+        if delay > 0:
+            _schedule_locked(delay)
+            return
+        heapq.heappop(_queue)
+        _state["requests"] -= 1.0
+        _state["tokens"] -= tokens
+        _state["active"] += 1
+        waiter["admitted"] = True
+        waiter["event"].set()
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def caller_priority(caller: str) -> int:
+    return _CALLER_PRIORITIES.get(caller, PRIORITY_INTERACTIVE)
+
+
+def estimate_tokens(prompt: Any) -> int:
+    """Rough prompt + response token count (~4 characters per token)."""
+    return len(str(prompt)) // 4 + env_int("LLM_EXPECTED_OUTPUT_TOKENS", 512)
+
+
+def acquire(caller: str, tokens: int) -> None:
+    """
+    Wait for an LLM slot (see module docstring). Every successful acquire must be
+    followed by exactly one release().
+
+    Raises:
+        LLMRateLimitError: not admitted within the caller's wait budget.
+    """
+    priority = caller_priority(caller)
+    timeout = (
+        env_float("LLM_OPTIONAL_QUEUE_TIMEOUT", 5.0)
+        if priority == PRIORITY_OPTIONAL
+        else env_float("LLM_QUEUE_TIMEOUT", 60.0)
+    )
+    waiter = {"event": threading.Event(), "tokens": tokens, "admitted": False, "cancelled": False}
+    started = time.monotonic()
+    with _lock:
+        heapq.heappush(_queue, (priority, next(_seq), waiter))
+        _dispatch_locked()
+
+    waiter["event"].wait(timeout)
+    with _lock:
+        _stats["wait_seconds"] += time.monotonic() - started
+        if waiter["admitted"]:
+            _stats["admitted"] += 1
+            return
+        waiter["cancelled"] = True
+        _stats["timed_out"] += 1
+    raise LLMRateLimitError(
+        f"LLM rate limit reached (429): no capacity for '{caller}' within {timeout:.0f}s. "
+        "Please wait a moment and try again."
+    )
+
+
+def release(throttled: bool = False) -> None:
+    """Return an acquired slot. throttled=True when the call was answered with a 429."""
+    with _lock:
+        _state["active"] = max(0, _state["active"] - 1)
+        if throttled:
+            _stats["throttled"] += 1
+            _state["throttle_streak"] += 1
+            backoff = min(
+                env_float("LLM_BACKOFF_MAX", 60.0),
+                env_float("LLM_BACKOFF_BASE", 2.0) * 2 ** (_state["throttle_streak"] - 1),
+            )
+            _state["cooldown_until"] = max(_state["cooldown_until"], time.monotonic() + backoff)
+            _state["rate_factor"] = max(_MIN_RATE_FACTOR, _state["rate_factor"] / 2)
+            _state["requests"] = 0.0
+            logger.warning("LLM throttled (429) — pausing %.1fs, rate now %.0f%%",
+                           backoff, _state["rate_factor"] * 100)
+        else:
+            _state["throttle_streak"] = 0
+            _state["rate_factor"] = min(1.0, _state["rate_factor"] + 0.05)
+        _dispatch_locked()
+
+
+def is_throttle_error(error: Exception) -> bool:
+    text = str(error)
+    return "429" in text or "exhausted" in text.lower()
+
+
+def get_rate_limiter_stats() -> Dict[str, Any]:
+    """Queue / admission counters for /health."""
+    with _lock:
+        waiting = sum(1 for _p, _s, w in _queue if not w["cancelled"] and not w["admitted"])
+        return {
+            **_stats,
+            "wait_seconds": round(_stats["wait_seconds"], 3),
+            "active": _state["active"],
+            "waiting": waiting,
+            "rate_factor": round(_state["rate_factor"], 2),
+            "cooldown_remaining": round(max(0.0, _state["cooldown_until"] - time.monotonic()), 1),
+        }
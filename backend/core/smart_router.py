@@ -9,28 +9,65 @@ Response schema (all fields always present, null if not applicable):
     "answer":       str,
     "sql_query":    str | null,
     "columns":      list | null,
-    "data":         list | null,
+    "data":         list | dict | null,   # row dicts, or a columnar object (result_format="columnar")
     "total_rows":   int | null,
+    "truncated":    bool | null,   # True when total_rows is a lower bound ("more than N")
     "metrics":      dict | null,
     "chart_config": dict | null,
     "insights":     list | null,
     "suggestions":  list | null,
+    "meta":         dict | null,   # pipeline diagnostics (schema pruning, ...)
+    "result_id":    str | null,    # handle for paging the full result via /api/results/{id}
+    "error":        dict | null,   # {"type", "message", "details"} when the query guard stopped the SQL
 }
+
+Progress events (route(on_event=...), used by /api/query/events), each with a
+partial payload of the fields above, in the order the stages finish:
+    intent       {"intent", "mode"}
+    sql_query    {"sql_query"}
+    data         {"columns", "data", "total_rows", "truncated", "result_id"}
+    metrics      {"metrics"}
+    insights     {"insights"}      local statistical insights, right after metrics
+    suggestions  {"suggestions"}   local schema-aware suggestions
+    chart_config {"chart_config"}
+    insights     {"insights"}      ┐ LLM upgrades replacing the local lists (if any): together
+    suggestions  {"suggestions"}   ┘ after the combined call, or whichever call returns first
+    sources      {"sources"}       RAG: source documents, before the answer is generated
+    answer_delta {"text"}          chat / RAG / hybrid: next chunk of the answer as the LLM streams it
 """
 
 import json
 import logging
-from typing import Any, Dict, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Optional, Tuple
 
 from core.intent_classifier import classify_intent
 from core.chat_engine import handle_greeting, handle_chat
-
-from ingestion.db_loader import get_connection, get_schema
-from processing.sql_agent import natural_language_to_sql, execute_query
+from core.rate_limiter import LLMRateLimitError
+
+from ingestion.db_loader import get_connection
+from ingestion.schema_cache import get_cached_schema, get_schema_version
+from processing.sql_agent import natural_language_to_sql, execute_query, count_rows
+from processing.schema_retriever import prune_schema
+from processing.sql_rewriter import rewrite_sql
+from processing.result_set import make_result_set, encode_data
+from processing.result_store import has_result, register_result, set_total_rows
+from processing.query_cache import cached_execute
+from processing.sql_templates import discard_template, learn_template, match_template
+from processing.translation_cache import cached_translation, discard_translation
+from processing.query_guard import QueryGuardError, check_query_cost, statement_timeout
 from intelligence.metrics_engine import generate_metrics
 from intelligence.insight_generator import generate_insights
+from intelligence.local_insights import generate_local_insights
+from intelligence.local_suggestions import generate_local_suggestions, learn_suggestions
+from intelligence.commentary_engine import (
+    MODE_COMBINED, MODE_SEPARATE, commentary_mode, generate_commentary, record_commentary_run,
+)
 from intelligence.suggestion_engine import generate_suggestions
 from visualization.chart_generator import generate_chart_config
+from utils.helpers import env_bool, env_int
 
 # RAG is imported lazily so startup failures don't break the entire app
 import rag.rag_engine as rag_engine
@@ -48,13 +85,192 @@ def _empty_response(mode: str) -> Dict[str, Any]:
         "columns": None,
         "data": None,
         "total_rows": None,
+        "truncated": None,
         "metrics": None,
         "chart_config": None,
         "insights": None,
         "suggestions": None,
+        "meta": None,
+        "error": None,
+        "result_id": None,
     }
 
 
+# ── Analytics Stages ──────────────────────────────────────────────────────────
+
+_analytics_executor: Optional[ThreadPoolExecutor] = None
+_analytics_lock = threading.Lock()
+
+
+def _get_analytics_executor() -> ThreadPoolExecutor:
+    # Shared and bounded (ANALYTICS_WORKERS): each SQL answer holds at most two
+    # workers while its insight / suggestion LLM calls are in flight
+    global _analytics_executor
+    with _analytics_lock:
+        if _analytics_executor is None:
+            _analytics_executor = ThreadPoolExecutor(
+                max_workers=env_int("ANALYTICS_WORKERS", 8), thread_name_prefix="analytics"
+            )
+        return _analytics_executor
+
+
+EventCallback = Optional[Callable[[str, Dict[str, Any]], None]]
+
+_MODES = {
+    "greeting": "chat",
+    "general_chat": "chat",
+    "document_query": "rag",
+    "database_query": "sql",
+    "analytics_query": "sql",
+    "hybrid_query": "hybrid",
+}
+
+
+def _emit(on_event: EventCallback, event: str, payload: Dict[str, Any]) -> None:
+    if on_event is None:
+        return
+    try:
+        on_event(event, payload)
+    except Exception as e:   # a slow / gone client must not fail the query
+        logger.warning("Progress event '%s' not delivered: %s", event, e)
+
+
+def _answer_streamer(on_event: EventCallback) -> Optional[Callable[[str], None]]:
+    """on_token callback that forwards LLM answer chunks as answer_delta events (None = no streaming)."""
+    if on_event is None:
+        return None
+    return lambda text: _emit(on_event, "answer_delta", {"text": text})
+
+
+def _timed(fn: Callable[..., Any], *args) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    value = fn(*args)
+    return value, round((time.perf_counter() - started) * 1000, 1)
+
+
+def _run_analytics(
+    question: str,
+    sql: str,
+    schema: Dict[str, Any],
+    schema_version: str,
+    db_type: str,
+    result: Dict[str, Any],
+    total_rows: Optional[int],
+    on_event: EventCallback = None,
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], list, list, Dict[str, float], Dict[str, Any]]:
+    """
+    (metrics, chart, insights, suggestions, timings_ms, commentary_info) for a query result.
+
+    Insights and suggestions come in two tiers. The local tier is emitted right
+    after the metrics: statistical insights (intelligence/local_insights.py) and
+    schema-aware suggestions (intelligence/local_suggestions.py). The LLM tier is
+    an optional upgrade built on top (INSIGHT_NARRATION / SUGGESTION_LLM_UPGRADE)
+    that replaces a local list when it returns anything.
+
+    LLM modes (ANALYTICS_COMMENTARY_MODE, see commentary_engine.py):
+        combined  both lists from one call (default, when both are wanted); a list
+                  missing from the reply falls back to its own call, a rate-limited
+                  call keeps the local lists
+        separate  two overlapping calls — suggestions only need the result, the
+                  narration starts after the metrics
+    Either way the chart is built while the LLM is in flight, and each stage is
+    reported through on_event as soon as it is done.
+
+    Without on_event (plain /api/query) there is no one to send a late upgrade
+    to: a separate LLM suggestions call is not waited for, its result is only
+    learned into the suggestion pool (learn_suggestions) for later answers.
+    """
+    started = time.perf_counter()
+    executor = _get_analytics_executor()
+    timings: Dict[str, float] = {}
+    outputs: Dict[str, Any] = {}
+    llm_lists = set()
+    if env_bool("INSIGHT_NARRATION", True) and result["row_count"]:   # no rows: nothing to narrate
+        llm_lists.add("insights")
+    if env_bool("SUGGESTION_LLM_UPGRADE", True):
+        llm_lists.add("suggestions")
+    mode = commentary_mode() if len(llm_lists) == 2 else MODE_SEPARATE
+
+    def _learn_later(future) -> None:
+        try:
+            learn_suggestions(schema_version, sql, db_type, future.result()[0])
+        except Exception as e:
+            logger.debug("Background suggestion upgrade failed: %s", e)
+
+    def _submit_separate(names) -> Dict[Any, str]:
+        futures = {}
+        if "suggestions" in names and "suggestions" in llm_lists:
+            future = executor.submit(_timed, generate_suggestions, question, schema, result)
+            if on_event is None:
+                future.add_done_callback(_learn_later)   # don't hold the response for it
+            else:
+                futures[future] = "suggestions"
+        if "insights" in names and "insights" in llm_lists:
+            futures[executor.submit(
+                _timed, generate_insights, question, sql, result, metrics, local_insights
+            )] = "insights"
+        return futures
+
+    futures = _submit_separate({"suggestions"}) if mode == MODE_SEPARATE else {}
+    metrics, timings["metrics"] = _timed(generate_metrics, result)
+    # Stats cover the fetched rows, the KPI the whole result — flag the difference
+    metrics["kpis"]["total_rows"] = total_rows
+    metrics["sampled"] = total_rows is None or total_rows > result["row_count"]
+    metrics["sample_rows"] = result["row_count"]
+    _emit(on_event, "metrics", {"metrics": metrics})
+    local_insights, timings["local_insights"] = _timed(generate_local_insights, result, metrics)
+    _emit(on_event, "insights", {"insights": local_insights})
+    if mode == MODE_SEPARATE:
+        futures.update(_submit_separate({"insights"}))
+    else:
+        commentary_future = executor.submit(
+            _timed, generate_commentary, question, sql, schema, result, metrics, local_insights
+        )
+    local_suggestions, timings["local_suggestions"] = _timed(
+        generate_local_suggestions, question, sql, schema, schema_version, db_type, result
+    )
+    _emit(on_event, "suggestions", {"suggestions": local_suggestions})
+    chart, timings["chart"] = _timed(generate_chart_config, result, question)
+    if metrics["sampled"]:
+        chart["sample_rows"] = result["row_count"]
+    _emit(on_event, "chart_config", {"chart_config": chart})
+
+    throttled = False
+    if mode == MODE_COMBINED:
+        try:
+            commentary, timings["commentary"] = commentary_future.result()
+        except LLMRateLimitError:
+            commentary, throttled = {}, True
+        for name, items in commentary.items():
+            outputs[name] = items
+            _emit(on_event, name, {name: items})
+        if not throttled:
+            futures = _submit_separate({"insights", "suggestions"} - set(commentary))
+    fallback = mode == MODE_COMBINED and bool(futures)
+    for future in as_completed(futures):
+        name = futures[future]
+        outputs[name], timings[name] = future.result()
+        if outputs[name]:   # an empty LLM list (rate limited, failed) leaves the local one shown
+            _emit(on_event, name, {name: outputs[name]})
+    insights = outputs.get("insights") or local_insights
+    suggestions = outputs.get("suggestions") or local_suggestions
+    if outputs.get("suggestions"):
+        learn_suggestions(schema_version, sql, db_type, outputs["suggestions"])
+
+    if result["row_count"] and llm_lists:
+        llm_ms = max(timings.get("insights", 0.0), timings.get("suggestions", 0.0))
+        record_commentary_run(mode, timings.get("commentary", 0.0) + llm_ms, fallback)
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    info = {
+        "mode": mode,
+        "fallback": fallback,
+        "throttled": throttled,
+        "insights_source": "llm" if outputs.get("insights") else "local",
+        "suggestions_source": "llm" if outputs.get("suggestions") else "local",
+    }
+    return metrics, chart, insights, suggestions, timings, info
+
+
 # ── SQL Pipeline ──────────────────────────────────────────────────────────────
 
 def _run_sql_pipeline(
@@ -62,6 +278,8 @@ def _run_sql_pipeline(
     db_config: Dict[str, Any],
     sql_override: Optional[str] = None,
     table_filter: Optional[str] = None,
+    result_format: str = "rows",
+    on_event: EventCallback = None,
 ) -> Dict[str, Any]:
     """
     Full SQL analytics pipeline.
@@ -69,43 +287,140 @@ def _run_sql_pipeline(
     Returns a merged response dict.
     """
     conn = get_connection(db_config)
-    schema = get_schema(conn, db_config["db_type"])
-
-    # If a table filter is applied, we only pass that specific table's schema 
-    # to the AI so it doesn't get confused by other tables.
-    filtered_schema = schema
-    if table_filter and table_filter in schema:
-        filtered_schema = {table_filter: schema[table_filter]}
-
-    sql = sql_override or natural_language_to_sql(question, filtered_schema, db_config["db_type"])
-    columns, rows = execute_query(conn, sql)
-    conn.close()
-
-    data = [dict(zip(columns, row)) for row in rows]
-
-    metrics = generate_metrics(columns, data)
-    chart = generate_chart_config(columns, data, question)
-    insights = generate_insights(question, sql, data, metrics)
-    suggestions = generate_suggestions(question, schema, data)
+    translation = None
+    template = None
+    try:
+        schema = get_cached_schema(conn, db_config)
+
+        # If a table filter is applied, we only pass that specific table's schema 
+        # to the AI so it doesn't get confused by other tables.
+        schema_version = get_schema_version(db_config)
+        filtered_schema = schema
+        pruning = None
+        params = None
+        if sql_override:
+            sql = sql_override
+        else:
+            # Same question shape with different values: bind them into a learned template
+            template = match_template(question, schema_version, table_filter, db_config["db_type"])
+
+        if template is not None:
+            sql, params = template["display_sql"], template["params"]
+            translation = {"status": "template", "similarity": None, "matched_question": template["matched_question"]}
+        elif not sql_override:
+            def _translate() -> str:
+                # Only the filtered table, or the tables relevant to the question (+ their FK joins)
+                nonlocal filtered_schema, pruning
+                if table_filter and table_filter in schema:
+                    filtered_schema = {table_filter: schema[table_filter]}
+                else:
+                    filtered_schema, pruning = prune_schema(
+                        question, schema, schema_version, db_config["db_type"]
+                    )
+                return natural_language_to_sql(question, filtered_schema, db_config["db_type"])
+
+            # Repeated / near-identical questions reuse their SQL without an LLM call
+            sql, translation = cached_translation(question, schema_version, table_filter, _translate, schema)
+        _emit(on_event, "sql_query", {"sql_query": sql})
+
+        # Push a LIMIT of display cap + 1 into the query so only shown rows are produced
+        # (templates run as bound; the fetch cap in execute_query still applies)
+        display_cap = env_int("SQL_DISPLAY_MAX_ROWS", 500)
+        base_sql = template["sql"] if template is not None else sql
+        if template is None:
+            exec_sql, rewrite = rewrite_sql(sql, db_config["db_type"], schema, display_cap)
+        else:
+            exec_sql, rewrite = base_sql, None
+
+        def _execute() -> Dict[str, Any]:
+            # Refuse runaway plans (e.g. cartesian joins) before they hold a connection
+            plan = check_query_cost(conn, exec_sql, db_config["db_type"], schema, params)
+
+            with statement_timeout(conn, db_config["db_type"]):
+                columns, values, has_more = execute_query(
+                    conn, exec_sql, db_config["db_type"], max_rows=display_cap, columnar=True, params=params
+                )
+                result = make_result_set(columns, values)
+
+                # Only the displayed rows are fetched; get the real total of the original query separately
+                total_rows = result["row_count"]
+                capped = has_more
+                if has_more and env_bool("SQL_COUNT_TRUNCATED", True):
+                    counted = count_rows(conn, base_sql, params)
+                    if counted is not None:
+                        total_rows, has_more = counted, False
+            return {"result": result, "total_rows": total_rows, "has_more": has_more, "capped": capped, "plan": plan}
+
+        # Identical queries against the same database share one execution and its cached result
+        executed, cache_status = cached_execute(db_config, exec_sql, _execute, params)
+    except Exception as e:
+        # Never serve SQL that failed again
+        if template is not None:
+            discard_template(question, schema_version, table_filter, db_config["db_type"])
+        elif translation is not None:
+            discard_translation(sql, schema_version, table_filter)
+        if isinstance(e, QueryGuardError):
+            e.details["sql"] = sql   # report the query as generated, not the rewritten form
+        raise
+    finally:
+        conn.close()   # returns the connection to the pool
+
+    if translation is not None and translation["status"] in ("miss", "bypass"):
+        # Fresh LLM SQL that ran: learn its shape for the same question with other values
+        learn_template(question, sql, schema_version, table_filter, db_config["db_type"])
+
+    result = executed["result"]
+    columns = result["columns"]
+    total_rows, has_more = executed["total_rows"], executed["has_more"]
+
+    # Capped results are re-run once in the background and spilled to disk for paging;
+    # a cached result keeps its handle for as long as the handle lives
+    result_id = executed.get("result_id")
+    if not result_id or not has_result(result_id):
+        result_id = register_result(db_config, base_sql, result, executed["capped"], params)
+        if executed["capped"] and not has_more:
+            set_total_rows(result_id, total_rows)
+        executed["result_id"] = result_id
+
+    # Every stage reads the same column arrays; row dicts are only built for the response
+    data = encode_data(result, result_format)
+    _emit(on_event, "data", {
+        "columns": columns, "data": data, "total_rows": total_rows, "truncated": has_more, "result_id": result_id,
+    })
+    metrics, chart, insights, suggestions, timings, commentary = _run_analytics(
+        question, sql, schema, schema_version, db_config["db_type"], result, total_rows, on_event
+    )
 
     # Build a plain-text summary for hybrid mode (never raw data)
     kpis = metrics.get("kpis", {})
+    scope = f" (over the first {result['row_count']} rows only)" if metrics["sampled"] else ""
     sql_summary = (
         f"SQL Query: {sql}\n"
-        f"Rows returned: {kpis.get('total_rows', len(data))}\n"
-        f"Key metrics: {json.dumps(kpis, default=str)}\n"
+        f"Rows returned: {total_rows}{'+' if has_more else ''}\n"
+        f"Key metrics{scope}: {json.dumps(kpis, default=str)}\n"
         f"Top insights: {'; '.join(insights[:2]) if insights else 'none'}"
     )
 
     return {
         "sql": sql,
         "columns": columns,
-        "data": data[:500],
-        "total_rows": len(data),
+        "data": data,
+        "total_rows": total_rows,
+        "truncated": has_more,
         "metrics": metrics,
         "chart": chart,
         "insights": insights,
         "suggestions": suggestions,
+        "meta": {
+            "schema_pruning": pruning,
+            "sql_rewrite": rewrite,
+            "query_plan": executed["plan"],
+            "result_cache": cache_status,
+            "translation_cache": translation,
+            "analytics_ms": timings,   # per-stage wall time; separate insights / suggestions overlap
+            "commentary": commentary,  # mode, fallback, insights_source / suggestions_source ("llm" | "local")
+        },
+        "result_id": result_id,
         "_sql_summary": sql_summary,   # internal use only
     }
 
@@ -117,6 +432,8 @@ def route(
     db_config: Dict[str, Any],
     sql_override: Optional[str] = None,
     chat_context: Optional[str] = None,
+    result_format: str = "rows",
+    on_event: EventCallback = None,
 ) -> Dict[str, Any]:
     """
     Main routing function. Classifies intent and dispatches to engine(s).
@@ -126,6 +443,8 @@ def route(
         db_config:    Database connection config dict.
         sql_override: Optional raw SQL to bypass NL→SQL step.
         chat_context: Optional context string e.g. "doc:file.pdf" or "table:sales"
+        result_format: "rows" (list of row dicts) or "columnar" (see processing/result_set.py)
+        on_event:     Optional callback(event, payload) for progress events (see module docstring).
 
     Returns:
         Unified v2 response dict.
@@ -149,23 +468,31 @@ def route(
                 table_filter = chat_context.replace("table:", "")
                 logger.info("Context forced intent to 'database_query' for %s", table_filter)
 
+    _emit(on_event, "intent", {"intent": intent, "mode": _MODES.get(intent, "chat")})
+    on_token = _answer_streamer(on_event)
+
     # ── Greeting ──────────────────────────────────────────────────────────────
     if intent == "greeting":
         resp = _empty_response("chat")
-        resp["answer"] = handle_greeting(question)
+        resp["answer"] = handle_greeting(question, on_token)
         return resp
 
     # ── General Chat ──────────────────────────────────────────────────────────
     if intent == "general_chat":
         resp = _empty_response("chat")
-        resp["answer"] = handle_chat(question)
+        resp["answer"] = handle_chat(question, on_token)
         return resp
 
     # ── Document / RAG query ──────────────────────────────────────────────────
     if intent == "document_query":
         resp = _empty_response("rag")
         try:
-            rag_result = rag_engine.answer_question(question, document_filter=document_filter)
+            rag_result = rag_engine.answer_question(
+                question,
+                document_filter=document_filter,
+                on_token=on_token,
+                on_sources=lambda sources: _emit(on_event, "sources", {"sources": sources}),
+            )
             resp["answer"] = rag_result["answer"]
             # Store sources as part of the insights field (repurposed for RAG)
             if rag_result.get("sources"):
@@ -179,7 +506,9 @@ def route(
     if intent in ("database_query", "analytics_query"):
         resp = _empty_response("sql")
         try:
-            sql_result = _run_sql_pipeline(question, db_config, sql_override, table_filter)
+            sql_result = _run_sql_pipeline(
+                question, db_config, sql_override, table_filter, result_format, on_event
+            )
             if sql_result.get("insights"):
                 primary_insight = sql_result["insights"][0]
                 if "API rate limit" in primary_insight:
@@ -192,10 +521,19 @@ def route(
             resp["columns"] = sql_result["columns"]
             resp["data"] = sql_result["data"]
             resp["total_rows"] = sql_result["total_rows"]
+            resp["truncated"] = sql_result["truncated"]
             resp["metrics"] = sql_result["metrics"]
             resp["chart_config"] = sql_result["chart"]
             resp["insights"] = sql_result["insights"]
             resp["suggestions"] = sql_result["suggestions"]
+            resp["meta"] = sql_result["meta"]
+            resp["result_id"] = sql_result["result_id"]
+        except QueryGuardError as e:
+            # Rejected or timed-out SQL is a normal answer, not a server error
+            logger.warning("SQL stopped by query guard: %s", e)
+            resp["answer"] = str(e)
+            resp["sql_query"] = e.details.get("sql")
+            resp["error"] = e.to_dict()
         except Exception as e:
             logger.error("SQL pipeline error: %s", e)
             raise   # Re-raise so FastAPI returns a proper 500
@@ -209,23 +547,33 @@ def route(
 
         # Run SQL first
         try:
-            sql_result = _run_sql_pipeline(question, db_config, sql_override, table_filter)
+            sql_result = _run_sql_pipeline(
+                question, db_config, sql_override, table_filter, result_format, on_event
+            )
             resp["sql_query"] = sql_result["sql"]
             resp["columns"] = sql_result["columns"]
             resp["data"] = sql_result["data"]
             resp["total_rows"] = sql_result["total_rows"]
+            resp["truncated"] = sql_result["truncated"]
             resp["metrics"] = sql_result["metrics"]
             resp["chart_config"] = sql_result["chart"]
             resp["insights"] = sql_result["insights"]
             resp["suggestions"] = sql_result["suggestions"]
+            resp["meta"] = sql_result["meta"]
+            resp["result_id"] = sql_result["result_id"]
         except Exception as e:
             sql_error = str(e)
+            if isinstance(e, QueryGuardError):
+                resp["sql_query"] = e.details.get("sql")
+                resp["error"] = e.to_dict()
             logger.warning("Hybrid SQL step failed: %s", sql_error)
 
         # Run RAG + merge
         try:
             sql_summary = sql_result["_sql_summary"] if sql_result else f"SQL failed: {sql_error}"
-            merged_answer = rag_engine.answer_hybrid(question, sql_summary, document_filter=document_filter)
+            merged_answer = rag_engine.answer_hybrid(
+                question, sql_summary, document_filter=document_filter, on_token=on_token
+            )
             resp["answer"] = merged_answer
         except Exception as e:
             logger.error("Hybrid RAG step failed: %s", e)
@@ -0,0 +1,336 @@
+"""
+Connection Pool — BAAP AI v2
+Process-wide registry of reusable DB connections, keyed by a fingerprint of db_config.
+
+Every request used to open a fresh MySQL/PostgreSQL/SQLite connection and close it
+at the end of the pipeline. Pools keep connections alive between requests so the
+TCP + auth handshake is paid once per connection instead of once per request.
+
+Settings (environment, read at pool creation):
+    DB_POOL_MIN_SIZE          — connections kept open even when idle (default 1)
+    DB_POOL_MAX_SIZE          — hard cap on open connections per database (default 5)
+    DB_POOL_IDLE_TIMEOUT      — seconds before an idle connection above min is closed (default 300)
+    DB_POOL_CHECKOUT_TIMEOUT  — seconds to wait for a free connection (default 10)
+    DB_POOL_PING_INTERVAL     — connections idle longer than this are health-checked
+                                on checkout (default 10, 0 = always)
+
+A db_config may carry "pool_min_size" / "pool_max_size" to size its pool individually.
+
+Connections handed out are PooledConnection proxies: they behave like the driver
+connection, and close() returns them to the pool instead of closing the socket.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.helpers import env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+# Keys that identify the target database. Pool sizing keys are deliberately excluded.
+_FINGERPRINT_KEYS = ("db_type", "host", "port", "username", "password", "database")
+
+
+# ── Module State ──────────────────────────────────────────────────────────────
+
+_pools: Dict[str, "ConnectionPool"] = {}
+_registry_lock = threading.Lock()
+
+
+# ── Fingerprint ───────────────────────────────────────────────────────────────
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    """
+    Stable hash identifying the database a db_config points at.
+    Credentials are part of the hash (different users get different pools)
+    but never appear in the fingerprint itself.
+    """
+    ident = {k: str(config.get(k, "")) for k in _FINGERPRINT_KEYS}
+    ident["db_type"] = ident["db_type"].lower()
+    raw = json.dumps(ident, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ── Pooled Connection Proxy ───────────────────────────────────────────────────
+
+class PooledConnection:
+    """Driver connection wrapper whose close() hands the connection back to its pool."""
+
+    def __init__(self, pool: "ConnectionPool", raw):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def close(self) -> None:
+        """Return the connection to the pool (idempotent)."""
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw)
+
+    def invalidate(self) -> None:
+        """Discard the underlying connection instead of reusing it (e.g. after a protocol error)."""
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw, discard=True)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# ── Pool ──────────────────────────────────────────────────────────────────────
+
+class ConnectionPool:
+    """Bounded pool of connections to a single database."""
+
+    def __init__(self, config: Dict[str, Any], connect: Callable[[Dict[str, Any]], Any]):
+        self.db_type = config["db_type"].lower()
+        self.database = config.get("database")
+        self.host = config.get("host")
+        self.min_size = max(0, int(config.get("pool_min_size") or env_int("DB_POOL_MIN_SIZE", 1)))
+        self.max_size = max(1, int(config.get("pool_max_size") or env_int("DB_POOL_MAX_SIZE", 5)))
+        self.min_size = min(self.min_size, self.max_size)
+        self.idle_timeout = env_float("DB_POOL_IDLE_TIMEOUT", 300.0)
+        self.checkout_timeout = env_float("DB_POOL_CHECKOUT_TIMEOUT", 10.0)
+        self.ping_interval = env_float("DB_POOL_PING_INTERVAL", 10.0)
+
+        self._config = dict(config)
+        self._connect = connect
+        self._idle: List[tuple] = []     # (raw_connection, returned_at) — most recent last
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "closed_idle": 0,
+            "health_check_failures": 0,
+            "waits": 0,
+            "checkout_timeouts": 0,
+        }
+
+    # ── Checkout / Release ────────────────────────────────────────────────────
+
+    def acquire(self) -> PooledConnection:
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            while True:
+                self._evict_idle_locked()
+                while self._idle:
+                    raw, returned_at = self._idle.pop()
+                    idle_for = time.monotonic() - returned_at
+                    if idle_for >= self.ping_interval and not self._is_healthy(raw):
+                        self._stats["health_check_failures"] += 1
+                        self._close_raw(raw)
+                        continue
+                    self._in_use += 1
+                    self._stats["reused"] += 1
+                    return PooledConnection(self, raw)
+
+                if self._size_locked() < self.max_size:
+                    self._in_use += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["checkout_timeouts"] += 1
+                    raise RuntimeError(
+                        f"Connection pool exhausted for database '{self.database}' "
+                        f"({self.max_size} connections in use). Please retry shortly."
+                    )
+                self._stats["waits"] += 1
+                self._cond.wait(remaining)
+
+        # Open the new connection outside the lock — the handshake can take seconds.
+        try:
+            raw = self._connect(self._config)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        return PooledConnection(self, raw)
+
+    def release(self, raw, discard: bool = False) -> None:
+        if not discard:
+            discard = not self._reset(raw)
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._close_raw(raw)
+            else:
+                self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def warm_up(self) -> None:
+        """Open connections until the pool holds min_size of them."""
+        while True:
+            with self._cond:
+                if self._size_locked() >= self.min_size:
+                    return
+                self._in_use += 1
+            try:
+                raw = self._connect(self._config)
+            except Exception as e:
+                with self._cond:
+                    self._in_use -= 1
+                logger.warning("Pool warm-up failed for '%s': %s", self.database, e)
+                return
+            with self._cond:
+                self._stats["created"] += 1
+                self._in_use -= 1
+                self._idle.append((raw, time.monotonic()))
+                self._cond.notify()
+
+    # ── Maintenance ───────────────────────────────────────────────────────────
+
+    def evict_idle(self) -> None:
+        with self._cond:
+            self._evict_idle_locked()
+
+    def close_all(self) -> None:
+        with self._cond:
+            for raw, _ in self._idle:
+                self._close_raw(raw)
+            self._idle = []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "db_type": self.db_type,
+                "database": self.database,
+                "host": self.host,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "open": self._size_locked(),
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                **self._stats,
+            }
+
+    # ── Internal Helpers ──────────────────────────────────────────────────────
+
+    def _size_locked(self) -> int:
+        return self._in_use + len(self._idle)
+
+    def _evict_idle_locked(self) -> None:
+        """Close connections idle past the timeout, oldest first, keeping min_size open."""
+        now = time.monotonic()
+        while self._idle and self._size_locked() > self.min_size:
+            raw, returned_at = self._idle[0]
+            if now - returned_at < self.idle_timeout:
+                break
+            self._idle.pop(0)
+            self._close_raw(raw)
+            self._stats["closed_idle"] += 1
+
+    def _is_healthy(self, raw) -> bool:
+        try:
+            if self.db_type == "mysql":
+                return raw.is_connected()
+            if self.db_type == "postgresql" and raw.closed:
+                return False
+            cursor = raw.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            if self.db_type == "postgresql":
+                raw.rollback()
+            return True
+        except Exception as e:
+            logger.info("Pooled connection to '%s' failed health check: %s", self.database, e)
+            return False
+
+    def _reset(self, raw) -> bool:
+        """Clear any open transaction so the next borrower starts clean. False = unusable."""
+        try:
+            if self.db_type == "postgresql":
+                if raw.closed:
+                    return False
+                import psycopg2.extensions as pg_ext
+                if raw.get_transaction_status() != pg_ext.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+            elif self.db_type == "mysql":
+                # autocommit=True, so only leftover result sets need draining
+                if getattr(raw, "unread_result", False):
+                    raw.consume_results()
+            elif self.db_type == "sqlite":
+                if raw.in_transaction:
+                    raw.rollback()
+            return True
+        except Exception as e:
+            logger.info("Discarding pooled connection to '%s': %s", self.database, e)
+            return False
+
+    @staticmethod
+    def _close_raw(raw) -> None:
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def acquire(config: Dict[str, Any], connect: Callable[[Dict[str, Any]], Any]) -> PooledConnection:
+    """
+    Check out a connection for db_config, creating the pool on first use.
+
+    Args:
+        config:  db_config dict (db_type, host, port, username, password, database).
+        connect: Factory that opens a new raw driver connection for config.
+
+    Returns:
+        A PooledConnection. Call close() to return it to the pool.
+    """
+    key = config_fingerprint(config)
+    created = False
+    with _registry_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(config, connect)
+            _pools[key] = pool
+            created = True
+        others = [p for p in _pools.values() if p is not pool]
+
+    # Opportunistically trim idle connections held for other databases
+    for other in others:
+        other.evict_idle()
+
+    conn = pool.acquire()
+    if created:
+        pool.warm_up()
+    return conn
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Per-pool stats for /health. Keys are truncated fingerprints (no credentials)."""
+    with _registry_lock:
+        pools = dict(_pools)
+    return {key[:12]: pool.stats() for key, pool in pools.items()}
+
+
+def close_all_pools() -> None:
+    """Close every idle pooled connection and forget all pools (used on shutdown)."""
+    with _registry_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
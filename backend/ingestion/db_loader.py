@@ -1,9 +1,24 @@
 """
 DB Loader for connecting to SQL databases and extracting schema
 """
-from typing import Dict, Any
+import logging
+from typing import Dict, Any, List, Optional
+
+from ingestion import connection_pool
+from utils.helpers import env_str
+
+logger = logging.getLogger(__name__)
+
+_COUNT_CHUNK = 200   # tables per exact-count statement
+
 
 def get_connection(config: Dict[str, Any]):
+    """Check out a pooled connection for config. close() returns it to the pool."""
+    return connection_pool.acquire(config, open_connection)
+
+
+def open_connection(config: Dict[str, Any]):
+    """Open a new, unpooled driver connection."""
     db_type = config["db_type"].lower()
 
     if db_type == "mysql":
@@ -33,7 +48,8 @@ def get_connection(config: Dict[str, Any]):
         import sqlite3
         # Connect to local file based on database name
         db_file = f"{config.get('database', 'local_uploads')}.db"
-        conn = sqlite3.connect(db_file)
+        # Pooled connections move between request threads (one borrower at a time)
+        conn = sqlite3.connect(db_file, check_same_thread=False)
         # return rows as dicts for easier processing if needed, but we keep standard tuple behavior
         return conn
 
@@ -41,88 +57,265 @@ def get_connection(config: Dict[str, Any]):
         raise ValueError(f"Unsupported DB type: '{db_type}'. Use 'mysql', 'postgresql', or 'sqlite'.")
 
 
-def get_schema(conn, db_type: str) -> Dict[str, Any]:
-    """Extract tables, columns, types, sample values, and row counts"""
-    schema = {}
-    cursor = conn.cursor()
+# ── Schema Introspection ──────────────────────────────────────────────────────
+# Each dialect reads every table's columns in one catalog query and all primary /
+# foreign keys in a second one, instead of one DESCRIBE-style query per table.
+
+def _text(value):
+    """mysql-connector may hand back catalog strings as bytes."""
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def _new_table() -> Dict[str, Any]:
+    return {"columns": [], "primary_key": [], "foreign_keys": [], "_estimate": None}
+
+
+def _add_key(tables: Dict[str, Any], kind: str, table: str, name: str,
+             column: str, ref_table: Optional[str], ref_column: Optional[str]) -> None:
+    """Append one key column (rows arrive ordered by table, constraint, position)."""
+    info = tables.get(table)
+    if info is None:
+        return
+    if kind == "p":
+        info["primary_key"].append(column)
+        return
+    fks = info["foreign_keys"]
+    if not fks or fks[-1]["_name"] != name:
+        fks.append({"_name": name, "columns": [], "ref_table": ref_table, "ref_columns": []})
+    fks[-1]["columns"].append(column)
+    fks[-1]["ref_columns"].append(ref_column)
+
+
+def _introspect_mysql(cursor) -> Dict[str, Any]:
+    tables: Dict[str, Any] = {}
+    cursor.execute("""
+        SELECT c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE, c.IS_NULLABLE,
+               c.COLUMN_KEY, c.COLUMN_DEFAULT, t.TABLE_ROWS
+        FROM information_schema.COLUMNS c
+        JOIN information_schema.TABLES t
+          ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+        WHERE c.TABLE_SCHEMA = DATABASE()
+        ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+    """)
+    for table, name, col_type, nullable, key, default, table_rows in cursor.fetchall():
+        info = tables.setdefault(_text(table), _new_table())
+        info["columns"].append({
+            "name": _text(name),
+            "type": _text(col_type),
+            "nullable": _text(nullable) == "YES",
+            "key": _text(key) or "",
+            "default": _text(default),
+        })
+        if table_rows is not None:   # NULL for views
+            info["_estimate"] = int(table_rows)
+
+    cursor.execute("""
+        SELECT TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME,
+               REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND (CONSTRAINT_NAME = 'PRIMARY' OR REFERENCED_TABLE_NAME IS NOT NULL)
+        ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION
+    """)
+    for table, name, column, ref_table, ref_column in cursor.fetchall():
+        name = _text(name)
+        kind = "p" if name == "PRIMARY" else "f"
+        _add_key(tables, kind, _text(table), name, _text(column), _text(ref_table), _text(ref_column))
+    return tables
+
+
+def _introspect_postgresql(cursor) -> Dict[str, Any]:
+    tables: Dict[str, Any] = {}
+    # Base/partitioned tables, views, materialized views and foreign tables (not partitions)
+    cursor.execute("""
+        SELECT c.relname, a.attname, format_type(a.atttypid, a.atttypmod),
+               NOT a.attnotnull, pg_get_expr(d.adbin, d.adrelid), c.reltuples, c.relkind
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        LEFT JOIN pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
+        WHERE n.nspname = 'public'
+          AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+          AND NOT c.relispartition
+        ORDER BY c.relname, a.attnum
+    """)
+    for table, name, col_type, nullable, default, reltuples, relkind in cursor.fetchall():
+        info = tables.setdefault(table, _new_table())
+        info["columns"].append({
+            "name": name,
+            "type": col_type,
+            "nullable": nullable,
+            "key": "",
+            "default": default,
+        })
+        # reltuples is -1 for tables never vacuumed/analyzed (PG 14+), 0 for views
+        if relkind in ("r", "p", "m") and reltuples is not None and reltuples >= 0:
+            info["_estimate"] = int(reltuples)
+
+    cursor.execute("""
+        SELECT con.contype, c.relname, con.conname, a.attname, rc.relname, ra.attname
+        FROM pg_constraint con
+        JOIN pg_class c ON c.oid = con.conrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(attnum, refnum, ord)
+        JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+        LEFT JOIN pg_class rc ON rc.oid = con.confrelid
+        LEFT JOIN pg_attribute ra ON ra.attrelid = con.confrelid AND ra.attnum = k.refnum
+        WHERE n.nspname = 'public' AND con.contype IN ('p', 'f')
+        ORDER BY c.relname, con.conname, k.ord
+    """)
+    for kind, table, name, column, ref_table, ref_column in cursor.fetchall():
+        _add_key(tables, kind, table, name, column, ref_table, ref_column)
+    return tables
 
+
+def _introspect_sqlite(cursor) -> Dict[str, Any]:
+    tables: Dict[str, Any] = {}
+    # Table-valued pragmas (SQLite 3.16+); internal sqlite_* tables are skipped
+    cursor.execute("""
+        SELECT m.name, p.name, p.type, p."notnull", p.dflt_value, p.pk
+        FROM sqlite_master m
+        JOIN pragma_table_info(m.name) p
+        WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+        ORDER BY m.name, p.cid
+    """)
+    pk_positions: Dict[str, List[tuple]] = {}
+    for table, name, col_type, notnull, default, pk in cursor.fetchall():
+        info = tables.setdefault(table, _new_table())
+        info["columns"].append({
+            "name": name,
+            "type": col_type,
+            "nullable": notnull == 0,
+            "key": "",
+            "default": default,
+        })
+        if pk:
+            pk_positions.setdefault(table, []).append((pk, name))
+    for table, positions in pk_positions.items():
+        tables[table]["primary_key"] = [name for _, name in sorted(positions)]
+
+    cursor.execute("""
+        SELECT m.name, f.id, f."from", f."table", f."to"
+        FROM sqlite_master m
+        JOIN pragma_foreign_key_list(m.name) f
+        WHERE m.type = 'table'
+        ORDER BY m.name, f.id, f.seq
+    """)
+    for table, fk_id, column, ref_table, ref_column in cursor.fetchall():
+        if ref_column is None:
+            # REFERENCES parent without a column list targets the parent's primary key
+            fks = tables.get(table, {}).get("foreign_keys", [])
+            position = len(fks[-1]["columns"]) if fks and fks[-1]["_name"] == fk_id else 0
+            parent_pk = tables.get(ref_table, {}).get("primary_key", [])
+            ref_column = parent_pk[position] if position < len(parent_pk) else None
+        _add_key(tables, "f", table, fk_id, column, ref_table, ref_column)
+
+    # sqlite_stat1 only exists after ANALYZE; the first number of "stat" is the row count
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'")
+    if cursor.fetchone() is not None:
+        cursor.execute("SELECT tbl, stat FROM sqlite_stat1")
+        for tbl, stat in cursor.fetchall():
+            if tbl in tables:
+                try:
+                    tables[tbl]["_estimate"] = int(str(stat).split()[0])
+                except (ValueError, IndexError):
+                    continue
+    return tables
+
+
+_INTROSPECTORS = {
+    "mysql": _introspect_mysql,
+    "postgresql": _introspect_postgresql,
+    "sqlite": _introspect_sqlite,
+}
+
+
+def _exact_row_counts(cursor, tables: List[str], db_type: str) -> Dict[str, int]:
+    """
+    COUNT(*) for several tables, _COUNT_CHUNK tables per UNION ALL round trip
+    (SQLite allows at most 500 terms in a compound SELECT).
+    """
+    if db_type == "mysql":
+        quote = lambda t: "`" + t.replace("`", "``") + "`"
+    else:
+        quote = lambda t: '"' + t.replace('"', '""') + '"'
+    counts = {}
+    for start in range(0, len(tables), _COUNT_CHUNK):
+        chunk = tables[start:start + _COUNT_CHUNK]
+        sql = " UNION ALL ".join(
+            f"SELECT {i}, COUNT(*) FROM {quote(t)}" for i, t in enumerate(chunk)
+        )
+        cursor.execute(sql)
+        counts.update({chunk[i]: count for i, count in cursor.fetchall()})
+    return counts
+
+
+def get_schema(conn, db_type: str, row_count_mode: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extract tables, columns, types, keys, and row counts.
+
+    Args:
+        conn:           Open DB connection.
+        db_type:        'mysql', 'postgresql' or 'sqlite'.
+        row_count_mode: 'estimate' (default) reads planner statistics from the catalog;
+                        'exact' runs SELECT COUNT(*) per table. Defaults to the
+                        SCHEMA_ROW_COUNT_MODE environment setting.
+
+    Each table entry looks like:
+        {
+            "columns":             [{"name", "type", "nullable", "key", "default"}, ...],
+            "row_count":           int | None,   # None when no estimate exists
+            "row_count_estimated": bool,         # True when read from catalog statistics
+            "primary_key":         [column, ...],
+            "foreign_keys":        [{"columns": [...], "ref_table": str, "ref_columns": [...]}],
+        }
+    """
+    db_type = db_type.lower()
+    introspect = _INTROSPECTORS.get(db_type)
+    if introspect is None:
+        return {}
+    mode = (row_count_mode or env_str("SCHEMA_ROW_COUNT_MODE", "estimate")).lower()
+
+    cursor = conn.cursor()
     try:
-        db_type = db_type.lower()
-
-        if db_type == "mysql":
-            cursor.execute("SHOW TABLES")
-            tables = [row[0] for row in cursor.fetchall()]
-
-            for table in tables:
-                cursor.execute(f"DESCRIBE `{table}`")
-                columns = [
-                    {
-                        "name": row[0],
-                        "type": row[1],
-                        "nullable": row[2] == "YES",
-                        "key": row[3],
-                        "default": row[4],
-                    }
-                    for row in cursor.fetchall()
-                ]
-                cursor.execute(f"SELECT COUNT(*) FROM `{table}`")
-                count = cursor.fetchone()[0]
-                schema[table] = {"columns": columns, "row_count": count}
-
-        elif db_type == "postgresql":
-            print(f"DEBUG: Fetching schema for PostgreSQL DB: {conn.get_dsn_parameters().get('dbname')} as user {conn.get_dsn_parameters().get('user')}")
-            cursor.execute("""
-                SELECT table_name, table_type FROM information_schema.tables
-                WHERE table_schema = 'public'
-                ORDER BY table_name
-            """)
-            all_tables = cursor.fetchall()
-            print(f"DEBUG: Found {len(all_tables)} total objects in 'public' schema: {all_tables}")
-            
-            # Keep both Base Tables and Views
-            tables = [row[0] for row in all_tables if row[1] in ('BASE TABLE', 'VIEW')]
-
-            for table in tables:
-                cursor.execute("""
-                    SELECT column_name, data_type, is_nullable, column_default
-                    FROM information_schema.columns
-                    WHERE table_name = %s AND table_schema = 'public'
-                    ORDER BY ordinal_position
-                """, (table,))
-                columns = [
-                    {
-                        "name": row[0],
-                        "type": row[1],
-                        "nullable": row[2] == "YES",
-                        "default": row[3],
-                    }
-                    for row in cursor.fetchall()
-                ]
-                cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
-                count = cursor.fetchone()[0]
-                schema[table] = {"columns": columns, "row_count": count}
+        tables = introspect(cursor)
 
+        if mode == "exact":
+            exact_for = list(tables)
         elif db_type == "sqlite":
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = [row[0] for row in cursor.fetchall() if row[0] != "sqlite_sequence"]
-
-            for table in tables:
-                cursor.execute(f"PRAGMA table_info(`{table}`)")
-                # PRAGMA returns: cid, name, type, notnull, dflt_value, pk
-                columns = [
-                    {
-                        "name": row[1],
-                        "type": row[2],
-                        "nullable": row[3] == 0,
-                        "default": row[4],
-                    }
-                    for row in cursor.fetchall()
-                ]
-                cursor.execute(f"SELECT COUNT(*) FROM `{table}`")
-                count = cursor.fetchone()[0]
-                schema[table] = {"columns": columns, "row_count": count}
-
+            # Local file: counting a table that was never analyzed is cheap enough
+            exact_for = [t for t, info in tables.items() if info["_estimate"] is None]
+        else:
+            # No estimate (e.g. a view) — a full scan is exactly what estimate mode avoids
+            exact_for = []
+        exact = _exact_row_counts(cursor, exact_for, db_type)
     finally:
         cursor.close()
 
+    logger.debug("Introspected %d tables (%s, row counts: %s)", len(tables), db_type, mode)
+
+    schema = {}
+    for table in sorted(tables):
+        info = tables[table]
+        pk = set(info["primary_key"])
+        fk_cols = {c for fk in info["foreign_keys"] for c in fk["columns"]}
+        for col in info["columns"]:
+            if not col["key"]:
+                col["key"] = "PRI" if col["name"] in pk else ("MUL" if col["name"] in fk_cols else "")
+        if table in exact:
+            count, estimated = exact[table], False
+        else:
+            count, estimated = info["_estimate"], True
+        schema[table] = {
+            "columns": info["columns"],
+            "row_count": count,
+            "row_count_estimated": estimated,
+            "primary_key": info["primary_key"],
+            "foreign_keys": [
+                {"columns": fk["columns"], "ref_table": fk["ref_table"], "ref_columns": fk["ref_columns"]}
+                for fk in info["foreign_keys"]
+            ],
+        }
     return schema
@@ -0,0 +1,165 @@
+"""
+Schema Cache — BAAP AI v2
+Per-database cache of get_schema() output with TTL + cheap change detection.
+
+Full introspection touches every table. Instead, a cached schema is served as-is
+for SCHEMA_CACHE_TTL seconds; after that a single catalog probe decides whether
+the schema actually changed:
+
+    sqlite      — PRAGMA schema_version (bumped by SQLite on every DDL)
+    postgresql  — md5 over pg_class/pg_attribute (+ key constraints) for the public schema
+    mysql       — column count + CRC32 checksum over information_schema.COLUMNS + FK count
+
+If the probe token is unchanged the entry is revalidated without re-introspecting.
+Writers that change the schema (e.g. /upload) call invalidate_schema() explicitly.
+
+Each cached schema carries a version string (see get_schema_version) that
+downstream caches can key on.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from ingestion.connection_pool import config_fingerprint
+from ingestion.db_loader import get_schema
+from utils.helpers import env_float
+
+logger = logging.getLogger(__name__)
+
+# ── Change-detection probes ───────────────────────────────────────────────────
+
+_PROBES = {
+    "sqlite": "PRAGMA schema_version",
+    "postgresql": """
+        SELECT md5(string_agg(
+            c.oid::text || ':' || c.relname || ':' || a.attname || ':' || a.atttypid::text,
+            ',' ORDER BY c.oid, a.attnum
+        )),
+        (SELECT md5(string_agg(con.oid::text, ',' ORDER BY con.oid))
+         FROM pg_constraint con JOIN pg_namespace cn ON cn.oid = con.connamespace
+         WHERE cn.nspname = 'public' AND con.contype IN ('p', 'f'))
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_attribute a ON a.attrelid = c.oid
+        WHERE n.nspname = 'public'
+          AND c.relkind IN ('r', 'v', 'm', 'p', 'f')
+          AND a.attnum > 0 AND NOT a.attisdropped
+    """,
+    "mysql": """
+        SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS(':',
+            TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY))), 0),
+        (SELECT COUNT(*) FROM information_schema.KEY_COLUMN_USAGE
+         WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL)
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+    """,
+}
+
+# ── Module State ──────────────────────────────────────────────────────────────
+
+_entries: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+_stats = {
+    "hits": 0,            # served within TTL, no DB round trip
+    "revalidations": 0,   # TTL expired, probe says unchanged
+    "misses": 0,          # full introspection ran
+    "invalidations": 0,
+    "probe_failures": 0,
+}
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _probe(conn, db_type: str) -> Optional[str]:
+    """Run the dialect's change-detection query. None means 'unknown — reload'."""
+    sql = _PROBES.get(db_type)
+    if not sql:
+        return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql)
+        row = cursor.fetchone()
+        return "|".join(str(v) for v in row) if row else None
+    except Exception as e:
+        logger.info("Schema probe failed for %s: %s", db_type, e)
+        with _lock:
+            _stats["probe_failures"] += 1
+        if db_type == "postgresql":
+            conn.rollback()
+        return None
+    finally:
+        cursor.close()
+
+
+def _count(stat: str) -> None:
+    with _lock:
+        _stats[stat] += 1
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def get_cached_schema(conn, db_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return the schema for db_config, introspecting only when it is missing or changed.
+
+    Args:
+        conn:      Open connection for db_config (used for the probe / reload).
+        db_config: Database connection config dict.
+
+    Returns:
+        The same structure as db_loader.get_schema().
+    """
+    db_type = db_config["db_type"].lower()
+    key = config_fingerprint(db_config)
+    ttl = env_float("SCHEMA_CACHE_TTL", 60.0)
+
+    with _lock:
+        entry = _entries.get(key)
+
+    if entry is not None:
+        if time.monotonic() - entry["checked_at"] < ttl:
+            _count("hits")
+            return entry["schema"]
+
+        token = _probe(conn, db_type)
+        if token is not None and token == entry["token"]:
+            entry["checked_at"] = time.monotonic()
+            _count("revalidations")
+            return entry["schema"]
+    else:
+        token = _probe(conn, db_type)
+
+    _count("misses")
+    schema = get_schema(conn, db_type)
+    version_src = f"{key}:{token if token is not None else time.time()}"
+    with _lock:
+        _entries[key] = {
+            "schema": schema,
+            "token": token,
+            "version": hashlib.sha1(version_src.encode("utf-8")).hexdigest()[:16],
+            "checked_at": time.monotonic(),
+        }
+    return schema
+
+
+def get_schema_version(db_config: Dict[str, Any]) -> Optional[str]:
+    """Version string of the currently cached schema for db_config (None if not cached)."""
+    with _lock:
+        entry = _entries.get(config_fingerprint(db_config))
+    return entry["version"] if entry else None
+
+
+def invalidate_schema(db_config: Dict[str, Any]) -> None:
+    """Drop the cached schema for db_config so the next request re-introspects."""
+    with _lock:
+        if _entries.pop(config_fingerprint(db_config), None) is not None:
+            _stats["invalidations"] += 1
+
+
+def get_schema_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for /health."""
+    with _lock:
+        return {"entries": len(_entries), **_stats}
@@ -0,0 +1,227 @@
+"""
+Commentary Engine — BAAP AI v2
+Insights and follow-up suggestions for a query result from ONE structured-output
+LLM call, instead of generate_insights + generate_suggestions sending the same
+question / sample rows / stats / tables twice.
+
+ANALYTICS_COMMENTARY_MODE (read per query):
+    combined  — one call, JSON object {"insights": [...], "suggestions": [...]} (default)
+    separate  — the two original calls
+
+The reply is parsed leniently (code fences, prose around the object, trailing
+commas). A list that is missing or unusable is reported as absent, and the
+router falls back to the separate call for just that list. A rate-limited call
+raises LLMRateLimitError instead: the separate calls would only queue behind the
+same limit, so the local lists are kept.
+
+Latency and token cost of both paths are reported side by side in
+get_commentary_stats() (/health "commentary").
+"""
+
+import json
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from core.llm import get_llm_model, get_llm_stats
+from core.rate_limiter import LLMRateLimitError, is_throttle_error
+from intelligence.metrics_engine import sample_note
+from processing.result_set import sample_rows
+from utils.helpers import env_bool, env_str
+
+logger = logging.getLogger(__name__)
+
+MODE_COMBINED = "combined"
+MODE_SEPARATE = "separate"
+
+_MAX_INSIGHTS = 5
+_MAX_SUGGESTIONS = 5
+_FENCE_RE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+_TRAILING_COMMA_RE = re.compile(r",\s*([\]}])")
+
+# LLM callers whose token usage belongs to each path (see core.llm.get_llm_stats)
+_PATH_CALLERS = {MODE_COMBINED: ("commentary",), MODE_SEPARATE: ("insights", "suggestions")}
+
+
+# ── Module State ──────────────────────────────────────────────────────────────
+
+_lock = threading.Lock()
+_stats = {
+    mode: {"runs": 0, "total_ms": 0.0, "fallbacks": 0}
+    for mode in (MODE_COMBINED, MODE_SEPARATE)
+}
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _json_object(text: str) -> Optional[str]:
+    """The first balanced {...} in text, skipping braces inside strings."""
+    start = text.find("{")
+    if start < 0:
+        return None
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def _string_list(value: Any, limit: int) -> Optional[List[str]]:
+    if not isinstance(value, list):
+        return None
+    items = [str(v).strip() for v in value if isinstance(v, (str, int, float)) and str(v).strip()]
+    return items[:limit] or None
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def commentary_mode() -> str:
+    mode = env_str("ANALYTICS_COMMENTARY_MODE", MODE_COMBINED).lower()
+    return mode if mode in _stats else MODE_COMBINED
+
+
+def parse_commentary(text: str) -> Dict[str, List[str]]:
+    """
+    {"insights": [...], "suggestions": [...]} from an LLM reply. Keys whose list is
+    missing, empty or not a list of strings are left out; {} when nothing parses.
+    """
+    text = _FENCE_RE.sub("", (text or "").strip())
+    candidate = _json_object(text)
+    if candidate is None:
+        return {}
+    data = None
+    for attempt in (candidate, _TRAILING_COMMA_RE.sub(r"\1", candidate)):
+        try:
+            data = json.loads(attempt)
+            break
+        except ValueError:
+            continue
+    if not isinstance(data, dict):
+        return {}
+
+    parsed = {}
+    for key, limit in (("insights", _MAX_INSIGHTS), ("suggestions", _MAX_SUGGESTIONS)):
+        items = _string_list(data.get(key), limit)
+        if items:
+            parsed[key] = items
+    return parsed
+
+
+def generate_commentary(
+    question: str,
+    sql: str,
+    schema: Dict,
+    result: Dict[str, Any],
+    metrics: Dict,
+    findings: Optional[List[str]] = None,
+) -> Dict[str, List[str]]:
+    """
+    Insights and suggestions from one LLM call (see parse_commentary). Returns {}
+    when the call fails, so the caller can fall back to the separate generators.
+
+    Raises:
+        LLMRateLimitError: the call was throttled — falling back would not help.
+    """
+    try:
+        model = get_llm_model("commentary")
+    except ValueError:
+        return {}
+
+    kpis = metrics.get("kpis", {})
+    numeric_stats = metrics.get("numeric_stats", {})
+    tables = ", ".join(schema.keys())
+    sample = sample_rows(result, 15)
+
+    prompt = f"""You are a data analyst. A user queried their database.
+
+QUESTION: {question}
+SQL: {sql}
+AVAILABLE TABLES: {tables}
+TOTAL ROWS: {kpis.get('total_rows', 0)}
+SAMPLE DATA: {json.dumps(sample, default=str)}
+STATS: {json.dumps(numeric_stats, default=str)}
+KEY FINDINGS (computed from the data): {json.dumps(findings or [])}
+{sample_note(metrics)}
+Produce two lists:
+1. "insights": 4 concise insights about this result
+   - Each insight = 1-2 sentences max
+   - Be specific with numbers
+   - Focus on patterns, outliers, trends
+   - Build on the key findings where they matter; do not contradict their numbers
+2. "suggestions": 5 smart follow-up questions they might ask next
+   - Natural English questions
+   - Relevant to the data they just saw
+   - Mix of simple and complex queries
+
+Return ONLY a JSON object: {{"insights": ["...", "..."], "suggestions": ["...?", "...?"]}}
+No markdown, no extra text.
+
+JSON OBJECT:"""
+
+    kwargs = {}
+    if env_bool("COMMENTARY_JSON_MODE", True):
+        kwargs["generation_config"] = {"response_mime_type": "application/json"}
+    try:
+        response = model.generate_content(prompt, **kwargs)
+        parsed = parse_commentary(response.text)
+    except Exception as e:
+        if is_throttle_error(e):
+            logger.warning("Combined commentary rate limited: %s", e)
+            raise e if isinstance(e, LLMRateLimitError) else LLMRateLimitError(str(e)) from e
+        # Generation error — the caller falls back to the separate calls
+        logger.warning("Combined commentary failed: %s", e)
+        return {}
+    if len(parsed) < 2:
+        logger.info("Combined commentary incomplete (got %s); falling back", sorted(parsed) or "nothing")
+    return parsed
+
+
+def record_commentary_run(mode: str, elapsed_ms: float, fallback: bool = False) -> None:
+    """Wall time of one query's commentary stage (fallback = combined reply needed the separate calls)."""
+    with _lock:
+        entry = _stats[mode]
+        entry["runs"] += 1
+        entry["total_ms"] += elapsed_ms
+        entry["fallbacks"] += int(fallback)
+
+
+def get_commentary_stats() -> Dict[str, Any]:
+    """Per path: queries, average wall time, fallbacks and average LLM tokens per query, for /health."""
+    per_caller: Dict[str, Dict[str, int]] = {}
+    for callers in get_llm_stats()["models"].values():
+        for caller, entry in callers.items():
+            totals = per_caller.setdefault(caller, {"calls": 0, "tokens": 0})
+            totals["calls"] += entry["calls"]
+            totals["tokens"] += entry["prompt_tokens"] + entry["output_tokens"]
+
+    report = {"mode": commentary_mode()}
+    with _lock:
+        for mode, entry in _stats.items():
+            # Tokens per query = sum over the path's callers of tokens per call
+            tokens = sum(
+                per_caller[c]["tokens"] / per_caller[c]["calls"]
+                for c in _PATH_CALLERS[mode]
+                if per_caller.get(c, {}).get("calls")
+            )
+            report[mode] = {
+                "runs": entry["runs"],
+                "fallbacks": entry["fallbacks"],
+                "avg_ms": round(entry["total_ms"] / entry["runs"], 1) if entry["runs"] else 0.0,
+                "avg_tokens_per_query": round(tokens),
+            }
+    return report
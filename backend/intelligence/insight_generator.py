@@ -1,24 +1,30 @@
 import json
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from core.llm import get_llm_model
+from intelligence.metrics_engine import sample_note
+from processing.result_set import sample_rows
 
 
 def generate_insights(
     question: str,
     sql: str,
-    data: List[Dict],
+    result: Dict[str, Any],
     metrics: Dict,
+    findings: Optional[List[str]] = None,
 ) -> List[str]:
 
-    if not data:
+    if not result["row_count"]:
         return ["No data was returned by this query."]
 
-    model = get_llm_model()
+    try:
+        model = get_llm_model("insights")
+    except ValueError:
+        return []   # no API key — the local insights (intelligence/local_insights.py) stand
 
     kpis = metrics.get("kpis", {})
     numeric_stats = metrics.get("numeric_stats", {})
-    sample = data[:15]
+    sample = sample_rows(result, 15)
 
     prompt = f"""You are a data analyst. Analyze this query result and give 4 concise insights.
 
@@ -27,11 +33,13 @@ SQL: {sql}
 TOTAL ROWS: {kpis.get('total_rows', 0)}
 SAMPLE DATA: {json.dumps(sample, default=str)}
 STATS: {json.dumps(numeric_stats, default=str)}
-
+KEY FINDINGS (computed from the data): {json.dumps(findings or [])}
+{sample_note(metrics)}
 Rules:
 - Each insight = 1-2 sentences max
 - Be specific with numbers
 - Focus on patterns, outliers, trends
+- Build on the key findings where they matter; do not contradict their numbers
 - Return ONLY a JSON array of strings like: ["insight1", "insight2", "insight3", "insight4"]
 - No markdown, no extra text, just the JSON array
 
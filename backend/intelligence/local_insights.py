@@ -0,0 +1,249 @@
+"""
+Local Insights — BAAP AI v2
+Ranked, templated insights computed straight from a result set and its
+metrics_engine output — no LLM call, a few milliseconds per result. They are
+the fast tier: shown as soon as the metrics are ready, and kept when the LLM
+narration (insight_generator / commentary_engine) is disabled, rate limited or
+returns nothing.
+
+Findings, each scored so the strongest come first:
+    top / bottom   the leading and trailing label for a measure
+    share          how concentrated a measure is in its top 3 labels
+    outliers       values outside the 1.5 × IQR fences, the extreme one with its z-score
+    change         period-over-period delta of a measure over a date column
+    nulls          columns missing in a large part of the rows
+
+When the result was capped (metrics["sampled"], see core.smart_router) the rows
+at hand are only the first N: findings that claim something about the whole
+result (bottom, share, change and the top label's share of the total) are
+dropped, and the rest say "in the first N rows".
+"""
+
+import math
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.helpers import env_float
+
+_DATE_RE = re.compile(r"^(\d{4})-(\d{2})(?:-(\d{2}))?")
+_ID_RE = re.compile(r"(^|_)id$", re.IGNORECASE)
+
+_MAX_MEASURES = 3
+_MAX_PERIODS = 24        # more distinct dates than this are grouped by month
+_MIN_OUTLIER_ROWS = 8
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _fmt(value: float) -> str:
+    if not math.isfinite(value):
+        return str(value)
+    if value == int(value) and abs(value) < 1e15:
+        return f"{int(value):,}"
+    return f"{value:,.2f}"
+
+
+def _pct(value: float) -> str:
+    return f"{value:.0f}%" if abs(value) >= 10 else f"{value:.1f}%"
+
+
+def _finding(kind: str, score: float, text: str) -> Dict[str, Any]:
+    return {"kind": kind, "score": round(score, 3), "text": text}
+
+
+def _numbers(values: List[Any]) -> List[Optional[float]]:
+    out = []
+    for v in values:
+        try:
+            out.append(None if v is None else float(v))
+        except (ValueError, TypeError):
+            out.append(None)
+    return out
+
+
+def _is_date_column(values: List[Any]) -> bool:
+    sample = [v for v in values[:50] if v is not None]
+    return bool(sample) and all(isinstance(v, str) and _DATE_RE.match(v) for v in sample)
+
+
+def _group_sum(labels: List[Any], numbers: List[Optional[float]]) -> "OrderedDict[str, float]":
+    totals: "OrderedDict[str, float]" = OrderedDict()
+    for label, number in zip(labels, numbers):
+        if label is None or number is None:
+            continue
+        key = str(label)
+        totals[key] = totals.get(key, 0.0) + number
+    return totals
+
+
+_Column = Tuple[str, List[Any]]   # (name, values)
+
+
+def _columns(result: Dict[str, Any], metrics: Dict) -> Tuple[List[_Column], Optional[_Column], Optional[_Column]]:
+    """(measures, label column, date column) — first occurrence of each column name."""
+    numeric_stats = metrics.get("numeric_stats", {})
+    seen, measures, label, date = set(), [], None, None
+    for col, values in zip(result["columns"], result["values"]):
+        if col in seen:
+            continue
+        seen.add(col)
+        if col in numeric_stats:
+            if not _ID_RE.search(col) and len(measures) < _MAX_MEASURES:
+                measures.append((col, values))
+        elif _is_date_column(values):
+            date = date or (col, values)
+        elif label is None:
+            label = (col, values)
+    return measures, label, date
+
+
+# ── Findings ──────────────────────────────────────────────────────────────────
+
+def _contributors(
+    measure: str,
+    totals: "OrderedDict[str, float]",
+    label_col: str,
+    scope: str,
+) -> List[Dict[str, Any]]:
+    if len(totals) < 2:
+        return []
+    ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+    grand = sum(totals.values())
+    # A share of a partial (capped) sum is not a share of the total
+    non_negative = not scope and all(v >= 0 for v in totals.values()) and grand > 0
+    (top_label, top_value), (bottom_label, bottom_value) = ranked[0], ranked[-1]
+    findings = []
+
+    score = 0.5 if scope else 0.6
+    text = f"{top_label} leads {measure} with {_fmt(top_value)}{scope}"
+    if non_negative:
+        share, uniform = top_value / grand * 100, 100 / len(totals)
+        text += f" ({_pct(share)} of the total)"
+        score += 0.3 * max(0.0, (share - uniform) / (100 - uniform))   # dominance over an even split
+    runner_up = ranked[1][1]
+    if runner_up > 0 and top_value > runner_up:
+        text += f", {top_value / runner_up:.1f}× the next {label_col} ({ranked[1][0]})"
+    findings.append(_finding("top", score, text + "."))
+
+    if len(totals) >= 3 and not scope:
+        findings.append(_finding("bottom", 0.35, f"{bottom_label} has the lowest {measure} at {_fmt(bottom_value)}."))
+
+    if non_negative and len(totals) > 4:
+        top3 = sum(v for _k, v in ranked[:3]) / grand * 100
+        expected = 300 / len(totals)
+        if top3 >= expected * 1.5:
+            findings.append(_finding(
+                "share", 0.5 + 0.4 * min(1.0, (top3 - expected) / (100 - expected)),
+                f"The top 3 of {len(totals)} {label_col} values account for {_pct(top3)} of total {measure}.",
+            ))
+    return findings
+
+
+def _outliers(
+    measure: str,
+    numbers: List[Optional[float]],
+    labels: Optional[List[Any]],
+    scope: str,
+) -> List[Dict[str, Any]]:
+    points = [(n, i) for i, n in enumerate(numbers) if n is not None]
+    if len(points) < _MIN_OUTLIER_ROWS:
+        return []
+    ordered = sorted(n for n, _i in points)
+    q1, q3 = ordered[len(ordered) // 4], ordered[(3 * len(ordered)) // 4]
+    low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    flagged = [(n, i) for n, i in points if n < low or n > high]
+    mean = sum(ordered) / len(ordered)
+    std = math.sqrt(sum((n - mean) ** 2 for n in ordered) / len(ordered))
+    if not flagged or std == 0:
+        return []
+
+    value, index = max(flagged, key=lambda p: abs(p[0] - mean))
+    z = (value - mean) / std
+    if abs(z) < env_float("INSIGHT_OUTLIER_Z", 2.0):
+        return []
+    who = f"{labels[index]} at " if labels is not None and labels[index] is not None else ""
+    direction = "above" if z > 0 else "below"
+    count = f"{len(flagged)} outlier{'s' if len(flagged) > 1 else ''} in {measure}{scope}"
+    return [_finding(
+        "outliers", 0.45 + 0.1 * min(4.0, abs(z) - 2.0),
+        f"{count}: {who}{_fmt(value)} is {abs(z):.1f} standard deviations {direction} the mean ({_fmt(mean)}).",
+    )]
+
+
+def _period_change(measure: str, numbers: List[Optional[float]], dates: List[Any]) -> List[Dict[str, Any]]:
+    keys = [_DATE_RE.match(d).group(0) if isinstance(d, str) and _DATE_RE.match(d) else None for d in dates]
+    if len({k for k in keys if k}) > _MAX_PERIODS:
+        keys = [k[:7] if k else None for k in keys]   # by month
+    totals = _group_sum(keys, numbers)
+    if len(totals) < 2:
+        return []
+    periods = sorted(totals.items())
+    (prev_key, prev), (last_key, last) = periods[-2], periods[-1]
+    if prev == 0:
+        return []
+    delta = (last - prev) / abs(prev) * 100
+    change = _pct(abs(delta))
+    if float(change.rstrip("%")) == 0:   # rounds to 0% — no percentage to report
+        moved = "was flat"
+    else:
+        moved = f"{'rose' if delta > 0 else 'fell'} {change}"
+    text = f"{measure} {moved} from {prev_key} to {last_key} ({_fmt(prev)} → {_fmt(last)})"
+    first_key, first = periods[0]
+    if len(periods) >= 3 and first:
+        overall = (last - first) / abs(first) * 100
+        text += f"; {'+' if overall >= 0 else '−'}{_pct(abs(overall))} since {first_key}"
+    return [_finding("change", 0.55 + 0.4 * min(1.0, abs(delta) / 100), text + ".")]
+
+
+def _null_heavy(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    threshold = env_float("INSIGHT_NULL_RATIO", 0.2)
+    total_rows = result["row_count"]
+    findings, seen = [], set()
+    for col, values in zip(result["columns"], result["values"]):
+        if col in seen:
+            continue
+        seen.add(col)
+        nulls = sum(1 for v in values if v is None)
+        ratio = nulls / total_rows
+        if ratio >= threshold:
+            findings.append(_finding(
+                "nulls", 0.3 + 0.3 * ratio,
+                f"{col} is empty in {_pct(ratio * 100)} of rows ({nulls:,} of {total_rows:,}).",
+            ))
+    return findings
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def find_insights(result: Dict[str, Any], metrics: Dict) -> List[Dict[str, Any]]:
+    """Every finding for a result, strongest first: {"kind", "score", "text"}."""
+    total_rows = result["row_count"]
+    if not total_rows:
+        return [_finding("empty", 1.0, "No data was returned by this query.")]
+
+    measures, label, date = _columns(result, metrics)
+    sampled = bool(metrics.get("sampled"))
+    scope = f" in the first {total_rows:,} rows" if sampled else ""
+    findings: List[Dict[str, Any]] = []
+    if total_rows == 1:
+        values = [f"{col} = {_fmt(n)}" for col, vals in measures for n in _numbers(vals[:1]) if n is not None]
+        if values:
+            findings.append(_finding("single", 0.9, f"The query returned a single row: {', '.join(values)}."))
+
+    for col, values in measures:
+        numbers = _numbers(values)
+        if label is not None and total_rows > 1:
+            findings += _contributors(col, _group_sum(label[1], numbers), label[0], scope)
+        findings += _outliers(col, numbers, label[1] if label is not None else None, scope)
+        if date is not None and not sampled:   # the last periods may be cut off
+            findings += _period_change(col, numbers, date[1])
+    findings += _null_heavy(result)
+
+    findings.sort(key=lambda f: f["score"], reverse=True)
+    return findings
+
+
+def generate_local_insights(result: Dict[str, Any], metrics: Dict, limit: int = 5) -> List[str]:
+    """Insight sentences for a result without an LLM call (see find_insights)."""
+    return [f["text"] for f in find_insights(result, metrics)[:limit]]
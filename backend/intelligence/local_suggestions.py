@@ -0,0 +1,287 @@
+"""
+Local Suggestions — BAAP AI v2
+Deterministic follow-up questions built from the schema and the current query,
+without an LLM call.
+
+Per-table pools: for every table, candidate questions are precomputed once per
+schema version from its column types and foreign keys —
+    count       how many rows
+    breakdown   a measure (or row count) by a categorical column
+    top         top 10 rows by a measure
+    trend       a measure (or row count) per month over a date column
+    related     tables linked through a foreign key, in either direction
+    learned     LLM suggestions seen for the table (learn_suggestions), reused later
+
+Ranking against the current query (sqlglot when installed, else a regex scan):
+questions on the queried tables come first; a group-by column the user already
+used is not suggested again, but drills into its top value are; filtered columns
+get a "compare across all values" question.
+
+The LLM suggestion call (suggestion_engine / commentary_engine) is an optional
+upgrade on top: SUGGESTION_LLM_UPGRADE=false turns it off.
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from processing.result_set import column_values
+
+logger = logging.getLogger(__name__)
+
+_MAX_POOLS = 8               # schema versions kept
+_MAX_LEARNED = 10            # learned LLM suggestions kept per table
+_MAX_PER_KIND = 2
+
+_DIALECTS = {"postgresql": "postgres", "mysql": "mysql", "sqlite": "sqlite"}
+_DATE_TYPES = ("date", "time", "year")
+_NUMERIC_TYPES = ("int", "dec", "numeric", "float", "double", "real", "money", "number", "serial")
+_ID_RE = re.compile(r"(^|_)id$", re.IGNORECASE)
+_FREE_TEXT_RE = re.compile(r"name|email|phone|address|description|comment|note|url|title|password", re.IGNORECASE)
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN)\s+[`\"\[]?(\w+)", re.IGNORECASE)
+_GROUP_RE = re.compile(r"\bGROUP\s+BY\s+(.+?)(?:\bHAVING\b|\bORDER\b|\bLIMIT\b|$)", re.IGNORECASE | re.DOTALL)
+_WHERE_RE = re.compile(r"\bWHERE\s+(.+?)(?:\bGROUP\b|\bHAVING\b|\bORDER\b|\bLIMIT\b|$)", re.IGNORECASE | re.DOTALL)
+_FILTER_COL_RE = re.compile(r"(\w+)[`\"\]]?\s*(?:=|<>|!=|<|>|\bLIKE\b|\bIN\b|\bBETWEEN\b|\bIS\b)", re.IGNORECASE)
+
+_SCORES = {
+    "drill": 0.9, "trend": 0.8, "compare": 0.75, "breakdown": 0.7, "top": 0.65,
+    "related": 0.6, "learned": 0.55, "count": 0.4,
+}
+
+
+# ── Module State ──────────────────────────────────────────────────────────────
+
+_pools: "OrderedDict[str, Dict[str, List[Dict[str, Any]]]]" = OrderedDict()   # version → table → entries
+_lock = threading.Lock()
+_stats = {"built": 0, "hits": 0, "learned": 0}
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _words(name: str) -> str:
+    return re.sub(r"(?<=[a-z])(?=[A-Z])|_+", " ", name).strip().lower()
+
+
+def _entry(kind: str, text: str, table: str, columns=(), group: Optional[str] = None) -> Dict[str, Any]:
+    return {"kind": kind, "text": text, "table": table, "columns": set(columns), "group": group}
+
+
+def _classify(info: Dict[str, Any]) -> Dict[str, List[str]]:
+    """{"measures", "dimensions", "dates"} column names of a table."""
+    keys = set(info.get("primary_key") or []) | {c for fk in info.get("foreign_keys") or [] for c in fk["columns"]}
+    measures, dimensions, dates = [], [], []
+    for col in info.get("columns") or []:
+        name, col_type = col["name"], (col.get("type") or "").lower()
+        if name in keys or _ID_RE.search(name):
+            continue
+        if any(t in col_type for t in _DATE_TYPES):
+            dates.append(name)
+        elif any(t in col_type for t in _NUMERIC_TYPES):
+            measures.append(name)
+        elif not _FREE_TEXT_RE.search(name):
+            dimensions.append(name)
+    return {"measures": measures[:3], "dimensions": dimensions[:3], "dates": dates[:1]}
+
+
+def _table_pool(table: str, info: Dict[str, Any], schema: Dict[str, Any]) -> List[Dict[str, Any]]:
+    cols = _classify(info)
+    rows = _words(table)
+    pool = [_entry("count", f"How many {rows} are there?", table)]
+    for m in cols["measures"]:
+        pool.append(_entry("top", f"Show the top 10 {rows} by {_words(m)}", table, [m]))
+    for d in cols["dimensions"]:
+        if cols["measures"]:
+            m = cols["measures"][0]
+            pool.append(_entry("breakdown", f"What is the total {_words(m)} by {_words(d)}?", table, [m, d], group=d))
+            pool.append(_entry("breakdown", f"Which {_words(d)} has the highest average {_words(m)}?", table, [m, d], group=d))
+        else:
+            pool.append(_entry("breakdown", f"How many {rows} are there per {_words(d)}?", table, [d], group=d))
+    for date in cols["dates"]:
+        if cols["measures"]:
+            m = cols["measures"][0]
+            pool.append(_entry("trend", f"How has total {_words(m)} changed month over month by {_words(date)}?",
+                               table, [m, date], group=date))
+        pool.append(_entry("trend", f"How many {rows} are there per month by {_words(date)}?", table, [date], group=date))
+
+    for fk in info.get("foreign_keys") or []:
+        ref = fk["ref_table"]
+        if ref in schema and ref != table:
+            pool.append(_entry("related", f"Show {rows} together with their {_words(ref)} details", table, fk["columns"]))
+    for child, child_info in schema.items():
+        for fk in child_info.get("foreign_keys") or []:
+            if fk["ref_table"] == table and child != table:
+                pool.append(_entry("related", f"Which {rows} have the most {_words(child)}?", table))
+    return pool
+
+
+def _get_pools(schema: Dict[str, Any], schema_version: str) -> Dict[str, List[Dict[str, Any]]]:
+    with _lock:
+        pools = _pools.get(schema_version)
+        if pools is not None:
+            _pools.move_to_end(schema_version)
+            _stats["hits"] += 1
+            return pools
+
+    pools = {table: _table_pool(table, info, schema) for table, info in schema.items()}
+    logger.debug("Built suggestion pools for schema version %s (%d tables)", schema_version, len(pools))
+    with _lock:
+        pools = _pools.setdefault(schema_version, pools)
+        _stats["built"] += 1
+        while len(_pools) > _MAX_POOLS:
+            _pools.popitem(last=False)
+    return pools
+
+
+def _load_sqlglot():
+    try:
+        import sqlglot
+        from sqlglot import exp
+        return sqlglot, exp
+    except ImportError:
+        return None, None
+
+
+def _query_context(sql: str, db_type: str = "sqlite") -> Dict[str, List[str]]:
+    """{"tables", "group_by", "filters"} column / table names used by sql."""
+    sqlglot, exp = _load_sqlglot()
+    if sqlglot is not None:
+        try:
+            tree = sqlglot.parse_one(sql, read=_DIALECTS.get(db_type.lower()))
+            group, where = tree.find(exp.Group), tree.find(exp.Where)
+            return {
+                "tables": list(dict.fromkeys(t.name for t in tree.find_all(exp.Table))),
+                "group_by": list(dict.fromkeys(c.name for c in group.find_all(exp.Column))) if group else [],
+                "filters": list(dict.fromkeys(c.name for c in where.find_all(exp.Column))) if where else [],
+            }
+        except Exception as e:   # unparsable — the regex scan below is good enough
+            logger.debug("Suggestion context: sqlglot could not parse SQL: %s", e)
+
+    group, where = _GROUP_RE.search(sql), _WHERE_RE.search(sql)
+    return {
+        "tables": list(dict.fromkeys(_TABLE_RE.findall(sql))),
+        "group_by": [
+            re.findall(r"\w+", part)[-1] for part in group.group(1).split(",") if re.findall(r"\w+", part)
+        ] if group else [],
+        "filters": list(dict.fromkeys(_FILTER_COL_RE.findall(where.group(1)))) if where else [],
+    }
+
+
+def _top_group(result: Dict[str, Any], group_col: str, measure: Optional[str]) -> Any:
+    """
+    The group value with the largest total of measure (else of the first numeric
+    result column) — the SQL's row order says nothing about it. Falls back to the
+    first value when no column is numeric.
+    """
+    labels = column_values(result, group_col)
+    candidates = [measure] if measure in result["columns"] else []
+    candidates += [c for c in result["columns"] if c not in (group_col, measure)]
+    for col in candidates:
+        totals: Dict[Any, float] = {}
+        for label, value in zip(labels, column_values(result, col)):
+            if label is not None and isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[label] = totals.get(label, 0.0) + value
+        if totals:
+            return max(totals, key=totals.get)
+    return next((v for v in labels if v is not None), None)
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def generate_local_suggestions(
+    question: str,
+    sql: str,
+    schema: Dict[str, Any],
+    schema_version: str,
+    db_type: str,
+    result: Dict[str, Any],
+    limit: int = 5,
+) -> List[str]:
+    """Up to limit follow-up questions for a query result, without an LLM call."""
+    if not schema:
+        return []
+    pools = _get_pools(schema, schema_version)
+    context = _query_context(sql, db_type)
+    tables = [t for t in context["tables"] if t in pools] or list(pools)[:1]
+    grouped, filtered = set(context["group_by"]), set(context["filters"])
+    used = grouped | filtered
+
+    candidates = []   # (score, entry)
+    main = tables[0]
+    main_cols = _classify(schema[main])
+
+    # Drill into the leading group of this result, by another dimension
+    group_col = next((g for g in context["group_by"] if g in result["columns"]), None)
+    m = main_cols["measures"][0] if main_cols["measures"] else None
+    top_value = _top_group(result, group_col, m) if group_col and m else None
+    if top_value is not None:
+        for d in [d for d in main_cols["dimensions"] + main_cols["dates"] if d not in grouped][:1]:
+            candidates.append((_SCORES["drill"], _entry(
+                "drill", f"What is the total {_words(m)} by {_words(d)} for {top_value}?", main, [m, d]
+            )))
+    for f in [f for f in context["filters"] if f in main_cols["dimensions"]][:1]:
+        measure = _words(main_cols["measures"][0]) if main_cols["measures"] else "the number of " + _words(main)
+        candidates.append((_SCORES["compare"], _entry(
+            "compare", f"How does {measure} compare across all {_words(f)} values?", main, [f]
+        )))
+
+    with _lock:   # learn_suggestions may extend a pool meanwhile
+        entries = [(rank, list(pools.get(table, []))) for rank, table in enumerate(tables)]
+    for rank, pool in entries:
+        for entry in pool:
+            if entry["group"] is not None and entry["group"] in grouped:
+                continue   # this breakdown is what the user is looking at
+            score = _SCORES[entry["kind"]] - 0.05 * rank
+            if entry["columns"] & used:
+                score += 0.1
+            candidates.append((score, entry))
+
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    asked = question.strip().lower().rstrip("?")
+    picked, per_kind, seen = [], {}, {asked}
+    for _score, entry in candidates:
+        key = entry["text"].lower().rstrip("?")
+        if key in seen or per_kind.get(entry["kind"], 0) >= _MAX_PER_KIND:
+            continue
+        seen.add(key)
+        per_kind[entry["kind"]] = per_kind.get(entry["kind"], 0) + 1
+        picked.append(entry["text"])
+        if len(picked) >= limit:
+            break
+    return picked
+
+
+def learn_suggestions(schema_version: str, sql: str, db_type: str, suggestions: List[str]) -> None:
+    """Keep LLM suggestions in the pool of the query's main table for later answers on it."""
+    if not suggestions:
+        return
+    tables = _query_context(sql, db_type)["tables"]
+    with _lock:
+        pools = _pools.get(schema_version)
+        if pools is None or not tables or tables[0] not in pools:
+            return
+        pool = pools[tables[0]]
+        known = {e["text"].lower() for e in pool}
+        learned = [e for e in pool if e["kind"] == "learned"]
+        for text in suggestions:
+            if text.lower() in known:
+                continue
+            entry = _entry("learned", text, tables[0])
+            pool.append(entry)
+            learned.append(entry)
+            known.add(text.lower())
+            _stats["learned"] += 1
+        for stale in learned[:-_MAX_LEARNED]:
+            pool.remove(stale)
+
+
+def get_suggestion_pool_stats() -> Dict[str, Any]:
+    """Pool builds / reuses and sizes, for /health."""
+    with _lock:
+        return {
+            **_stats,
+            "schema_versions": len(_pools),
+            "tables": sum(len(p) for p in _pools.values()),
+            "entries": sum(len(e) for p in _pools.values() for e in p.values()),
+        }
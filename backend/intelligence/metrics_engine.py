@@ -1,21 +1,24 @@
-from typing import List, Dict, Any
+from typing import Dict, Any
 from collections import Counter
 
 
-def generate_metrics(columns: List[str], data: List[Dict]) -> Dict[str, Any]:
-    if not data:
+def generate_metrics(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-column stats over a result set (processing.result_set)."""
+    columns = result["columns"]
+    if not result["row_count"]:
         return {
             "kpis": {"total_rows": 0, "total_columns": len(columns)},
             "numeric_stats": {},
             "text_stats": {},
         }
 
-    total_rows = len(data)
+    total_rows = result["row_count"]
     numeric_stats = {}
     text_stats = {}
 
-    for col in columns:
-        values = [row.get(col) for row in data]
+    for col, values in zip(columns, result["values"]):
+        if col in numeric_stats or col in text_stats:
+            continue   # duplicate column name — the first one wins
         non_null = [v for v in values if v is not None]
         null_count = total_rows - len(non_null)
 
@@ -67,3 +70,15 @@ def generate_metrics(columns: List[str], data: List[Dict]) -> Dict[str, Any]:
         "numeric_stats": numeric_stats,
         "text_stats": text_stats,
     }
+
+
+def sample_note(metrics: Dict[str, Any]) -> str:
+    """Prompt line for LLM stages when the stats only cover the fetched rows ("" otherwise)."""
+    if not metrics.get("sampled"):
+        return ""
+    total = metrics.get("kpis", {}).get("total_rows")
+    of_total = f" of {total}" if total else ""
+    return (
+        f"NOTE: SAMPLE DATA, STATS and KEY FINDINGS cover only the first {metrics.get('sample_rows')}"
+        f"{of_total} rows. Do not present their sums, shares or extremes as totals for the whole result.\n"
+    )
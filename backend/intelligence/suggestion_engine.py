@@ -2,21 +2,22 @@ import json
 import re
 from typing import List, Dict, Any
 from core.llm import get_llm_model
+from processing.result_set import sample_rows
 
 
 def generate_suggestions(
     question: str,
     schema: Dict,
-    data: List[Dict],
+    result: Dict[str, Any],
 ) -> List[str]:
 
     try:
-        model = get_llm_model()
+        model = get_llm_model("suggestions")
     except ValueError:
         return []
 
     tables = ", ".join(schema.keys())
-    sample = json.dumps(data[:5], default=str)
+    sample = json.dumps(sample_rows(result, 5), default=str)
 
     prompt = f"""You are a database analytics assistant. A user queried their database.
 
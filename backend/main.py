@@ -30,6 +30,10 @@ async def lifespan(app: FastAPI):
         logger.warning("RAG engine startup skipped (will retry on first use): %s", e)
     yield
     logger.info("BAAP AI v2 shutting down.")
+    from ingestion.connection_pool import close_all_pools
+    from processing.result_store import clear_results
+    close_all_pools()
+    clear_results()
 
 
 # ── App ───────────────────────────────────────────────────────────────────────
@@ -59,13 +63,35 @@ def root():
 
 @app.get("/health")
 def health():
-    """Health check + RAG store stats."""
+    """Health check plus the stats of each cache, pool and LLM stage (one key per subsystem)."""
     try:
         from rag.vector_store import get_store_stats
         rag_stats = get_store_stats()
     except Exception:
         rag_stats = {"status": "unavailable"}
-    return {"status": "ok", "version": "2.0.0", "rag": rag_stats}
+    from core.llm import get_llm_stats
+    from intelligence.commentary_engine import get_commentary_stats
+    from intelligence.local_suggestions import get_suggestion_pool_stats
+    from ingestion.connection_pool import get_pool_stats
+    from ingestion.schema_cache import get_schema_cache_stats
+    from processing.query_cache import get_query_cache_stats
+    from processing.result_store import get_result_store_stats
+    from processing.sql_templates import get_template_stats
+    from processing.translation_cache import get_translation_cache_stats
+    return {
+        "status": "ok",
+        "version": "2.0.0",
+        "rag": rag_stats,
+        "db_pools": get_pool_stats(),
+        "schema_cache": get_schema_cache_stats(),
+        "query_cache": get_query_cache_stats(),
+        "result_store": get_result_store_stats(),
+        "translation_cache": get_translation_cache_stats(),
+        "sql_templates": get_template_stats(),
+        "llm": get_llm_stats(),
+        "commentary": get_commentary_stats(),
+        "suggestion_pools": get_suggestion_pool_stats(),
+    }
 
 
 # Register modular routers
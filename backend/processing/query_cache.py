@@ -0,0 +1,208 @@
+"""
+Query Cache — BAAP AI v2
+Caches executed query results in front of execute_query.
+
+Key: (DB config fingerprint, normalized SQL + bind parameters). Normalization strips code fences and
+trailing semicolons, collapses whitespace and lower-cases everything outside
+quoted literals / identifiers, so trivially different spellings of one query share
+an entry.
+
+    QUERY_CACHE_ENABLED   — on/off (default on)
+    QUERY_CACHE_TTL       — seconds an entry is served (default 300)
+    QUERY_CACHE_MAX_MB    — memory budget; least recently used entries go first (default 64)
+
+Concurrent requests for the same key are coalesced: one executes, the others
+wait for its result (single-flight). Entries remember the tables their SQL reads,
+so /upload can drop exactly the entries that touch a replaced table; statements
+that do not return rows bypass the cache and clear the database's entries.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+from ingestion.connection_pool import config_fingerprint
+from processing.query_guard import table_aliases
+from processing.sql_agent import returns_rows, strip_fences
+from utils.helpers import env_bool, env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`)""")
+
+
+# ── Module State ──────────────────────────────────────────────────────────────
+
+_entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()   # LRU, most recent last
+_inflight: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_generations: Dict[str, int] = {}   # bumped per database on invalidation
+_lock = threading.Lock()
+_bytes = 0
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "evictions": 0, "invalidations": 0}
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def normalize_sql(sql: str) -> str:
+    """Whitespace / case-normalized SQL; quoted text is kept verbatim."""
+    parts = _QUOTED.split(strip_fences(sql).rstrip().rstrip(";"))
+    out = []
+    for i, part in enumerate(parts):
+        if i % 2:   # quoted literal or identifier
+            out.append(part)
+        else:
+            out.append(re.sub(r"\s+", " ", part).lower())
+    return "".join(out).strip()
+
+
+def _referenced_tables(sql: str) -> Set[str]:
+    return {t.lower() for t in table_aliases(sql).values()}
+
+
+def _estimate_bytes(value: Any) -> int:
+    """JSON size of whatever execute() returned (e.g. {"result": {...}, "total_rows": ...})."""
+    try:
+        return len(json.dumps(value, default=str)) + 256
+    except (TypeError, ValueError):
+        return 1 << 20
+
+
+def _drop_locked(key) -> None:
+    global _bytes
+    entry = _entries.pop(key, None)
+    if entry is not None:
+        _bytes -= entry["bytes"]
+
+
+def _store_locked(key, value: Dict[str, Any], tables: Set[str]) -> None:
+    global _bytes
+    _drop_locked(key)
+    size = _estimate_bytes(value)
+    budget = env_int("QUERY_CACHE_MAX_MB", 64) * 1024 * 1024
+    if size > budget:
+        return
+    _entries[key] = {"value": value, "tables": tables, "bytes": size, "stored_at": time.monotonic()}
+    _bytes += size
+    while _bytes > budget and _entries:
+        _drop_locked(next(iter(_entries)))
+        _stats["evictions"] += 1
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def cached_execute(
+    db_config: Dict[str, Any],
+    sql: str,
+    execute: Callable[[], Dict[str, Any]],
+    params: Optional[Sequence[Any]] = None,
+) -> Tuple[Dict[str, Any], str]:
+    """
+    Return execute()'s result for (db_config, sql), running it only when needed.
+
+    Args:
+        db_config: Database connection config dict.
+        sql:       The SQL that execute() runs.
+        execute:   Runs the query; its return value is cached and shared.
+        params:    Bind parameters execute() passes with sql (part of the key).
+
+    Returns:
+        (value, status) — status is "hit", "miss", "coalesced" or "bypass".
+    """
+    if not env_bool("QUERY_CACHE_ENABLED", True):
+        return execute(), "bypass"
+
+    fingerprint = config_fingerprint(db_config)
+    if not returns_rows(strip_fences(sql)):
+        # Writes may change any table — run them and forget this database's results
+        with _lock:
+            _stats["bypassed"] += 1
+        try:
+            return execute(), "bypass"
+        finally:
+            invalidate_database(db_config)
+
+    normalized = normalize_sql(sql)
+    if params is not None:
+        normalized += "\x00" + json.dumps(list(params), default=str)
+    key = (fingerprint, normalized)
+    ttl = env_float("QUERY_CACHE_TTL", 300.0)
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and time.monotonic() - entry["stored_at"] < ttl:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return entry["value"], "hit"
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = {"event": threading.Event(), "value": None, "error": None}
+            _inflight[key] = flight
+            generation = _generations.get(fingerprint, 0)
+
+    if not leader:
+        flight["event"].wait()
+        if flight["error"] is not None:
+            raise flight["error"]
+        with _lock:
+            _stats["coalesced"] += 1
+        return flight["value"], "coalesced"
+
+    try:
+        value = execute()
+        flight["value"] = value
+    except BaseException as e:
+        flight["error"] = e
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+            if flight["error"] is None:
+                _stats["misses"] += 1
+                # Skip storing if the database was invalidated while we ran
+                if _generations.get(fingerprint, 0) == generation:
+                    _store_locked(key, flight["value"], _referenced_tables(sql))
+        flight["event"].set()
+    return value, "miss"
+
+
+def invalidate_tables(db_config: Dict[str, Any], tables: Iterable[str]) -> int:
+    """
+    Drop cached results of db_config that read any of tables (e.g. after /upload
+    replaced one). Entries whose tables could not be determined are dropped too.
+    Returns the number of entries removed.
+    """
+    fingerprint = config_fingerprint(db_config)
+    names = {t.lower() for t in tables}
+    with _lock:
+        _generations[fingerprint] = _generations.get(fingerprint, 0) + 1
+        doomed = [
+            key for key, entry in _entries.items()
+            if key[0] == fingerprint and (not entry["tables"] or entry["tables"] & names)
+        ]
+        for key in doomed:
+            _drop_locked(key)
+        _stats["invalidations"] += len(doomed)
+    return len(doomed)
+
+
+def invalidate_database(db_config: Dict[str, Any]) -> int:
+    """Drop every cached result of db_config. Returns the number of entries removed."""
+    fingerprint = config_fingerprint(db_config)
+    with _lock:
+        _generations[fingerprint] = _generations.get(fingerprint, 0) + 1
+        doomed = [key for key in _entries if key[0] == fingerprint]
+        for key in doomed:
+            _drop_locked(key)
+        _stats["invalidations"] += len(doomed)
+    return len(doomed)
+
+
+def get_query_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters and memory use for /health."""
+    with _lock:
+        return {"entries": len(_entries), "bytes": _bytes, "inflight": len(_inflight), **_stats}
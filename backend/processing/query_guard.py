@@ -0,0 +1,312 @@
+"""
+Query Guard — BAAP AI v2
+Pre-execution cost check and server-side statement timeouts for generated SQL.
+
+Cost check — runs the dialect's EXPLAIN before the real query:
+    postgresql  EXPLAIN (FORMAT JSON)  → top-level "Total Cost", largest "Plan Rows"
+    mysql       EXPLAIN FORMAT=JSON    → query_cost, largest rows_produced_per_join
+    sqlite      EXPLAIN QUERY PLAN     → no cost model; rows are estimated from the
+                                         full-table SCANs and the schema row counts
+Plans above SQL_GUARD_MAX_COST / SQL_GUARD_MAX_ROWS are rejected with QueryRejectedError.
+
+A LIMIT bounds the row estimate of what streams into it: the nodes under a
+postgres Limit node, or (mysql / sqlite, whose plans do not show it) the
+statement's trailing LIMIT when nothing sorts, groups or aggregates first. So
+`SELECT a FROM big LIMIT 501` passes while a cartesian join without one does not.
+
+Timeouts — statement_timeout() bounds every statement run inside it:
+    postgresql  SET LOCAL statement_timeout (server cancels, transaction is rolled back on release)
+    mysql       SET SESSION MAX_EXECUTION_TIME (server interrupts read-only SELECTs)
+    sqlite      progress handler that interrupts the VM once the deadline passes
+A cancelled statement surfaces as QueryTimeoutError.
+"""
+
+import json
+import logging
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Sequence
+
+from processing.sql_agent import _run
+from utils.helpers import env_bool, env_float
+
+logger = logging.getLogger(__name__)
+
+_PG_QUERY_CANCELED = "57014"
+_MYSQL_MAX_EXECUTION_TIME_EXCEEDED = 3024
+
+# Nodes that read their whole input before passing on a row — a Limit above them does not bound it
+_PG_BLOCKING_NODES = {"Sort", "Incremental Sort", "Aggregate", "Hash", "Materialize", "WindowAgg", "SetOp"}
+_AGGREGATE_RE = re.compile(r"\b(?:count|sum|avg|min|max|total|group_concat|string_agg|array_agg)\s*\(", re.IGNORECASE)
+_TRAILING_LIMIT_RE = re.compile(
+    r"\blimit\s+(\d+)(?:\s*,\s*(\d+)|\s+offset\s+(\d+))?\s*;?\s*$", re.IGNORECASE
+)
+
+_SQL_KEYWORDS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "outer", "on", "using",
+    "group", "order", "limit", "having", "union", "natural", "window", "offset",
+    "select", "from", "and", "or",
+}
+
+
+# ── Errors ────────────────────────────────────────────────────────────────────
+
+class QueryGuardError(RuntimeError):
+    """Base for guard failures that route() reports as structured errors."""
+
+    error_type = "query_guard"
+
+    def __init__(self, message: str, details: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.details = details or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": self.error_type, "message": str(self), "details": self.details}
+
+
+class QueryRejectedError(QueryGuardError):
+    """The query plan is estimated to be too expensive to run."""
+
+    error_type = "query_rejected"
+
+
+class QueryTimeoutError(QueryGuardError):
+    """The database cancelled the statement after the configured timeout."""
+
+    error_type = "query_timeout"
+
+
+# ── Plan Inspection ───────────────────────────────────────────────────────────
+
+def _max_key(node, key: str) -> float:
+    """Largest numeric value stored under key anywhere in a nested EXPLAIN JSON tree."""
+    best = 0.0
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k == key:
+                try:
+                    best = max(best, float(v))
+                except (TypeError, ValueError):
+                    pass
+            else:
+                best = max(best, _max_key(v, key))
+    elif isinstance(node, list):
+        for item in node:
+            best = max(best, _max_key(item, key))
+    return best
+
+
+def _statement_limit(sql: str) -> Optional[float]:
+    """Rows the statement's trailing LIMIT lets through (offset included), or None."""
+    if _AGGREGATE_RE.search(sql):
+        return None   # an aggregate reads every row, whatever the LIMIT
+    match = _TRAILING_LIMIT_RE.search(sql.strip())
+    if not match:
+        return None
+    first, count, offset = match.groups()
+    if count is not None:   # mysql LIMIT offset, count
+        return float(first) + float(count)
+    return float(first) + float(offset or 0)
+
+
+def _pg_plan_rows(node: Dict[str, Any], cap: float = float("inf")) -> float:
+    """Largest "Plan Rows" in a postgres plan, each node bounded by the Limit node above it."""
+    rows = min(float(node.get("Plan Rows", 0) or 0), cap)
+    node_type = node.get("Node Type")
+    if node_type == "Limit":
+        cap = rows
+    elif node_type in _PG_BLOCKING_NODES:
+        cap = float("inf")
+    return max([rows] + [_pg_plan_rows(child, cap) for child in node.get("Plans") or []])
+
+
+def _explain_postgresql(cursor, sql: str, schema: Dict[str, Any], params) -> Dict[str, Any]:
+    _run(cursor, f"EXPLAIN (FORMAT JSON) {sql}", params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"]
+    return {"estimated_cost": float(root.get("Total Cost", 0)), "estimated_rows": _pg_plan_rows(root)}
+
+
+def _explain_mysql(cursor, sql: str, schema: Dict[str, Any], params) -> Dict[str, Any]:
+    _run(cursor, f"EXPLAIN FORMAT=JSON {sql}", params)
+    plan = json.loads(cursor.fetchone()[0])
+    block = plan.get("query_block", {})
+    cost = float(block.get("cost_info", {}).get("query_cost", 0) or 0)
+    rows = _max_key(block, "rows_produced_per_join")
+    text = json.dumps(block)
+    blocking = any(k in block for k in ("grouping_operation", "duplicates_removal", "windowing")) or (
+        '"using_filesort": true' in text or '"using_temporary_table": true' in text
+    )
+    limit = None if blocking else _statement_limit(sql)
+    return {"estimated_cost": cost, "estimated_rows": min(rows, limit) if limit is not None else rows}
+
+
+def table_aliases(sql: str) -> Dict[str, str]:
+    """
+    alias → table for FROM/JOIN/comma-join items (EXPLAIN QUERY PLAN reports aliases).
+    Schema-qualified names (public.orders, "sales"."orders") map to the bare table name.
+    """
+    aliases = {}
+    pattern = (
+        r'(?:\bfrom|\bjoin|,)\s*(?:[`"\[]?\w+[`"\]]?\.)*[`"\[]?(\w+)[`"\]]?'
+        r'(?:\s+(?:as\s+)?[`"]?(\w+)[`"]?)?'
+    )
+    for table, alias in re.findall(pattern, sql, flags=re.IGNORECASE):
+        aliases[table] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def _explain_sqlite(cursor, sql: str, schema: Dict[str, Any], params) -> Dict[str, Any]:
+    _run(cursor, f"EXPLAIN QUERY PLAN {sql}", params)
+    aliases = table_aliases(sql)
+    # Full scans under the same parent form nested loops (multiply); separate
+    # subqueries / materialized CTEs run one after another (add up)
+    loops: Dict[int, float] = {}
+    blocking = False   # a temp b-tree (ORDER BY / GROUP BY / DISTINCT) reads the top loop fully
+    for _id, parent, _unused, detail in cursor.fetchall():
+        if parent == 0 and detail.startswith("USE TEMP B-TREE"):
+            blocking = True
+        match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+        if not match:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        rows = (schema.get(table) or {}).get("row_count")
+        if rows is None:
+            continue
+        loops[parent] = loops.get(parent, 1.0) * max(float(rows), 1.0)
+    # Only the top-level loop streams into the LIMIT; subqueries run to completion
+    limit = None if blocking else _statement_limit(sql)
+    if limit is not None and 0 in loops:
+        loops[0] = min(loops[0], limit)
+    return {"estimated_cost": None, "estimated_rows": sum(loops.values())}
+
+
+_EXPLAINERS = {
+    "postgresql": _explain_postgresql,
+    "mysql": _explain_mysql,
+    "sqlite": _explain_sqlite,
+}
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def check_query_cost(
+    conn, sql: str, db_type: str, schema: Dict[str, Any], params: Optional[Sequence[Any]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    EXPLAIN the query (with its bind parameters, if any) and reject it if the plan is too expensive.
+
+    Returns:
+        {"estimated_cost": float | None, "estimated_rows": float}, or None when the
+        guard is disabled or the statement could not be explained.
+
+    Raises:
+        QueryRejectedError: estimated cost or rows exceed the configured limits.
+    """
+    explain = _EXPLAINERS.get(db_type.lower())
+    if explain is None or not env_bool("SQL_GUARD_ENABLED", True):
+        return None
+
+    cursor = conn.cursor()
+    try:
+        plan = explain(cursor, sql, schema, params)
+    except Exception as e:
+        logger.info("EXPLAIN failed, skipping cost guard: %s", e)
+        if db_type.lower() == "postgresql":
+            conn.rollback()   # a failed statement aborts the transaction
+        return None
+    finally:
+        cursor.close()
+
+    max_cost = env_float("SQL_GUARD_MAX_COST", 50_000_000)
+    max_rows = env_float("SQL_GUARD_MAX_ROWS", 100_000_000)
+    cost, rows = plan["estimated_cost"], plan["estimated_rows"]
+
+    if cost is not None and cost > max_cost:
+        raise QueryRejectedError(
+            f"Query rejected: estimated cost {cost:,.0f} exceeds the limit of {max_cost:,.0f}. "
+            "Try narrowing it with filters or aggregation.",
+            {**plan, "max_cost": max_cost, "sql": sql},
+        )
+    if rows > max_rows:
+        raise QueryRejectedError(
+            f"Query rejected: the plan would process about {rows:,.0f} rows "
+            f"(limit {max_rows:,.0f}). Check for a missing join condition or add filters.",
+            {**plan, "max_rows": max_rows, "sql": sql},
+        )
+    return plan
+
+
+@contextmanager
+def statement_timeout(conn, db_type: str, seconds: Optional[float] = None):
+    """
+    Bound every statement executed inside the block to `seconds`
+    (default SQL_STATEMENT_TIMEOUT; 0 disables). Raises QueryTimeoutError on cancel.
+    """
+    if seconds is None:
+        seconds = env_float("SQL_STATEMENT_TIMEOUT", 30.0)
+    db_type = db_type.lower()
+    if not seconds or seconds <= 0:
+        yield
+        return
+
+    ms = int(seconds * 1000)
+    timed_out = {"flag": False}
+
+    if db_type == "postgresql":
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SET LOCAL statement_timeout = {ms}")
+        finally:
+            cursor.close()
+    elif db_type == "mysql":
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {ms}")
+        finally:
+            cursor.close()
+    elif db_type == "sqlite":
+        deadline = time.monotonic() + seconds
+
+        def _interrupt_after_deadline():
+            if time.monotonic() > deadline:
+                timed_out["flag"] = True
+                return 1
+            return 0
+
+        conn.set_progress_handler(_interrupt_after_deadline, 10_000)
+
+    try:
+        yield
+    except Exception as e:
+        cause = e.__cause__ or e.__context__ or e
+        if (
+            timed_out["flag"]
+            or getattr(e, "pgcode", None) == _PG_QUERY_CANCELED
+            or getattr(cause, "pgcode", None) == _PG_QUERY_CANCELED
+            or getattr(e, "errno", None) == _MYSQL_MAX_EXECUTION_TIME_EXCEEDED
+            or getattr(cause, "errno", None) == _MYSQL_MAX_EXECUTION_TIME_EXCEEDED
+        ):
+            raise QueryTimeoutError(
+                f"Query cancelled after {seconds:g}s (statement timeout). "
+                "Try a narrower question or add filters.",
+                {"timeout_seconds": seconds},
+            ) from e
+        raise
+    finally:
+        if db_type == "mysql":
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SET SESSION MAX_EXECUTION_TIME = DEFAULT")
+            except Exception:
+                pass
+            finally:
+                cursor.close()
+        elif db_type == "sqlite":
+            conn.set_progress_handler(None, 0)
+        # postgresql: SET LOCAL ends with the transaction
@@ -0,0 +1,86 @@
+"""
+Result Serializer — BAAP AI v2
+Column-wise conversion of DB driver values into JSON-safe Python values.
+
+The old per-cell loop ran hasattr/isinstance checks on every value. Here each
+column is inspected once: the set of Python types it holds decides a single
+converter for the whole column, and columns that are already JSON-safe
+(int / float / str / bool / None — the common case) are passed through untouched.
+Type sets are used rather than cursor.description type codes because the three
+drivers disagree on those (SQLite reports none at all).
+
+Conversion rules (unchanged from the per-cell version):
+    None                          → None
+    date / time / datetime        → isoformat()
+    bytes                         → utf-8 text (invalid bytes replaced)
+    int / float / str / bool      → as-is
+    anything else (Decimal, ...)  → str()
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+_NONE_TYPE = type(None)
+_JSON_SAFE = (int, float, str)   # bool is an int subclass
+
+
+# ── Converters ────────────────────────────────────────────────────────────────
+
+def _decode_bytes(val: bytes) -> str:
+    return val.decode("utf-8", errors="replace")
+
+
+def _converter_for(kind: type) -> Optional[Callable[[Any], Any]]:
+    """Pick the converter for one Python type (None = keep the value as-is)."""
+    if issubclass(kind, _JSON_SAFE):
+        return None
+    if hasattr(kind, "isoformat"):   # datetime / date / time
+        return kind.isoformat
+    if issubclass(kind, bytes):
+        return _decode_bytes
+    return str
+
+
+def _convert_column(values: Sequence[Any]) -> List[Any]:
+    kinds = set(map(type, values))
+    has_nulls = _NONE_TYPE in kinds
+    kinds.discard(_NONE_TYPE)
+    converters: Dict[type, Optional[Callable]] = {k: _converter_for(k) for k in kinds}
+    active = {k: f for k, f in converters.items() if f is not None}
+
+    if not active:
+        return list(values)
+
+    if len(converters) == 1:
+        (convert,) = active.values()
+        if not has_nulls:
+            return list(map(convert, values))
+        return [None if v is None else convert(v) for v in values]
+
+    # Mixed-type column (e.g. SQLite dynamic typing) — dispatch on type per value
+    return [
+        v if v is None else (active[type(v)](v) if type(v) in active else v)
+        for v in values
+    ]
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def serialize_columns(columns: List[str], rows: Sequence[Sequence[Any]]) -> List[List[Any]]:
+    """
+    Convert raw driver rows into one JSON-safe list per column.
+
+    Args:
+        columns: Column names (only the count is used).
+        rows:    Rows as returned by fetchmany/fetchall.
+
+    Returns:
+        List of column arrays, in the same order as columns.
+    """
+    if not rows:
+        return [[] for _ in columns]
+    return [_convert_column(col) for col in zip(*rows)]
+
+
+def serialize_rows(columns: List[str], rows: Sequence[Sequence[Any]]) -> List[Tuple[Any, ...]]:
+    """Row-oriented form of serialize_columns (list of tuples)."""
+    return list(zip(*serialize_columns(columns, rows)))
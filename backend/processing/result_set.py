@@ -0,0 +1,93 @@
+"""
+Result Set — BAAP AI v2
+Single column-oriented representation of a query result shared by the SQL pipeline.
+
+A result set is a plain dict:
+    {
+        "columns":   ["region", "revenue", ...],
+        "values":    [[...], [...], ...],   # one JSON-safe list per column, same order
+        "row_count": int,
+    }
+
+Metrics, charts and the LLM prompt samples read columns / sample rows from it
+directly; row dicts are only built when a client asks for the legacy row format.
+
+Wire formats for the /api/query "data" field (QueryRequest.result_format):
+    "rows"      — list of row dicts (default, unchanged)
+    "columnar"  — {"format": "columnar", "row_count": N, "columns": [...]} where each
+                  entry is aligned with the response "columns" and is either
+                  {"values": [...]} or, for low-cardinality text columns,
+                  {"dictionary": [...distinct values...], "codes": [...indexes...]}
+"""
+
+from typing import Any, Dict, List, Optional
+
+from utils.helpers import env_float, env_int
+
+RESULT_FORMATS = ("rows", "columnar")
+
+
+# ── Construction / Access ─────────────────────────────────────────────────────
+
+def make_result_set(columns: List[str], values: List[List[Any]]) -> Dict[str, Any]:
+    """Wrap column arrays (see result_serializer.serialize_columns) as a result set."""
+    return {
+        "columns": columns,
+        "values": values,
+        "row_count": len(values[0]) if values else 0,
+    }
+
+
+def column_values(result: Dict[str, Any], name: str) -> List[Any]:
+    """Values of the first column called name (empty list if there is none)."""
+    try:
+        return result["values"][result["columns"].index(name)]
+    except ValueError:
+        return []
+
+
+def sample_rows(result: Dict[str, Any], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """First `limit` rows (all rows if None) as dicts, e.g. for LLM prompts."""
+    columns = result["columns"]
+    values = result["values"] if limit is None else [col[:limit] for col in result["values"]]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+# ── Wire Encoding ─────────────────────────────────────────────────────────────
+
+def _encode_column(values: List[Any], max_ratio: float, min_rows: int) -> Dict[str, Any]:
+    n = len(values)
+    if n < min_rows or not all(v is None or isinstance(v, str) for v in values):
+        return {"values": values}
+
+    codes_by_value: Dict[Any, int] = {}
+    limit = int(n * max_ratio)
+    for v in values:
+        if v not in codes_by_value:
+            if len(codes_by_value) >= limit:
+                return {"values": values}   # too many distinct values to pay off
+            codes_by_value[v] = len(codes_by_value)
+
+    return {
+        "dictionary": list(codes_by_value),
+        "codes": [codes_by_value[v] for v in values],
+    }
+
+
+def encode_data(result: Dict[str, Any], result_format: str = "rows") -> Any:
+    """
+    Render the result set for the response "data" field.
+
+    Dictionary encoding applies to text columns with at least RESULT_DICT_MIN_ROWS
+    rows (default 16) and at most RESULT_DICT_MAX_RATIO distinct values per row (default 0.5).
+    """
+    if result_format != "columnar":
+        return sample_rows(result)
+
+    max_ratio = env_float("RESULT_DICT_MAX_RATIO", 0.5)
+    min_rows = env_int("RESULT_DICT_MIN_ROWS", 16)
+    return {
+        "format": "columnar",
+        "row_count": result["row_count"],
+        "columns": [_encode_column(col, max_ratio, min_rows) for col in result["values"]],
+    }
@@ -0,0 +1,451 @@
+"""
+Result Store — BAAP AI v2
+Server-side result handles: /api/query returns a result_id whose rows can be paged
+through /api/results/{id} without re-running the SQL for every page.
+
+    small results  — the rows /api/query already fetched are kept in memory
+    large results  — (display cap hit) status "preview": only the fetched rows are
+                     kept. The first page request past them runs the complete query
+                     once more in the background and spills it to a temp file, read
+                     back memory-mapped (status "materializing", then "ready"):
+                         Arrow IPC file               (pyarrow installed)
+                         NDJSON + batch offset index  (fallback)
+                     Most users never page past the preview, so the query is not
+                     re-run up front; RESULT_STORE_EAGER_SPILL=true spills on register.
+
+Eviction:
+    RESULT_STORE_TTL             — seconds since last access (default 1800)
+    RESULT_STORE_MAX_ENTRIES     — LRU beyond this many handles (default 64)
+    RESULT_STORE_DISK_BUDGET_MB  — LRU spill files while the total is above it (default 1024);
+                                   a single spill that would not fit stops early and
+                                   is served as a partial result (complete = False)
+Spill files live in RESULT_STORE_DIR (default <tmp>/baap_results). The statement
+timeout (export_timeout) bounds starting the spill query, not writing the file;
+MySQL, which cannot lift it mid-read, gets RESULT_STORE_SPILL_TIMEOUT (default 600s).
+"""
+
+import bisect
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from ingestion.db_loader import get_connection
+from ingestion.schema_cache import get_cached_schema
+from processing.query_guard import check_query_cost, statement_timeout
+from processing.result_stream import (
+    SchemaMismatchError, arrow_record_batch, arrow_schema, export_timeout, load_pyarrow,
+)
+from processing.sql_agent import stream_query
+from utils.helpers import env_bool, env_float, env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+
+# ── Module State ──────────────────────────────────────────────────────────────
+
+_entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()   # LRU order, most recent last
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_stats = {"registered": 0, "spilled": 0, "spill_failures": 0, "evicted": 0}
+
+
+# ── Spill Files ───────────────────────────────────────────────────────────────
+
+class _ArrowSpill:
+    """
+    Arrow IPC file; one record batch per fetch batch, schema from the first (see
+    arrow_schema). A later batch that does not fit rewrites the file with the
+    widened schema, so no value is lost.
+    """
+
+    suffix = ".arrow"
+
+    def __init__(self, pa, path: str, columns: List[str]):
+        self._pa = pa
+        self._path = path
+        self._columns = columns
+        self._current = path   # file being written; a rewrite alternates with path + ".tmp"
+        self._writer = None
+        self._schema = None
+
+    def write(self, batch: List[List[Any]]) -> None:
+        pa = self._pa
+        if self._writer is None:
+            self._schema = arrow_schema(pa, self._columns, [batch])
+            self._writer = pa.ipc.new_file(self._path, self._schema)
+        while True:
+            try:
+                record_batch = arrow_record_batch(pa, batch, self._schema)
+                break
+            except SchemaMismatchError as e:
+                self._rewrite(e.schema)
+        self._writer.write_batch(record_batch)
+
+    def _rewrite(self, schema) -> None:
+        """Re-encode the batches written so far in schema (batch boundaries kept); keep writing there."""
+        pa = self._pa
+        self._writer.close()
+        source_path = self._current
+        self._current = self._path + ".tmp" if source_path == self._path else self._path
+        self._writer = pa.ipc.new_file(self._current, schema)
+        with pa.memory_map(source_path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                self._writer.write_batch(pa.record_batch(
+                    [col.cast(f.type) for col, f in zip(batch.columns, schema)], schema=schema
+                ))
+        os.remove(source_path)
+        self._schema = schema
+        logger.info("Spill %s rewritten with a widened schema", os.path.basename(self._path))
+
+    def size(self) -> int:
+        return os.path.getsize(self._current) if os.path.exists(self._current) else 0
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            if self._current != self._path:
+                os.replace(self._current, self._path)
+
+
+class _NdjsonSpill:
+    """One JSON array per row; the batch offsets recorded in the entry make pages seekable."""
+
+    suffix = ".ndjson"
+
+    def __init__(self, path: str, columns: List[str]):
+        self._file = open(path, "wb")
+        self.offsets: List[int] = []
+
+    def write(self, batch: List[List[Any]]) -> None:
+        self.offsets.append(self._file.tell())
+        lines = [json.dumps(list(row), default=str) for row in zip(*batch)]
+        self._file.write(("\n".join(lines) + "\n").encode("utf-8"))
+
+    def size(self) -> int:
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _read_arrow(entry: Dict[str, Any], offset: int, limit: int) -> List[list]:
+    pa = load_pyarrow()
+    starts = entry["batch_starts"]
+    first = bisect.bisect_right(starts, offset) - 1
+    with pa.memory_map(entry["path"]) as source:
+        reader = pa.ipc.open_file(source)
+        batches = []
+        i, covered = first, starts[first]
+        while i < reader.num_record_batches and covered < offset + limit:
+            batch = reader.get_batch(i)
+            batches.append(batch)
+            covered += batch.num_rows
+            i += 1
+        table = pa.Table.from_batches(batches).slice(offset - starts[first], limit)
+        return [list(row) for row in zip(*(col.to_pylist() for col in table.columns))]
+
+
+def _read_ndjson(entry: Dict[str, Any], offset: int, limit: int) -> List[list]:
+    starts = entry["batch_starts"]
+    i = bisect.bisect_right(starts, offset) - 1
+    rows = []
+    with open(entry["path"], "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(entry["batch_offsets"][i])
+        for _ in range(offset - starts[i]):
+            mm.readline()
+        while len(rows) < limit:
+            line = mm.readline()
+            if not line:
+                break
+            rows.append(json.loads(line))
+    return rows
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _store_dir() -> str:
+    path = env_str("RESULT_STORE_DIR", os.path.join(tempfile.gettempdir(), "baap_results"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=env_int("RESULT_STORE_WORKERS", 2), thread_name_prefix="result-spill"
+            )
+        return _executor
+
+
+def _remove_file(path: Optional[str]) -> None:
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Could not remove spill file %s: %s", path, e)
+
+
+def _evict_locked() -> List[str]:
+    """Apply TTL / entry-count / disk-budget limits. Returns spill files to delete."""
+    now = time.monotonic()
+    ttl = env_float("RESULT_STORE_TTL", 1800.0)
+    max_entries = env_int("RESULT_STORE_MAX_ENTRIES", 64)
+    budget = env_int("RESULT_STORE_DISK_BUDGET_MB", 1024) * 1024 * 1024
+
+    doomed = [rid for rid, e in _entries.items() if now - e["last_access"] > ttl]
+    alive = [rid for rid in _entries if rid not in doomed]
+    doomed += alive[: max(0, len(alive) - max_entries)]
+
+    # Running spills enforce the budget themselves; evict finished ones, oldest first,
+    # but never the most recently used handle (a partial spill keeps what it wrote)
+    newest = next(reversed(_entries), None)
+    disk = sum(e["bytes"] for rid, e in _entries.items() if rid not in doomed)
+    for rid, e in _entries.items():
+        if disk <= budget:
+            break
+        if rid not in doomed and rid != newest and e["bytes"] and e["status"] != "materializing":
+            doomed.append(rid)
+            disk -= e["bytes"]
+
+    paths = []
+    for rid in doomed:
+        entry = _entries.pop(rid)
+        _stats["evicted"] += 1
+        paths.append(entry.get("path"))
+    return paths
+
+
+def _evict() -> None:
+    with _lock:
+        paths = _evict_locked()
+    for path in paths:
+        _remove_file(path)
+
+
+def _materialize(result_id: str, db_config: Dict[str, Any], sql: str, params: Optional[Sequence[Any]]) -> None:
+    """Background job: run the complete query once and spill it to disk."""
+    db_type = db_config["db_type"].lower()
+    budget = env_int("RESULT_STORE_DISK_BUDGET_MB", 1024) * 1024 * 1024
+    max_rows = env_int("RESULT_STORE_MAX_ROWS", 5_000_000)
+    pa = load_pyarrow()
+    spill = None
+    path = None
+    conn = get_connection(db_config)
+    try:
+        check_query_cost(conn, sql, db_type, get_cached_schema(conn, db_config), params)
+        with ExitStack() as timer:
+            # mysql cannot lift its limit mid-read, so it gets the spill's own, larger one
+            timeout = env_float("RESULT_STORE_SPILL_TIMEOUT", 600.0) if db_type == "mysql" else export_timeout()
+            timer.enter_context(statement_timeout(conn, db_type, timeout))
+            columns, batches = stream_query(conn, sql, db_type, max_rows=max_rows, params=params)
+            if db_type != "mysql":   # as in result_stream: bound the start, not the spill
+                timer.close()
+            suffix = _ArrowSpill.suffix if pa is not None else _NdjsonSpill.suffix
+            path = os.path.join(_store_dir(), result_id + suffix)
+            spill = _ArrowSpill(pa, path, columns) if pa is not None else _NdjsonSpill(path, columns)
+
+            starts: List[int] = []
+            rows = 0
+            complete = True
+            for batch in batches:
+                size = spill.size()
+                with _lock:
+                    entry = _entries.get(result_id)
+                    if entry is not None:
+                        entry["path"], entry["bytes"] = path, size
+                if entry is None:
+                    raise RuntimeError("result handle evicted while spilling")
+                if size > budget:
+                    complete = False   # would not fit the disk budget — keep what was written
+                    break
+                starts.append(rows)
+                spill.write(batch)
+                rows += len(batch[0]) if batch else 0
+            batches.close()   # releases the cursor if we stopped early
+            spill.close()
+
+        with _lock:
+            entry = _entries.get(result_id)
+            if entry is None:
+                raise RuntimeError("result handle evicted while spilling")
+            entry.update({
+                "status": "ready",
+                "storage": "arrow" if pa is not None else "ndjson",
+                "preview": None,   # rows now live on disk
+                "row_count": rows,
+                "complete": complete and rows < max_rows,
+                "batch_starts": starts or [0],
+                "batch_offsets": getattr(spill, "offsets", None),
+                "bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+            })
+            _stats["spilled"] += 1
+        logger.info("Result %s spilled to disk (%d rows)", result_id, rows)
+    except Exception as e:
+        logger.warning("Result %s could not be materialized: %s", result_id, e)
+        if spill is not None:
+            try:
+                spill.close()
+            except Exception:
+                pass
+        _remove_file(path)
+        with _lock:
+            _stats["spill_failures"] += 1
+            entry = _entries.get(result_id)
+            if entry is not None:
+                entry.update({"status": "failed", "error": str(e), "path": None, "bytes": 0})
+    finally:
+        conn.close()
+    _evict()
+
+
+def _start_spill(result_id: str) -> None:
+    """Move a "preview" handle to "materializing" and spill it (once)."""
+    with _lock:
+        entry = _entries.get(result_id)
+        if entry is None or entry["status"] != "preview":
+            return
+        entry["status"] = "materializing"
+        db_config, sql, params = entry.pop("query")
+    _get_executor().submit(_materialize, result_id, db_config, sql, params)
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def register_result(
+    db_config: Dict[str, Any],
+    sql: str,
+    result: Dict[str, Any],
+    has_more: bool,
+    params: Optional[Sequence[Any]] = None,
+) -> str:
+    """
+    Create a handle for a query result (processing.result_set format).
+
+    Complete results are kept in memory as-is. When has_more is set, the fetched
+    rows serve as a preview; the full query (sql with its bind params) is spilled
+    in the background once a page past the preview is requested (see module docstring).
+    """
+    result_id = uuid.uuid4().hex
+    now = time.monotonic()
+    entry = {
+        "columns": result["columns"],
+        "status": "preview" if has_more else "ready",
+        "storage": "memory",
+        "preview": result["values"],
+        "row_count": result["row_count"],
+        "total_rows": None,
+        "complete": not has_more,
+        "path": None,
+        "bytes": 0,
+        "error": None,
+        "query": (db_config, sql, params) if has_more else None,   # for the deferred spill
+        "created_at": now,
+        "last_access": now,
+    }
+    with _lock:
+        _entries[result_id] = entry
+        _stats["registered"] += 1
+        paths = _evict_locked()
+    for path in paths:
+        _remove_file(path)
+
+    if has_more and env_bool("RESULT_STORE_EAGER_SPILL", False):
+        _start_spill(result_id)
+    return result_id
+
+
+def has_result(result_id: str) -> bool:
+    """True while the handle exists (not evicted)."""
+    with _lock:
+        return result_id in _entries
+
+
+def set_total_rows(result_id: str, total_rows: Optional[int]) -> None:
+    """Record the known total row count (e.g. from count_rows) for page responses."""
+    with _lock:
+        entry = _entries.get(result_id)
+        if entry is not None:
+            entry["total_rows"] = total_rows
+
+
+def get_result_page(result_id: str, offset: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+    """
+    One page of a stored result, or None if the handle is unknown or expired.
+
+    Pages inside the preview are served from memory. The first page past a
+    capped preview starts the spill; until it finishes such pages come back
+    empty with status "materializing".
+    """
+    _evict()
+    limit = max(0, min(limit, env_int("RESULT_PAGE_MAX_ROWS", 1000)))
+    offset = max(0, offset)
+    with _lock:
+        entry = _entries.get(result_id)
+        if entry is None:
+            return None
+        entry["last_access"] = time.monotonic()
+        _entries.move_to_end(result_id)
+        snapshot = dict(entry)
+    if snapshot["status"] == "preview" and offset + limit > snapshot["row_count"]:
+        _start_spill(result_id)
+        snapshot["status"] = "materializing"
+
+    rows: List[list] = []
+    if snapshot["preview"] is not None:
+        rows = [list(r) for r in zip(*(col[offset:offset + limit] for col in snapshot["preview"]))]
+    elif snapshot["status"] == "ready" and offset < snapshot["row_count"]:
+        reader = _read_arrow if snapshot["storage"] == "arrow" else _read_ndjson
+        try:
+            rows = reader(snapshot, offset, limit)
+        except FileNotFoundError:
+            return None   # evicted between lookup and read
+
+    columns = snapshot["columns"]
+    return {
+        "result_id": result_id,
+        "status": snapshot["status"],
+        "columns": columns,
+        "offset": offset,
+        "limit": limit,
+        "data": [dict(zip(columns, row)) for row in rows],
+        "available_rows": snapshot["row_count"],
+        "total_rows": snapshot["total_rows"],
+        "complete": snapshot["complete"],
+        "error": snapshot["error"],
+    }
+
+
+def clear_results() -> None:
+    """Drop every handle and delete its spill file (used on shutdown)."""
+    with _lock:
+        paths = [e.get("path") for e in _entries.values()]
+        _entries.clear()
+    for path in paths:
+        _remove_file(path)
+
+
+def get_result_store_stats() -> Dict[str, Any]:
+    """Handle / spill counters for /health."""
+    with _lock:
+        return {
+            "entries": len(_entries),
+            "previews": sum(1 for e in _entries.values() if e["status"] == "preview"),
+            "spilling": sum(1 for e in _entries.values() if e["status"] == "materializing"),
+            "disk_bytes": sum(e["bytes"] for e in _entries.values()),
+            **_stats,
+        }
@@ -0,0 +1,343 @@
+"""
+Result Stream — BAAP AI v2
+Streams a query's complete result straight from the DB cursor to the client.
+
+Formats:
+    arrow   — Apache Arrow IPC stream, one record batch per fetch batch
+              (application/vnd.apache.arrow.stream). pyarrow is optional: without
+              it the request falls back to NDJSON.
+    ndjson  — newline-delimited JSON (application/x-ndjson):
+                  {"type": "columns", "columns": [...]}
+                  [v1, v2, ...]                 ← one array per row
+                  ...
+                  {"type": "end", "row_count": N, "limited": bool}
+              A failure mid-stream is reported as {"type": "error", "message": ...}.
+
+Exports (open_export_stream):
+    csv      — header row + one line per row (text/csv)
+    parquet  — one row group per SQL_EXPORT_ROW_GROUP_SIZE rows (default 100k);
+               requires pyarrow
+
+Only one fetch batch (SQL_FETCH_BATCH_SIZE rows) is held in memory at a time
+(one row group for Parquet). Arrow / Parquet column types are inferred from the
+first SQL_ARROW_SCHEMA_ROWS rows (see arrow_schema): ints stay int64, a column
+mixing ints and floats is float64, any other mix is text.
+The connection comes from the pool and the same cost guard as /api/query
+applies. The statement timeout bounds running the query up to its first batch,
+not the time spent handing rows to a slow client (on MySQL, whose limit can only
+be reset once the result is read, it covers the whole stream).
+"""
+
+import csv
+import io
+import json
+import logging
+from contextlib import ExitStack
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ingestion.db_loader import get_connection
+from ingestion.schema_cache import get_cached_schema
+from processing.query_guard import check_query_cost, statement_timeout
+from processing.sql_agent import stream_query
+from utils.helpers import env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _inferred_array(pa, values: List[Any]):
+    """Arrow array with the type pyarrow infers, or None for mixed value types (SQLite)."""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+
+
+def _common_type(pa, a, b):
+    """Narrowest type holding values of both: int + float → float64, other mixes → string."""
+    if a == b or pa.types.is_null(b):
+        return a
+    if pa.types.is_null(a):
+        return b
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in (a, b)):
+        return pa.float64()
+    return pa.string()
+
+
+class _ChunkSink:
+    """Write-only file object whose bytes are handed out in chunks; tell() counts every byte written."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._written = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._written += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._written   # Parquet footers record absolute offsets
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _record_batches(pa, columns: List[str], batches: Iterator[List[List[Any]]]):
+    """
+    (schema, record batch iterator). The schema is inferred from the batches in the
+    first SQL_ARROW_SCHEMA_ROWS rows (default 10k); a later batch that still does
+    not fit it ends the stream with SchemaMismatchError — never a silent null.
+    """
+    window_rows = env_int("SQL_ARROW_SCHEMA_ROWS", 10_000)
+    head, rows = [], 0
+    for batch in batches:
+        head.append(batch)
+        rows += len(batch[0]) if batch else 0
+        if rows >= window_rows:
+            break
+    schema = arrow_schema(pa, columns, head)
+
+    def _iter():
+        for batch in head:
+            yield arrow_record_batch(pa, batch, schema)
+        for batch in batches:
+            yield arrow_record_batch(pa, batch, schema)
+
+    return schema, _iter()
+
+
+def _encode_arrow(pa, columns: List[str], batches: Iterator[List[List[Any]]]) -> Iterator[bytes]:
+    schema, record_batches = _record_batches(pa, columns, batches)
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema) as writer:
+        yield sink.drain()   # schema message — lets the client set up the table before any rows
+        for record_batch in record_batches:
+            writer.write_batch(record_batch)
+            yield sink.drain()
+    yield sink.drain()   # end-of-stream marker
+
+
+def _encode_parquet(pa, columns: List[str], batches: Iterator[List[List[Any]]]) -> Iterator[bytes]:
+    import pyarrow.parquet as pq
+
+    group_size = env_int("SQL_EXPORT_ROW_GROUP_SIZE", 100_000)
+    schema, record_batches = _record_batches(pa, columns, batches)
+    sink = _ChunkSink()
+    pending, pending_rows = [], 0
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema) as writer:
+        for record_batch in record_batches:
+            pending.append(record_batch)
+            pending_rows += record_batch.num_rows
+            if pending_rows >= group_size:
+                # One row group per group_size rows — memory is bounded by a row group
+                writer.write_table(pa.Table.from_batches(pending, schema=schema), row_group_size=group_size)
+                pending, pending_rows = [], 0
+                yield sink.drain()
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema=schema), row_group_size=group_size)
+    yield sink.drain()   # last row group + footer
+
+
+def _encode_csv(columns: List[str], batches: Iterator[List[List[Any]]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def _drain() -> bytes:
+        data = buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+        return data
+
+    writer.writerow(columns)
+    yield _drain()
+    for batch in batches:
+        writer.writerows(zip(*batch))
+        yield _drain()
+
+
+def _encode_ndjson(columns: List[str], batches: Iterator[List[List[Any]]], progress: Dict[str, int]) -> Iterator[bytes]:
+    progress["started"] = 1
+    yield (json.dumps({"type": "columns", "columns": columns}) + "\n").encode("utf-8")
+    for batch in batches:
+        lines = [json.dumps(list(row), default=str) for row in zip(*batch)]
+        progress["rows"] += len(lines)
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _stream(
+    conn, sql: str, db_type: str, fmt: str, max_rows: Optional[int], timeout: Optional[float], pa
+) -> Iterator[bytes]:
+    progress = {"rows": 0, "started": 0}
+    try:
+        with ExitStack() as timer:
+            timer.enter_context(statement_timeout(conn, db_type, timeout))
+            columns, batches = stream_query(conn, sql, db_type, max_rows=max_rows)
+            if db_type != "mysql":   # mysql: no SET while an unbuffered result is open
+                timer.close()   # first batch fetched — the client's pace is not the query's
+            if fmt == "arrow":
+                yield from _encode_arrow(pa, columns, batches)
+                return
+            if fmt == "parquet":
+                yield from _encode_parquet(pa, columns, batches)
+                return
+            if fmt == "csv":
+                yield from _encode_csv(columns, batches)
+                return
+            yield from _encode_ndjson(columns, batches, progress)
+    except Exception as e:
+        if fmt != "ndjson" or not progress["started"]:
+            # No in-band errors in these formats: the aborted response (missing
+            # end-of-stream marker / Parquet footer) tells the client it is incomplete
+            raise
+        logger.warning("Result stream failed after %d rows: %s", progress["rows"], e)
+        error = {"type": "error", "message": str(e), "row_count": progress["rows"]}
+        yield (json.dumps(error) + "\n").encode("utf-8")
+        return
+    finally:
+        conn.close()   # returns the connection to the pool
+
+    rows = progress["rows"]
+    end = {"type": "end", "row_count": rows, "limited": bool(max_rows) and rows >= max_rows}
+    yield (json.dumps(end) + "\n").encode("utf-8")
+
+
+def _prepend(first: bytes, body: Iterator[bytes]) -> Iterator[bytes]:
+    try:
+        yield first
+        yield from body
+    finally:
+        body.close()   # client went away early — release the cursor and connection now
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def load_pyarrow():
+    """The pyarrow module, or None when it is not installed."""
+    try:
+        import pyarrow as pa
+        return pa
+    except ImportError:
+        return None
+
+
+class SchemaMismatchError(ValueError):
+    """A batch holds values its Arrow schema cannot store; schema is the widened one that would."""
+
+    def __init__(self, index: int, schema):
+        field = schema.field(index)
+        super().__init__(
+            f"Column '{field.name}' changes type after the first rows of the result "
+            f"(now {field.type}); export it as CSV instead."
+        )
+        self.schema = schema
+
+
+def arrow_schema(pa, columns: List[str], batches: List[List[List[Any]]]):
+    """
+    Schema for the given batches (serialized columns: int, float, str, bool, None).
+    Columns keep their own type (int64 stays int64); a column mixing ints and
+    floats becomes float64, any other mix string; an all-null column string.
+    """
+    fields = []
+    for i, name in enumerate(columns):
+        type_ = pa.null()
+        for batch in batches:
+            arr = _inferred_array(pa, batch[i])
+            type_ = _common_type(pa, type_, arr.type if arr is not None else pa.string())
+        fields.append(pa.field(name, pa.string() if pa.types.is_null(type_) else type_))
+    return pa.schema(fields)
+
+
+def arrow_record_batch(pa, batch: List[List[Any]], schema):
+    """
+    Record batch of column arrays in schema. Ints are stored in a float64 column
+    and anything in a string column (as text); other values that do not fit raise
+    SchemaMismatchError carrying the widened schema.
+    """
+    arrays = []
+    for i, (values, field) in enumerate(zip(batch, schema)):
+        arr = _inferred_array(pa, values)
+        type_ = arr.type if arr is not None else pa.string()
+        common = _common_type(pa, field.type, type_)
+        if common != field.type:
+            raise SchemaMismatchError(i, schema.set(i, pa.field(field.name, common)))
+        if pa.types.is_string(field.type) and (arr is None or type_ != field.type):
+            arr = pa.array([v if v is None or isinstance(v, str) else str(v) for v in values], type=field.type)
+        elif type_ != field.type:
+            arr = arr.cast(field.type)   # int64 → float64, null → anything
+        arrays.append(arr)
+    return pa.record_batch(arrays, schema=schema)
+
+
+def export_timeout() -> float:
+    """Timeout for a full-result read to start (first batch): SQL_EXPORT_TIMEOUT, else SQL_STATEMENT_TIMEOUT."""
+    return env_float("SQL_EXPORT_TIMEOUT", env_float("SQL_STATEMENT_TIMEOUT", 30.0))
+
+
+def open_result_stream(
+    db_config: Dict[str, Any],
+    sql: str,
+    fmt: str = "arrow",
+    max_rows: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Tuple[str, Iterator[bytes]]:
+    """
+    Run sql and return (media_type, body_chunks) for a streaming HTTP response.
+
+    Args:
+        fmt:      'arrow', 'ndjson', 'csv' or 'parquet'.
+        max_rows: Stop after this many rows (None = the complete result).
+        timeout:  Statement timeout in seconds up to the first batch (default SQL_STATEMENT_TIMEOUT).
+
+    The query is planned and executed before this returns, so guard rejections,
+    timeouts on the first batch and SQL errors raise here (QueryGuardError /
+    RuntimeError / ValueError) rather than in the middle of the response body.
+    """
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported result format '{fmt}'. Use one of: {', '.join(MEDIA_TYPES)}.")
+    db_type = db_config["db_type"].lower()
+    pa = load_pyarrow() if fmt in ("arrow", "parquet") else None
+    if fmt == "arrow" and pa is None:
+        logger.info("pyarrow not installed — streaming NDJSON instead of Arrow")
+        fmt = "ndjson"
+    if fmt == "parquet" and pa is None:
+        raise RuntimeError("Parquet export requires pyarrow. Run: pip install pyarrow")
+
+    conn = get_connection(db_config)
+    try:
+        schema = get_cached_schema(conn, db_config)
+        check_query_cost(conn, sql, db_type, schema)
+        body = _stream(conn, sql, db_type, fmt, max_rows, timeout, pa)
+        first = next(body)   # executes the query and fetches the first batch
+    except Exception:
+        conn.close()
+        raise
+
+    return MEDIA_TYPES[fmt], _prepend(first, body)
+
+
+def open_export_stream(db_config: Dict[str, Any], sql: str, fmt: str = "csv") -> Tuple[str, Iterator[bytes]]:
+    """
+    Complete result of sql as a CSV or Parquet download (statement timeout: export_timeout()).
+    """
+    if fmt not in ("csv", "parquet"):
+        raise ValueError("Export format must be 'csv' or 'parquet'.")
+    return open_result_stream(db_config, sql, fmt, max_rows=None, timeout=export_timeout())
@@ -0,0 +1,160 @@
+"""
+Schema Retriever — BAAP AI v2
+Relevance-based pruning of the schema that goes into the NL→SQL prompt.
+
+Table and column descriptions are embedded once per schema version with the RAG
+embedding model. For each question the top-k most similar tables are kept, plus
+every table they reach through a foreign key (one hop, either direction), so the
+LLM still sees the join targets it needs.
+
+Settings (environment):
+    SCHEMA_PRUNE_ENABLED     — turn pruning on/off (default on)
+    SCHEMA_PRUNE_TOP_K       — tables picked by similarity (default 5)
+    SCHEMA_PRUNE_MIN_TABLES  — schemas with fewer tables are sent whole (default 8)
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from processing.sql_agent import _schema_to_text
+from rag import embedding_engine
+from utils.helpers import env_bool, env_int
+
+logger = logging.getLogger(__name__)
+
+_MAX_INDEXES = 8   # schema versions kept embedded at once
+
+
+# ── Module State ──────────────────────────────────────────────────────────────
+
+_indexes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _words(name: str) -> str:
+    """'order_items' → 'order items' so identifiers embed like natural language."""
+    return name.replace("_", " ").replace(".", " ")
+
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 characters per token is the usual rule of thumb for English/SQL text
+    return (len(text) + 3) // 4
+
+
+def _build_index(schema: Dict[str, Any]) -> Dict[str, Any]:
+    tables = list(schema.keys())
+    table_docs = []
+    col_docs = []
+    col_owner = []
+    for i, table in enumerate(tables):
+        columns = schema[table]["columns"]
+        table_docs.append(f"table {_words(table)}: " + ", ".join(_words(c["name"]) for c in columns))
+        for col in columns:
+            col_docs.append(f"{_words(table)} {_words(col['name'])} ({col['type']})")
+            col_owner.append(i)
+
+    return {
+        "tables": tables,
+        "table_vecs": embedding_engine.embed_texts(table_docs),
+        "col_vecs": embedding_engine.embed_texts(col_docs) if col_docs else None,
+        "col_owner": np.array(col_owner, dtype=np.int64),
+    }
+
+
+def _get_index(schema: Dict[str, Any], schema_version: str) -> Dict[str, Any]:
+    with _lock:
+        index = _indexes.get(schema_version)
+        if index is not None:
+            _indexes.move_to_end(schema_version)
+            return index
+
+    index = _build_index(schema)
+    logger.info("Embedded schema version %s (%d tables)", schema_version, len(index["tables"]))
+    with _lock:
+        _indexes[schema_version] = index
+        while len(_indexes) > _MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _fk_neighbours(schema: Dict[str, Any], selected: List[str]) -> List[str]:
+    """Tables joined to the selected ones through a foreign key, in either direction (one hop)."""
+    seeds = set(selected)   # only the selection expands — not tables added below
+    chosen = set(selected)
+    extra = []
+    for table, info in schema.items():
+        for fk in info.get("foreign_keys") or []:
+            ref = fk["ref_table"]
+            if table in seeds and ref in schema and ref not in chosen:
+                extra.append(ref)
+                chosen.add(ref)
+            elif ref in seeds and table not in chosen:
+                extra.append(table)
+                chosen.add(table)
+    return extra
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def prune_schema(
+    question: str,
+    schema: Dict[str, Any],
+    schema_version: Optional[str],
+    db_type: str,
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Keep only the tables relevant to question.
+
+    Args:
+        question:       User's natural language question.
+        schema:         Full schema dict (db_loader.get_schema format).
+        schema_version: Cache version of schema — embeddings are reused per version.
+        db_type:        Dialect, used to render the prompt text for the token savings.
+
+    Returns:
+        (pruned_schema, stats). stats is None when the schema was passed through whole.
+    """
+    if not env_bool("SCHEMA_PRUNE_ENABLED", True) or not schema_version:
+        return schema, None
+    top_k = env_int("SCHEMA_PRUNE_TOP_K", 5)
+    if len(schema) < max(env_int("SCHEMA_PRUNE_MIN_TABLES", 8), top_k + 1):
+        return schema, None
+
+    try:
+        index = _get_index(schema, schema_version)
+        query_vec = embedding_engine.embed_query(question)[0]
+    except Exception as e:
+        logger.warning("Schema pruning skipped (embedding unavailable): %s", e)
+        return schema, None
+
+    # A table scores as well as its best-matching description (table or any column)
+    scores = index["table_vecs"] @ query_vec
+    if index["col_vecs"] is not None:
+        np.maximum.at(scores, index["col_owner"], index["col_vecs"] @ query_vec)
+
+    ranked = [index["tables"][i] for i in np.argsort(-scores)[:top_k]]
+    joined = _fk_neighbours(schema, ranked)
+    keep = set(ranked) | set(joined)
+    pruned = {t: info for t, info in schema.items() if t in keep}
+
+    full_tokens = _estimate_tokens(_schema_to_text(schema, db_type))
+    pruned_tokens = _estimate_tokens(_schema_to_text(pruned, db_type))
+    stats = {
+        "tables_total": len(schema),
+        "tables_selected": ranked,
+        "tables_joined": joined,
+        "schema_tokens_full": full_tokens,
+        "schema_tokens_pruned": pruned_tokens,
+        "schema_tokens_saved": full_tokens - pruned_tokens,
+    }
+    logger.info(
+        "Schema pruned %d → %d tables (~%d prompt tokens saved)",
+        len(schema), len(pruned), stats["schema_tokens_saved"],
+    )
+    return pruned, stats
@@ -1,13 +1,42 @@
 import re
-from typing import Dict, Any, Tuple, List
+import uuid
+import logging
+from typing import Dict, Any, Iterator, Tuple, List, Optional, Sequence
 from core.llm import get_llm_model
+from processing.result_serializer import serialize_columns, serialize_rows
+from utils.helpers import env_int
+
+logger = logging.getLogger(__name__)
+
+
+def _row_count_text(info: Dict[str, Any]) -> str:
+    count = info.get("row_count")
+    if count is None:
+        return "row count unknown"
+    return f"~{count} rows" if info.get("row_count_estimated") else f"{count} rows"
+
 
 def _schema_to_text(schema: Dict[str, Any], dialect: str) -> str:
     lines = []
     quote_char = '`' if dialect.lower() == "mysql" else '"'
+    q = lambda name: f"{quote_char}{name}{quote_char}"
+    join_hints = []
     for table, info in schema.items():
-        cols = ", ".join(f"{quote_char}{c['name']}{quote_char} {c['type']}" for c in info["columns"])
-        lines.append(f"  Table {quote_char}{table}{quote_char} ({info['row_count']} rows): [{cols}]")
+        cols = ", ".join(f"{q(c['name'])} {c['type']}" for c in info["columns"])
+        pk = info.get("primary_key") or []
+        pk_text = f" PK({', '.join(q(c) for c in pk)})" if pk else ""
+        lines.append(f"  Table {q(table)} ({_row_count_text(info)}): [{cols}]{pk_text}")
+        for fk in info.get("foreign_keys") or []:
+            if fk["ref_table"] not in schema:
+                continue
+            pairs = " AND ".join(
+                f"{q(table)}.{q(c)} = {q(fk['ref_table'])}.{q(r)}"
+                for c, r in zip(fk["columns"], fk["ref_columns"])
+            )
+            join_hints.append(f"  {pairs}")
+    if join_hints:
+        lines.append("JOIN HINTS (foreign keys):")
+        lines.extend(join_hints)
     return "\n".join(lines)
 
 
@@ -15,7 +44,7 @@ def natural_language_to_sql(question: str, schema: Dict[str, Any], db_type: str
     if not schema:
         raise ValueError("Database schema is empty. Please ensure tables exist in the database before querying.")
 
-    model = get_llm_model()
+    model = get_llm_model("sql")
 
     if db_type.lower() == "mysql":
         dialect = "MySQL"
@@ -45,69 +74,207 @@ STRICT RULES:
 
 SQL QUERY (raw only):"""
 
-    max_retries = 3
-    base_delay = 2
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(prompt)
-            sql = response.text.strip()
-
-            # Strip any markdown artifacts
-            sql = re.sub(r"```sql\s*", "", sql, flags=re.IGNORECASE)
-            sql = re.sub(r"```\s*", "", sql)
-            sql = sql.strip().rstrip(";").strip()
-
-            return sql
-        except Exception as e:
-            if "429" in str(e) or "exhausted" in str(e).lower():
-                if attempt < max_retries - 1:
-                    import time
-                    time.sleep(base_delay * (2 ** attempt))
-                    continue
-            raise e
-
-
-def execute_query(conn, sql: str) -> Tuple[List[str], List[tuple]]:
-    """Execute SQL, return (columns, rows)."""
+    # 429s are retried with backoff by the shared rate limiter (core/rate_limiter.py)
+    response = model.generate_content(prompt)
+    sql = response.text.strip()
+
+    # Strip any markdown artifacts
+    sql = re.sub(r"```sql\s*", "", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"```\s*", "", sql)
+    sql = sql.strip().rstrip(";").strip()
+
+    return sql
+
+
+def returns_rows(sql: str) -> bool:
+    """True for plain SELECT / WITH statements — the only ones a streaming cursor can run."""
+    body = re.sub(r"^(\s|--[^\n]*\n|/\*.*?\*/|\()*", "", sql, flags=re.DOTALL)
+    return body[:6].upper() == "SELECT" or body[:4].upper() == "WITH"
+
+
+def strip_fences(sql: str) -> str:
     # Strip markdown code blocks before validation (e.g., ```sql\n ... \n```)
     cleaned = re.sub(r"^```[a-zA-Z]*\n", "", sql, flags=re.MULTILINE)
     cleaned = re.sub(r"```$", "", cleaned, flags=re.MULTILINE)
-    cleaned = cleaned.strip()
-    upper = cleaned.upper()
+    return cleaned.strip()
 
-    cursor = conn.cursor()
+
+def _run(cursor, sql: str, params: Optional[Sequence[Any]]) -> None:
+    """cursor.execute with driver-level parameters when given (see processing.sql_templates)."""
+    if params is None:
+        cursor.execute(sql)
+    else:
+        cursor.execute(sql, tuple(params))
+
+
+def _open_cursor(conn, db_type: str, streaming: bool):
+    """
+    Cursor that hands rows over in batches instead of materialising the result:
+      postgresql — named (server-side) cursor
+      mysql      — unbuffered cursor
+      sqlite     — plain cursor (rows are stepped lazily anyway)
+    """
+    if streaming and db_type == "postgresql":
+        cursor = conn.cursor(name=f"baap_{uuid.uuid4().hex[:12]}")
+        cursor.itersize = env_int("SQL_FETCH_BATCH_SIZE", 1000)
+        return cursor
+    if db_type == "mysql":
+        return conn.cursor(buffered=False)
+    return conn.cursor()
+
+
+def execute_query(
+    conn,
+    sql: str,
+    db_type: str = "sqlite",
+    max_rows: Optional[int] = None,
+    columnar: bool = False,
+    params: Optional[Sequence[Any]] = None,
+) -> Tuple[List[str], List[Any], bool]:
+    """
+    Execute SQL, return (columns, rows, has_more).
+
+    Rows are streamed from the server in batches and at most max_rows are kept
+    (default SQL_FETCH_MAX_ROWS); has_more is True when the result had more rows.
+    With columnar=True the second element is one value list per column instead
+    of a list of row tuples. params are bound by the driver to the placeholders
+    in sql ("?" for sqlite, "%s" for PostgreSQL / MySQL).
+    """
+    cleaned = strip_fences(sql)
+    db_type = db_type.lower()
+    if max_rows is None:
+        max_rows = env_int("SQL_FETCH_MAX_ROWS", 10000)
+    batch_size = env_int("SQL_FETCH_BATCH_SIZE", 1000)
+    streaming = returns_rows(cleaned)
+
+    cursor = _open_cursor(conn, db_type, streaming)
+    limited = False
     try:
-        cursor.execute(cleaned)
+        if streaming and db_type == "mysql":
+            # Server-side cap for top-level SELECTs, so an unbuffered cursor never
+            # has unread rows left behind when we stop early
+            cursor.execute(f"SET SESSION sql_select_limit = {int(max_rows) + 1}")
+            limited = True
+        _run(cursor, cleaned, params)
 
-        if cursor.description is None:
+        if not streaming and cursor.description is None:
             # Query did not return rows (e.g. UPDATE, INSERT, DELETE)
             conn.commit()
-            return ["Rows Affected"], [(cursor.rowcount,)]
+            return ["Rows Affected"], [[cursor.rowcount]] if columnar else [(cursor.rowcount,)], False
 
+        rows = []
+        has_more = False
+        while True:
+            batch = cursor.fetchmany(min(batch_size, max_rows + 1 - len(rows)))
+            if not batch:
+                break
+            rows.extend(batch)
+            if len(rows) > max_rows:
+                del rows[max_rows:]
+                has_more = True
+                break
+
+        # Named cursors only know their description after the first fetch
         description = cursor.description or []
         columns = [desc[0] for desc in description]
-        rows = cursor.fetchall()
-
-        # Serialize special types
-        clean_rows = []
-        for row in rows:
-            clean_row = []
-            for val in row:
-                if val is None:
-                    clean_row.append(None)
-                elif hasattr(val, "isoformat"):   # datetime / date / time
-                    clean_row.append(val.isoformat())
-                elif isinstance(val, bytes):
-                    clean_row.append(val.decode("utf-8", errors="replace"))
-                elif isinstance(val, (int, float, str, bool)):
-                    clean_row.append(val)
-                else:
-                    clean_row.append(str(val))
-            clean_rows.append(tuple(clean_row))
-
-        return columns, clean_rows
+
+        if columnar:
+            return columns, serialize_columns(columns, rows), has_more
+        return columns, serialize_rows(columns, rows), has_more
 
     except Exception as e:
         raise RuntimeError(f"SQL Error: {e}")
     finally:
         cursor.close()
+        if limited:
+            reset = conn.cursor()
+            try:
+                reset.execute("SET SESSION sql_select_limit = DEFAULT")
+            finally:
+                reset.close()
+
+
+def stream_query(
+    conn,
+    sql: str,
+    db_type: str = "sqlite",
+    batch_size: Optional[int] = None,
+    max_rows: Optional[int] = None,
+    params: Optional[Sequence[Any]] = None,
+) -> Tuple[List[str], Iterator[List[List[Any]]]]:
+    """
+    Execute a SELECT and return (columns, batches) without materialising the result.
+
+    batches yields serialized column arrays (see result_serializer.serialize_columns)
+    of at most batch_size rows (default SQL_FETCH_BATCH_SIZE), stopping after
+    max_rows rows if given. params are bound as in execute_query. The cursor is
+    closed when the iterator is exhausted or closed, so memory stays bounded by one batch.
+    """
+    cleaned = strip_fences(sql)
+    if not returns_rows(cleaned):
+        raise ValueError("Only SELECT / WITH queries can be streamed.")
+    db_type = db_type.lower()
+    batch_size = batch_size or env_int("SQL_FETCH_BATCH_SIZE", 1000)
+
+    cursor = _open_cursor(conn, db_type, True)
+    limited = False
+
+    def _close():
+        try:
+            cursor.close()
+        except Exception as e:   # e.g. mysql unread rows after an early stop — the pool cleans up
+            logger.debug("Closing stream cursor failed: %s", e)
+        if limited:
+            reset = conn.cursor()
+            try:
+                reset.execute("SET SESSION sql_select_limit = DEFAULT")
+            finally:
+                reset.close()
+
+    def _next_size(fetched: int) -> int:
+        return batch_size if not max_rows else min(batch_size, max_rows - fetched)
+
+    try:
+        if max_rows and db_type == "mysql":
+            cursor.execute(f"SET SESSION sql_select_limit = {int(max_rows)}")
+            limited = True
+        _run(cursor, cleaned, params)
+        first = cursor.fetchmany(_next_size(0))
+        # Named cursors only know their description after the first fetch
+        columns = [desc[0] for desc in cursor.description or []]
+    except Exception as e:
+        _close()
+        raise RuntimeError(f"SQL Error: {e}")
+
+    def _batches():
+        fetched = 0
+        batch = first
+        try:
+            while batch:
+                fetched += len(batch)
+                yield serialize_columns(columns, batch)
+                if max_rows and fetched >= max_rows:
+                    break
+                batch = cursor.fetchmany(_next_size(fetched))
+        finally:
+            _close()
+
+    return columns, _batches()
+
+
+def count_rows(conn, sql: str, params: Optional[Sequence[Any]] = None) -> Optional[int]:
+    """Total row count of a SELECT, via COUNT(*) over it as a subquery. None if it fails."""
+    inner = sql.strip().rstrip(";").strip()
+    cursor = conn.cursor()
+    try:
+        _run(cursor, f"SELECT COUNT(*) FROM ({inner}) AS _baap_total", params)
+        return cursor.fetchone()[0]
+    except Exception as e:
+        logger.info("Row count query failed: %s", e)
+        try:
+            conn.rollback()   # PostgreSQL aborts the transaction on error
+        except Exception:
+            pass
+        return None
+    finally:
+        cursor.close()
@@ -0,0 +1,115 @@
+"""
+SQL Rewriter — BAAP AI v2
+Parses the generated SQL per dialect (sqlglot) and rewrites it before execution:
+
+    - adds a LIMIT, or tightens an existing one, to display cap + 1 so the database
+      only produces the rows we show (the extra row tells us there are more)
+    - expands an unqualified single-table SELECT * into an explicit column list
+
+Anything that cannot be parsed, or is not a plain SELECT / UNION, runs unchanged.
+sqlglot is optional: without it the rewrite stage is a no-op and the streaming
+fetch cap in execute_query still bounds memory.
+"""
+
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_DIALECTS = {"postgresql": "postgres", "mysql": "mysql", "sqlite": "sqlite"}
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _load_sqlglot():
+    try:
+        import sqlglot
+        from sqlglot import exp
+        return sqlglot, exp
+    except ImportError:
+        return None, None
+
+
+def _existing_limit(exp, node) -> Tuple[bool, Optional[int]]:
+    """(has_limit, value). value is None when the LIMIT is not a plain integer literal."""
+    limit = node.args.get("limit")
+    if limit is None:
+        return False, None
+    value = limit.args.get("expression") or limit.this
+    if isinstance(value, exp.Literal) and value.is_int:
+        return True, int(value.name)
+    return True, None
+
+
+def _expand_star(exp, select, schema: Dict[str, Any]) -> bool:
+    """Replace `SELECT *` over one table (no joins) with that table's columns."""
+    if len(select.expressions) != 1 or not isinstance(select.expressions[0], exp.Star):
+        return False
+    from_ = select.args.get("from") or select.args.get("from_")
+    if from_ is None or select.args.get("joins") or not isinstance(from_.this, exp.Table):
+        return False
+    columns = (schema.get(from_.this.name) or {}).get("columns")
+    if not columns:
+        return False
+    select.set("expressions", [exp.column(c["name"], quoted=True) for c in columns])
+    return True
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def rewrite_sql(
+    sql: str,
+    db_type: str,
+    schema: Dict[str, Any],
+    row_cap: int,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Rewrite a generated query so it returns at most row_cap + 1 rows.
+
+    Args:
+        sql:     SQL produced by natural_language_to_sql (or sql_override).
+        db_type: 'mysql', 'postgresql' or 'sqlite'.
+        schema:  Schema dict, used to expand SELECT *.
+        row_cap: Number of rows that will be displayed.
+
+    Returns:
+        (sql_to_execute, info). info is None when the query was left unchanged, else:
+            {
+                "executed_sql":   str,
+                "limit":          int,          # LIMIT now on the query
+                "original_limit": int | None,   # LIMIT the query had before
+                "star_expanded":  bool,
+            }
+    """
+    sqlglot, exp = _load_sqlglot()
+    dialect = _DIALECTS.get(db_type.lower())
+    if sqlglot is None or dialect is None:
+        return sql, None
+
+    try:
+        statements = [s for s in sqlglot.parse(sql, read=dialect) if s is not None]
+    except Exception as e:
+        logger.info("SQL rewrite skipped (parse failed): %s", e)
+        return sql, None
+    if len(statements) != 1 or not isinstance(statements[0], (exp.Select, exp.Union)):
+        return sql, None
+    tree = statements[0]
+
+    star_expanded = isinstance(tree, exp.Select) and _expand_star(exp, tree, schema)
+
+    cap = row_cap + 1
+    has_limit, original_limit = _existing_limit(exp, tree)
+    # A non-literal LIMIT (e.g. a bind parameter) is left as written
+    tighten = not has_limit or (original_limit is not None and original_limit > cap)
+    if tighten:
+        tree = tree.limit(cap, copy=False)
+    elif not star_expanded:
+        return sql, None
+
+    rewritten = tree.sql(dialect=dialect)
+    return rewritten, {
+        "executed_sql": rewritten,
+        "limit": cap if tighten else original_limit,
+        "original_limit": original_limit,
+        "star_expanded": star_expanded,
+    }
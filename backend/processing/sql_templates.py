@@ -0,0 +1,389 @@
+"""
+SQL Templates — BAAP AI v2
+Answers questions that differ from an earlier one only in their literals
+("sales in March" / "sales in April", "orders for customer 42") without an LLM call.
+
+When the LLM translates a question, the literals in the question are matched to
+literals in the generated SQL:
+
+    numbers         42, 2023, 9.5        → numeric literal, or inside a string ('2023-01-01')
+    quoted values   'north', "Acme"      → string literal (also inside LIKE '%...%')
+    ISO dates       2024-03-01           → inside a string literal
+    month names     March                → 3, '03' or 'March'
+
+If every question literal maps onto the SQL unambiguously, a template is stored
+under the question's skeleton (literals replaced by typed slots). A later question
+with the same skeleton gets the template's SQL with its own values bound as
+driver-level parameters (sqlite "?", PostgreSQL / MySQL "%s") — never interpolated
+into the SQL text. The exception is a LIMIT / OFFSET count: it stays a literal
+(validated as a whole number) so the planner still sees the row bound. A date
+that does not exist (2023-02-30) sends the question back to the LLM.
+
+Templates are scoped like the translation cache (schema version + table filter,
+plus the database type for the placeholder style). Unquoted names ("customer
+Alice") are not slots, so such questions keep going through the LLM.
+
+Settings (environment):
+    SQL_TEMPLATES_ENABLED      — on/off (default on)
+    SQL_TEMPLATES_MAX_ENTRIES  — per scope, least recently used dropped first (default 500)
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.helpers import env_bool, env_int
+
+logger = logging.getLogger(__name__)
+
+_MAX_SCOPES = 16
+
+_MONTHS = [
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+]
+
+# Question literals, in priority order: quoted values, ISO dates, month names, numbers
+_QUESTION_SLOT = re.compile(
+    r"""'(?P<sq>[^']+)'|"(?P<dq>[^"]+)"|(?P<date>\b\d{4}-\d{2}-\d{2}\b)|"""
+    r"""(?P<month>\b(?:""" + "|".join(_MONTHS) + r""")\b)|(?P<num>(?<![\w.])\d+(?:\.\d+)?(?![\w.]))""",
+    re.IGNORECASE,
+)
+
+# SQL literals: string literals and bare numbers; quoted identifiers are skipped
+_SQL_LITERAL = re.compile(
+    r"""'(?P<str>(?:[^']|'')*)'|"(?:[^"]|"")*"|`[^`]*`|(?P<num>(?<![\w.])\d+(?:\.\d+)?(?![\w.]))"""
+)
+
+_CLAUSE = re.compile(r"\b(select|from|where|group\s+by|order\s+by|having|limit|offset|on)\b", re.IGNORECASE)
+
+_PLACEHOLDERS = {"sqlite": "?", "postgresql": "%s", "mysql": "%s"}
+
+
+# ── Module State ──────────────────────────────────────────────────────────────
+
+# scope → OrderedDict(skeleton → {"parts": [...], "bindings": [...], "question": str})
+_scopes: "OrderedDict[str, OrderedDict]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"lookups": 0, "hits": 0, "learned": 0, "unmappable": 0}
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _question_slots(question: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """(skeleton, slots) — slot = {"kind": "num" | "str" | "date" | "month", "value": ...}."""
+    slots: List[Dict[str, Any]] = []
+
+    def _slot(match) -> str:
+        if match.group("sq") is not None or match.group("dq") is not None:
+            kind, value = "str", match.group("sq") if match.group("sq") is not None else match.group("dq")
+        elif match.group("date"):
+            kind, value = "date", match.group("date")
+        elif match.group("month"):
+            kind, value = "month", _MONTHS.index(match.group("month").lower()) + 1
+        else:
+            kind, value = "num", match.group("num")
+        slots.append({"kind": kind, "value": value})
+        return f"<{kind}>"
+
+    skeleton = _QUESTION_SLOT.sub(_slot, question)
+    skeleton = re.sub(r"\s+", " ", skeleton).strip().rstrip("?.!").strip().lower()
+    return skeleton, slots
+
+
+def _valid_dates(slots: List[Dict[str, Any]]) -> bool:
+    for slot in slots:
+        if slot["kind"] == "date":
+            try:
+                date.fromisoformat(slot["value"])
+            except ValueError:
+                return False
+    return True
+
+
+def _scope_key(schema_version: str, table_filter: Optional[str], db_type: str) -> str:
+    return f"{schema_version}:{table_filter or '*'}:{db_type}"
+
+
+def _case_of(text: str, value: str) -> Optional[str]:
+    """How the SQL spelled a question value: same, upper, lower or title case."""
+    for case in ("same", "upper", "lower", "title"):
+        if _apply_case(value, case) == text:
+            return case
+    return None
+
+
+def _apply_case(value: str, case: str) -> str:
+    return value if case == "same" else getattr(value, case)()
+
+
+def _match_literal(slot: Dict[str, Any], literal: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Where / how slot's value appears in one SQL literal — or None."""
+    kind, value = slot["kind"], slot["value"]
+    text = literal["text"]
+
+    if literal["type"] == "num":
+        if kind == "num" and float(text) == float(value):
+            return {"format": "number"}
+        if kind == "month" and "." not in text and int(text) == value:
+            return {"format": "number"}
+        return None
+
+    if kind == "month":
+        if text in (str(value), f"{value:02d}"):
+            return {"format": "month_number", "start": 0, "end": len(text), "padded": text.startswith("0")}
+        case = _case_of(text, _MONTHS[value - 1])
+        if case:
+            return {"format": "month_name", "start": 0, "end": len(text), "case": case}
+        found = list(re.finditer(rf"(?<=\d{{4}}-){value:02d}(?!\d)(?:-(\d\d))?", text))   # '2024-03', '2024-03-01'
+        if len(found) != 1 or int(found[0].group(1) or 1) > 28:
+            return None   # '2024-03-31' has no equivalent in every month
+        return {"format": "month_number", "start": found[0].start(), "end": found[0].start() + 2, "padded": True}
+
+    # num / date / str inside a string literal — whatever surrounds the value is kept
+    pattern = re.escape(value)
+    if kind in ("num", "date"):
+        pattern = rf"(?<![\d.]){pattern}(?![\d.])"
+    found = list(re.finditer(pattern, text, flags=re.IGNORECASE if kind == "str" else 0))
+    if len(found) != 1:
+        return None
+    start, end = found[0].span()
+    case = _case_of(text[start:end], value) if kind == "str" else "same"
+    if case is None:
+        return None
+    return {"format": "text", "start": start, "end": end, "case": case}
+
+
+def _render_value(piece: Dict[str, Any], slot: Dict[str, Any]) -> str:
+    value = slot["value"]
+    if piece["format"] == "month_number":
+        return f"{value:02d}" if piece["padded"] else str(value)
+    if piece["format"] == "month_name":
+        return _apply_case(_MONTHS[value - 1], piece["case"])
+    return _apply_case(str(value), piece["case"])
+
+
+def _bind(binding: Dict[str, Any], slots: List[Dict[str, Any]]) -> Any:
+    """Parameter value for one SQL literal, given the new question's slots."""
+    if binding["format"] == "number":
+        value = slots[binding["slot"]]["value"]
+        if not isinstance(value, int):   # month slots are ints already
+            value = float(value) if "." in value else int(value)
+        if binding.get("inline") and not isinstance(value, int):
+            raise ValueError("LIMIT / OFFSET needs a whole number")
+        return value
+    text, out, cursor = binding["text"], [], 0
+    for piece in binding["pieces"]:
+        out.append(text[cursor:piece["start"]])
+        out.append(_render_value(piece, slots[piece["slot"]]))
+        cursor = piece["end"]
+    out.append(text[cursor:])
+    return "".join(out)
+
+
+def _clause_at(sql: str, pos: int) -> Optional[str]:
+    clauses = _CLAUSE.findall(sql[:pos])
+    return re.sub(r"\s+", " ", clauses[-1].lower()) if clauses else None
+
+
+def _positional(sql: str, pos: int) -> bool:
+    """True when a bare number at pos is a GROUP BY / ORDER BY column position."""
+    return _clause_at(sql, pos) in ("group by", "order by")
+
+
+def _build_template(sql: str, slots: List[Dict[str, Any]], db_type: str) -> Optional[Dict[str, Any]]:
+    """Template parts + bindings for sql, or None if the slots do not map unambiguously."""
+    literals = []
+    for m in _SQL_LITERAL.finditer(sql):
+        if m.group("str") is not None:
+            literals.append({"type": "str", "text": m.group("str").replace("''", "'"), "span": m.span()})
+        elif m.group("num") is not None:
+            literals.append({"type": "num", "text": m.group("num"), "span": m.span()})
+
+    values = [str(s["value"]).lower() for s in slots]
+    if len(set(values)) != len(values):
+        return None   # "5 stores with more than 5 orders" — can't tell which is which
+
+    bindings: Dict[int, Dict[str, Any]] = {}   # literal index → binding
+    for slot_index, slot in enumerate(slots):
+        matches = []
+        for i, literal in enumerate(literals):
+            recipe = _match_literal(slot, literal)
+            if recipe is not None:
+                matches.append((i, recipe))
+        if not matches:
+            return None
+        # A bare number must appear exactly once; a value may repeat inside strings
+        # (BETWEEN '2023-01-01' AND '2023-12-31')
+        if any(literals[i]["type"] == "num" for i, _ in matches):
+            if len(matches) != 1 or _positional(sql, literals[matches[0][0]]["span"][0]):
+                return None
+        for i, recipe in matches:
+            if literals[i]["type"] == "num":
+                if i in bindings:
+                    return None   # one number claimed by two slots
+                inline = _clause_at(sql, literals[i]["span"][0]) in ("limit", "offset")
+                bindings[i] = {"format": "number", "slot": slot_index, "inline": inline}
+                continue
+            binding = bindings.setdefault(i, {"format": "text", "text": literals[i]["text"], "pieces": []})
+            if binding["format"] != "text":
+                return None
+            piece = {**recipe, "slot": slot_index}
+            if any(p["start"] < piece["end"] and piece["start"] < p["end"] for p in binding["pieces"]):
+                return None   # overlapping values in one string
+            binding["pieces"].append(piece)
+            binding["pieces"].sort(key=lambda p: p["start"])
+
+    placeholder = _PLACEHOLDERS[db_type]
+    parts: List[Any] = []
+    order: List[Dict[str, Any]] = []
+    cursor = 0
+    for i in sorted(bindings):
+        start, end = literals[i]["span"]
+        parts.append(sql[cursor:start])
+        parts.append(None)   # placeholder
+        order.append(bindings[i])
+        cursor = end
+    parts.append(sql[cursor:])
+
+    text = [p for p in parts if p is not None]
+    if placeholder == "?" and any("?" in p for p in text):
+        return None
+    if placeholder == "%s":
+        if db_type == "mysql" and any("%" in p for p in text):
+            return None   # mysql-connector does not unescape %% — keep such queries on the LLM
+        parts = [p.replace("%", "%%") if p is not None else None for p in parts]
+    return {"parts": parts, "bindings": order, "placeholder": placeholder}
+
+
+def _render(template: Dict[str, Any], values: List[Any]) -> Tuple[str, str, List[Any]]:
+    """(sql with placeholders, display sql with the values written out, params)."""
+    sql, display, params = [], [], []
+    bound = iter(zip(template["bindings"], values))
+    for part in template["parts"]:
+        if part is None:
+            binding, value = next(bound)
+            if binding.get("inline"):   # LIMIT / OFFSET count, an int by _bind
+                sql.append(str(value))
+                display.append(str(value))
+                continue
+            params.append(value)
+            sql.append(template["placeholder"])
+            display.append(str(value) if isinstance(value, (int, float)) else "'" + value.replace("'", "''") + "'")
+        else:
+            sql.append(part)
+            display.append(part.replace("%%", "%") if template["placeholder"] == "%s" else part)
+    return "".join(sql), "".join(display), params
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def match_template(
+    question: str,
+    schema_version: Optional[str],
+    table_filter: Optional[str],
+    db_type: str,
+) -> Optional[Dict[str, Any]]:
+    """
+    SQL for question from a learned template, or None.
+
+    Returns:
+        {
+            "sql":         str,        # with driver placeholders
+            "params":      list,       # values for the placeholders, in order
+            "display_sql": str,        # the same query with the values written out
+            "skeleton":    str,
+            "matched_question": str,   # question the template was learned from
+        }
+    """
+    db_type = db_type.lower()
+    if not schema_version or db_type not in _PLACEHOLDERS or not env_bool("SQL_TEMPLATES_ENABLED", True):
+        return None
+    skeleton, slots = _question_slots(question)
+    if not slots or not _valid_dates(slots):
+        return None
+
+    with _lock:
+        _stats["lookups"] += 1
+        entries = _scopes.get(_scope_key(schema_version, table_filter, db_type))
+        template = entries.get(skeleton) if entries is not None else None
+        if template is None:
+            return None
+        entries.move_to_end(skeleton)
+
+    try:
+        values = [_bind(b, slots) for b in template["bindings"]]
+    except (ValueError, IndexError):
+        return None
+    sql, display_sql, params = _render(template, values)
+    with _lock:
+        _stats["hits"] += 1
+    return {
+        "sql": sql,
+        "params": params,
+        "display_sql": display_sql,
+        "skeleton": skeleton,
+        "matched_question": template["question"],
+    }
+
+
+def learn_template(
+    question: str,
+    sql: str,
+    schema_version: Optional[str],
+    table_filter: Optional[str],
+    db_type: str,
+) -> bool:
+    """Store a template from an LLM translation. Returns True if one was stored."""
+    db_type = db_type.lower()
+    if not schema_version or db_type not in _PLACEHOLDERS or not env_bool("SQL_TEMPLATES_ENABLED", True):
+        return False
+    skeleton, slots = _question_slots(question)
+    if not slots or not _valid_dates(slots):
+        return False
+
+    template = _build_template(sql, slots, db_type)
+    with _lock:
+        if template is None:
+            _stats["unmappable"] += 1
+            return False
+        scope = _scope_key(schema_version, table_filter, db_type)
+        entries = _scopes.setdefault(scope, OrderedDict())
+        _scopes.move_to_end(scope)
+        entries[skeleton] = {**template, "question": question}
+        entries.move_to_end(skeleton)
+        _stats["learned"] += 1
+        while len(entries) > env_int("SQL_TEMPLATES_MAX_ENTRIES", 500):
+            entries.popitem(last=False)
+        while len(_scopes) > _MAX_SCOPES:
+            _scopes.popitem(last=False)
+    return True
+
+
+def discard_template(
+    question: str,
+    schema_version: Optional[str],
+    table_filter: Optional[str],
+    db_type: str,
+) -> None:
+    """Forget the template question's skeleton maps to (e.g. its SQL failed to execute)."""
+    if not schema_version:
+        return
+    skeleton, _slots = _question_slots(question)
+    with _lock:
+        entries = _scopes.get(_scope_key(schema_version, table_filter, db_type.lower()))
+        if entries is not None:
+            entries.pop(skeleton, None)
+
+
+def get_template_stats() -> Dict[str, Any]:
+    """Template count and hit rate, for /health."""
+    with _lock:
+        return {
+            "templates": sum(len(e) for e in _scopes.values()),
+            **_stats,
+            "hit_rate": round(_stats["hits"] / _stats["lookups"], 4) if _stats["lookups"] else 0.0,
+        }
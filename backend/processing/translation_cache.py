@@ -0,0 +1,261 @@
+"""
+Translation Cache — BAAP AI v2
+Reuses NL→SQL translations for repeated questions so they skip the LLM round trip.
+
+Entries are scoped to a schema version (schema_cache.get_schema_version) plus the
+table filter in effect, so a schema change never serves stale SQL.
+
+Lookup:
+    1. exact   — hash of the normalized question (case / whitespace / trailing punctuation)
+    2. semantic — cosine similarity of the question embedding (rag.embedding_engine)
+                  against earlier questions; a hit needs similarity ≥ NL2SQL_CACHE_SIMILARITY
+                  (default 0.95) AND
+                    - the same literals: numbers, quoted values, month / weekday names,
+                      ordering words (top, bottom, asc, desc, min, max, …) and capitalized
+                      words that are not schema identifiers (names like "Berlin"), so
+                      "top 5" never reuses the SQL written for "top 10"
+                    - the same words once stopwords and plurals are ignored, so
+                      "revenue by region" never reuses "revenue by country"
+
+Settings (environment):
+    NL2SQL_CACHE_ENABLED      — on/off (default on)
+    NL2SQL_CACHE_SIMILARITY   — semantic threshold, 0 disables semantic lookup
+    NL2SQL_CACHE_MAX_ENTRIES  — per schema scope, oldest dropped first (default 500)
+    NL2SQL_CACHE_TTL          — seconds (default 86400)
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple
+
+import numpy as np
+
+from rag import embedding_engine
+from utils.helpers import env_bool, env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+_MAX_SCOPES = 16   # schema versions / table filters kept at once
+
+_MONTHS = {
+    "january", "february", "march", "april", "may", "june", "july", "august", "september",
+    "october", "november", "december", "jan", "feb", "mar", "apr", "jun", "jul", "aug",
+    "sep", "sept", "oct", "nov", "dec",
+}
+_WEEKDAYS = {
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "mon", "tue", "tues", "wed", "thu", "thur", "thurs", "fri", "sat", "sun",
+}
+_ORDER_WORDS = {
+    "top", "bottom", "asc", "desc", "ascending", "descending", "min", "max", "minimum",
+    "maximum", "highest", "lowest", "largest", "smallest", "first", "last", "most", "least",
+}
+# Words that do not change the SQL — the only ones two questions may differ in on a semantic hit
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "to", "in", "on", "and", "me", "us", "my", "our", "i", "we",
+    "please", "show", "list", "display", "give", "get", "find", "tell", "see", "view",
+    "what", "which", "is", "are", "was", "were", "there", "all", "can", "you", "could", "would",
+    "do", "does", "data", "records", "record", "rows", "row",
+}
+_QUOTED_RE = re.compile(r"'[^']*'|\"[^\"]*\"")
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9_']*")
+
+
+# ── Module State ──────────────────────────────────────────────────────────────
+
+# scope → OrderedDict(question hash → {"question", "sql", "vec", "literals", "words", "stored_at"})
+_scopes: "OrderedDict[str, OrderedDict]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {
+    "lookups": 0,
+    "exact_hits": 0,
+    "semantic_hits": 0,
+    "misses": 0,
+    "llm_calls": 0,
+    "llm_seconds": 0.0,      # total time spent in NL→SQL calls on misses
+    "saved_seconds": 0.0,    # estimated LLM time avoided by hits (average miss latency per hit)
+}
+
+
+# ── Internal Helpers ──────────────────────────────────────────────────────────
+
+def _normalize(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().rstrip("?.!").strip().lower()
+
+
+def _identifiers(schema: Optional[Dict[str, Any]]) -> FrozenSet[str]:
+    """Lowercased table / column names and their _-separated parts."""
+    names = set()
+    for table, info in (schema or {}).items():
+        for name in [table] + [c["name"] for c in info.get("columns") or []]:
+            names.add(name.lower())
+            names.update(part for part in name.lower().split("_") if part)
+    return frozenset(names)
+
+
+def _literals(question: str, identifiers: FrozenSet[str] = frozenset()) -> Tuple[str, ...]:
+    """
+    The parts of a question that change the SQL's constants or ordering: numbers,
+    quoted values, month / weekday names, ordering words and capitalized words
+    (past the first) that are not schema identifiers.
+    """
+    found = re.findall(r"\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\"", question.lower())
+    for i, word in enumerate(_WORD_RE.findall(_QUOTED_RE.sub(" ", question))):
+        lower = word.lower()
+        if lower in _MONTHS or lower in _WEEKDAYS or lower in _ORDER_WORDS:
+            found.append(lower)
+        elif i > 0 and word[0].isupper() and lower not in identifiers and lower not in _STOPWORDS:
+            found.append(lower)
+    return tuple(sorted(found))
+
+
+def _content_words(question: str) -> FrozenSet[str]:
+    """Non-stopword words, singularized — a semantic hit may not differ in any of them."""
+    words = set()
+    for word in re.findall(r"[a-z0-9_']+", question.lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+
+def _scope_key(schema_version: str, table_filter: Optional[str]) -> str:
+    return f"{schema_version}:{table_filter or '*'}"
+
+
+def _embed(question: str) -> Optional[np.ndarray]:
+    try:
+        return embedding_engine.embed_query(question)[0]
+    except Exception as e:
+        logger.info("Translation cache: embedding unavailable, exact matching only: %s", e)
+        return None
+
+
+def _avg_llm_seconds() -> float:
+    return _stats["llm_seconds"] / _stats["llm_calls"] if _stats["llm_calls"] else 0.0
+
+
+def _record_hit(kind: str) -> None:
+    with _lock:
+        _stats[kind] += 1
+        _stats["saved_seconds"] += _avg_llm_seconds()
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def cached_translation(
+    question: str,
+    schema_version: Optional[str],
+    table_filter: Optional[str],
+    translate: Callable[[], str],
+    schema: Optional[Dict[str, Any]] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    SQL for question, from the cache when possible, else from translate().
+    schema (table → info) tells schema identifiers apart from names in the question.
+
+    Returns:
+        (sql, info) — info = {"status": "exact" | "semantic" | "miss" | "bypass",
+                              "similarity": float | None, "matched_question": str | None}
+    """
+    if not schema_version or not env_bool("NL2SQL_CACHE_ENABLED", True):
+        return translate(), {"status": "bypass", "similarity": None, "matched_question": None}
+
+    scope = _scope_key(schema_version, table_filter)
+    normalized = _normalize(question)
+    qhash = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+    ttl = env_float("NL2SQL_CACHE_TTL", 86400.0)
+    threshold = env_float("NL2SQL_CACHE_SIMILARITY", 0.95)
+    now = time.monotonic()
+
+    with _lock:
+        _stats["lookups"] += 1
+        entries = _scopes.get(scope)
+        if entries is not None:
+            _scopes.move_to_end(scope)
+            for key in [k for k, e in entries.items() if now - e["stored_at"] > ttl]:
+                del entries[key]
+            entry = entries.get(qhash)
+            if entry is not None:
+                entries.move_to_end(qhash)
+                candidates = None
+            else:
+                candidates = [e for e in entries.values() if e["vec"] is not None]
+        else:
+            entry, candidates = None, None
+
+    if entry is not None:
+        _record_hit("exact_hits")
+        return entry["sql"], {"status": "exact", "similarity": 1.0, "matched_question": entry["question"]}
+
+    vec = _embed(question) if threshold > 0 else None
+    literals = _literals(question, _identifiers(schema))
+    words = _content_words(question)
+    if vec is not None and candidates:
+        matrix = np.stack([e["vec"] for e in candidates])
+        scores = matrix @ vec
+        for i in np.argsort(-scores):
+            if scores[i] < threshold:
+                break
+            if candidates[i]["literals"] == literals and candidates[i]["words"] == words:
+                best = candidates[i]
+                _record_hit("semantic_hits")
+                return best["sql"], {
+                    "status": "semantic",
+                    "similarity": round(float(scores[i]), 4),
+                    "matched_question": best["question"],
+                }
+
+    started = time.monotonic()
+    sql = translate()
+    elapsed = time.monotonic() - started
+
+    with _lock:
+        _stats["misses"] += 1
+        _stats["llm_calls"] += 1
+        _stats["llm_seconds"] += elapsed
+        entries = _scopes.setdefault(scope, OrderedDict())
+        _scopes.move_to_end(scope)
+        entries[qhash] = {
+            "question": question,
+            "sql": sql,
+            "vec": vec,
+            "literals": literals,
+            "words": words,
+            "stored_at": time.monotonic(),
+        }
+        while len(entries) > env_int("NL2SQL_CACHE_MAX_ENTRIES", 500):
+            entries.popitem(last=False)
+        while len(_scopes) > _MAX_SCOPES:
+            _scopes.popitem(last=False)
+    return sql, {"status": "miss", "similarity": None, "matched_question": None}
+
+
+def discard_translation(sql: str, schema_version: Optional[str], table_filter: Optional[str]) -> None:
+    """Forget every cached question that maps to sql (e.g. it failed to execute)."""
+    if not schema_version:
+        return
+    with _lock:
+        entries = _scopes.get(_scope_key(schema_version, table_filter))
+        if entries is not None:
+            for key in [k for k, e in entries.items() if e["sql"] == sql]:
+                del entries[key]
+
+
+def get_translation_cache_stats() -> Dict[str, Any]:
+    """Hit rate and LLM time saved, for /health."""
+    with _lock:
+        hits = _stats["exact_hits"] + _stats["semantic_hits"]
+        return {
+            "entries": sum(len(e) for e in _scopes.values()),
+            **_stats,
+            "llm_seconds": round(_stats["llm_seconds"], 3),
+            "saved_seconds": round(_stats["saved_seconds"], 3),
+            "hit_rate": round(hits / _stats["lookups"], 4) if _stats["lookups"] else 0.0,
+        }
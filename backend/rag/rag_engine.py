@@ -9,10 +9,10 @@ Public surface:
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
 
 from rag import document_processor, embedding_engine, vector_store
-from core.llm import get_llm_model
+from core.llm import generate_text, get_llm_model
 
 logger = logging.getLogger(__name__)
 
@@ -76,7 +76,12 @@ def index_document(filename: str, file_bytes: bytes) -> Dict[str, Any]:
 
 # ── Retrieval + Generation ────────────────────────────────────────────────────
 
-def answer_question(question: str, document_filter: Optional[str] = None) -> Dict[str, Any]:
+def answer_question(
+    question: str,
+    document_filter: Optional[str] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+    on_sources: Optional[Callable[[List[str]], None]] = None,
+) -> Dict[str, Any]:
     """
     Answer a document-related question using RAG.
 
@@ -90,6 +95,8 @@ def answer_question(question: str, document_filter: Optional[str] = None) -> Dic
     Args:
         question: The user's natural language question.
         document_filter: Optional filename to restrict search to.
+        on_token: Optional callback; the answer is streamed to it chunk by chunk.
+        on_sources: Optional callback; receives the source filenames before generation starts.
 
     Returns:
         {
@@ -142,9 +149,12 @@ def answer_question(question: str, document_filter: Optional[str] = None) -> Dic
 
     context = "\n\n---\n\n".join(context_parts)
 
+    if on_sources is not None:
+        on_sources(sources)
+
     # 5. Generate answer via Gemini
     prompt = _build_rag_prompt(question, context)
-    answer = _call_llm(prompt)
+    answer = _call_llm(prompt, on_token)
 
     return {
         "answer": answer,
@@ -199,12 +209,11 @@ INSTRUCTIONS:
 COMBINED ANSWER:"""
 
 
-def _call_llm(prompt: str) -> str:
-    """Call Gemini with a prompt and return the response text."""
-    model = get_llm_model()
+def _call_llm(prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+    """Call Gemini with a prompt and return the response text (streamed to on_token if given)."""
+    model = get_llm_model("rag")
     try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        return generate_text(model, prompt, on_token).strip()
     except Exception as e:
         error_str = str(e)
         if "429" in error_str or "exhausted" in error_str.lower():
@@ -215,7 +224,12 @@ def _call_llm(prompt: str) -> str:
 
 # ── Hybrid Support ────────────────────────────────────────────────────────────
 
-def answer_hybrid(question: str, sql_data_summary: str, document_filter: Optional[str] = None) -> str:
+def answer_hybrid(
+    question: str,
+    sql_data_summary: str,
+    document_filter: Optional[str] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+) -> str:
     """
     Retrieve doc context and merge with SQL summary via Gemini.
     Used by smart_router for hybrid_query intent.
@@ -224,6 +238,7 @@ def answer_hybrid(question: str, sql_data_summary: str, document_filter: Optiona
         question:         User's question.
         sql_data_summary: Plain-text summary of SQL result (NOT raw data).
         document_filter:  Optional filename to restrict RAG search to.
+        on_token:         Optional callback; the merged answer is streamed to it chunk by chunk.
 
     Returns:
         Merged natural language answer string.
@@ -250,4 +265,4 @@ def answer_hybrid(question: str, sql_data_summary: str, document_filter: Optiona
     doc_context = "\n\n---\n\n".join(context_parts)
 
     prompt = _build_hybrid_prompt(question, doc_context, sql_data_summary)
-    return _call_llm(prompt)
+    return _call_llm(prompt, on_token)
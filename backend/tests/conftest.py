@@ -0,0 +1,6 @@
+"""Test setup — BAAP AI v2: the backend packages import as top-level modules (run pytest from backend/)."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,28 @@
+"""Query cache — entries are sized by their result, so the memory budget evicts."""
+
+from processing import query_cache
+from processing.query_cache import cached_execute, get_query_cache_stats
+
+DB = {"db_type": "sqlite", "database": "/tmp/query_cache_test"}
+
+
+def _result(n: int):
+    # Same shape as smart_router's cached value
+    values = [list(range(n)), [f"row {i} " + "x" * 40 for i in range(n)]]
+    return {"result": {"columns": ["id", "text"], "values": values, "row_count": n}, "total_rows": n}
+
+
+def test_cache_evicts_past_its_budget(monkeypatch):
+    monkeypatch.setenv("QUERY_CACHE_MAX_MB", "1")
+    query_cache.invalidate_database(DB)
+    evictions = get_query_cache_stats()["evictions"]
+
+    for i in range(6):   # ~300 KB each
+        value, status = cached_execute(DB, f"SELECT * FROM t{i}", lambda: _result(5000))
+        assert status == "miss"
+
+    stats = get_query_cache_stats()
+    assert stats["bytes"] <= 1024 * 1024
+    assert stats["evictions"] > evictions
+    assert cached_execute(DB, "SELECT * FROM t5", lambda: _result(1))[1] == "hit"
+    assert cached_execute(DB, "SELECT * FROM t0", lambda: _result(1))[1] == "miss"
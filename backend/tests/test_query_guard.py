@@ -0,0 +1,44 @@
+"""Query guard — row estimates of LIMITed reads vs unbounded joins."""
+
+import sqlite3
+
+import pytest
+
+from processing.query_guard import QueryRejectedError, _pg_plan_rows, check_query_cost
+
+SCHEMA = {"big": {"columns": [{"name": "a"}, {"name": "b"}], "row_count": 200_000_000}}
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE big (a INTEGER, b TEXT)")
+    yield conn
+    conn.close()
+
+
+def test_limited_scan_of_huge_table_passes(conn):
+    plan = check_query_cost(conn, "SELECT a FROM big LIMIT 501", "sqlite", SCHEMA)
+    assert plan["estimated_rows"] == 501
+
+
+def test_cartesian_join_is_rejected(conn):
+    with pytest.raises(QueryRejectedError):
+        check_query_cost(conn, "SELECT * FROM big b1, big b2", "sqlite", SCHEMA)
+
+
+def test_limit_after_sort_does_not_bound_the_scan(conn):
+    with pytest.raises(QueryRejectedError):
+        check_query_cost(conn, "SELECT * FROM big ORDER BY b LIMIT 501", "sqlite", SCHEMA)
+
+
+def test_aggregate_with_limit_is_not_bounded(conn):
+    with pytest.raises(QueryRejectedError):
+        check_query_cost(conn, "SELECT count(*) FROM big b1, big b2 LIMIT 1", "sqlite", SCHEMA)
+
+
+def test_postgres_limit_node_bounds_children_but_not_through_a_sort():
+    scan = {"Node Type": "Seq Scan", "Plan Rows": 200_000_000}
+    assert _pg_plan_rows({"Node Type": "Limit", "Plan Rows": 501, "Plans": [scan]}) == 501
+    sort = {"Node Type": "Sort", "Plan Rows": 200_000_000, "Plans": [scan]}
+    assert _pg_plan_rows({"Node Type": "Limit", "Plan Rows": 501, "Plans": [sort]}) == 200_000_000
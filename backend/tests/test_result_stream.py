@@ -0,0 +1,29 @@
+"""Result stream — Arrow schema inference keeps values intact."""
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from processing.result_stream import SchemaMismatchError, _record_batches  # noqa: E402
+
+
+def test_int_columns_stay_int64():
+    batches = iter([[[1, 1234567890123456789]], [[3, None]]])
+    schema, record_batches = _record_batches(pa, ["id"], batches)
+    assert schema.field("id").type == pa.int64()
+    assert [v for rb in record_batches for v in rb.column(0).to_pylist()] == [1, 1234567890123456789, 3, None]
+
+
+def test_mixed_columns_widen_without_losing_values():
+    batches = iter([[[1, 2.5], [1, "x"]]])
+    schema, record_batches = _record_batches(pa, ["n", "v"], batches)
+    assert schema.types == [pa.float64(), pa.string()]
+    assert next(record_batches).to_pylist() == [{"n": 1.0, "v": "1"}, {"n": 2.5, "v": "x"}]
+
+
+def test_late_mismatch_raises_instead_of_writing_null(monkeypatch):
+    monkeypatch.setenv("SQL_ARROW_SCHEMA_ROWS", "1")
+    schema, record_batches = _record_batches(pa, ["n"], iter([[[1]], [["text"]]]))
+    next(record_batches)
+    with pytest.raises(SchemaMismatchError):
+        next(record_batches)
@@ -1,17 +1,22 @@
 from typing import List, Dict, Any
 
+from processing.result_set import column_values
+
 COLORS = [
     "#6c47ff", "#22c55e", "#3b82f6", "#f97316",
     "#a855f7", "#14b8a6", "#f43f5e", "#eab308",
     "#0ea5e9", "#8b5cf6", "#ec4899", "#84cc16",
 ]
 
-def generate_chart_config(columns: List[str], data: List[Dict], question: str) -> Dict[str, Any]:
-    if not data or not columns:
+def generate_chart_config(result: Dict[str, Any], question: str) -> Dict[str, Any]:
+    """Chart.js-style config from a result set (processing.result_set)."""
+    columns = result["columns"]
+    row_count = result["row_count"]
+    if not row_count or not columns:
         return {"chart_type": "bar", "labels": [], "datasets": []}
 
     q = question.lower()
-    numeric_cols = _get_numeric_cols(columns, data)
+    numeric_cols = _get_numeric_cols(result)
     text_cols = [c for c in columns if c not in numeric_cols]
 
     # Detect chart type
@@ -21,20 +26,20 @@ def generate_chart_config(columns: List[str], data: List[Dict], question: str) -
         chart_type = "pie"
     elif not numeric_cols:
         chart_type = "bar"
-    elif len(data) <= 10 and text_cols:
+    elif row_count <= 10 and text_cols:
         chart_type = "pie"
     else:
         chart_type = "bar"
 
     # Build labels and datasets
     label_col = text_cols[0] if text_cols else columns[0]
-    labels = [str(row.get(label_col, "")) for row in data]
+    labels = [str(v) for v in column_values(result, label_col)]
 
     datasets = []
     value_cols = numeric_cols[:3] if numeric_cols else []
 
     for i, col in enumerate(value_cols):
-        vals = [row.get(col) for row in data]
+        vals = column_values(result, col)
         try:
             vals = [float(v) if v is not None else 0 for v in vals]
         except (ValueError, TypeError):
@@ -61,14 +66,14 @@ def generate_chart_config(columns: List[str], data: List[Dict], question: str) -
     }
 
 
-def _get_numeric_cols(columns: List[str], data: List[Dict]) -> List[str]:
-    result = []
-    for col in columns:
+def _get_numeric_cols(result: Dict[str, Any]) -> List[str]:
+    numeric = []
+    for col, values in zip(result["columns"], result["values"]):
         try:
-            sample = [row.get(col) for row in data[:30] if row.get(col) is not None]
-            if sample:
+            sample = [v for v in values[:30] if v is not None]
+            if sample and col not in numeric:
                 [float(v) for v in sample]
-                result.append(col)
+                numeric.append(col)
         except (ValueError, TypeError):
             pass
-    return result
+    return numeric
@@ -1,12 +1,26 @@
 'use client'
 import { useState } from 'react'
-import type { DBConfig, QueryResult } from '@/types'
+import type { ColumnarData, DBConfig, QueryResult } from '@/types'
 import ConnectPage from '@/components/ConnectPage'
 import DashboardPage from '@/components/DashboardPage'
 
 // Let Next.js rewrite the API requests instead of changing it dynamically
 const API_URL = ''
 
+// Expand a columnar /api/query payload back into row objects for the table components
+function decodeColumnar(columns: string[], data: ColumnarData): Record<string, any>[] {
+  const arrays = data.columns.map(col =>
+    'codes' in col ? col.codes.map(code => col.dictionary[code]) : col.values
+  )
+  const rows: Record<string, any>[] = new Array(data.row_count)
+  for (let i = 0; i < data.row_count; i++) {
+    const row: Record<string, any> = {}
+    columns.forEach((name, j) => { row[name] = arrays[j][i] })
+    rows[i] = row
+  }
+  return rows
+}
+
 export default function Home() {
   const [config, setConfig] = useState<DBConfig | null>(null)
   const [schema, setSchema] = useState<any>(null)
@@ -38,25 +52,76 @@ export default function Home() {
     }
   }
 
-  const handleQuery = async (question: string, chatContext?: string) => {
+  // Runs the question through /api/query/events: each pipeline stage (SQL, rows,
+  // metrics, chart, insights, suggestions, answer text) is handed to onPartial as
+  // soon as the server sends it; resolves with the complete response
+  const handleQuery = async (
+    question: string,
+    chatContext?: string,
+    onPartial?: (partial: Partial<QueryResult>) => void,
+  ) => {
     if (!config) throw new Error("No config");
 
     const payload: any = {
       db_config: config,
-      question
+      question,
+      result_format: 'columnar',
     }
     if (chatContext && chatContext !== 'all') {
       payload.chat_context = chatContext;
     }
 
-    const res = await fetch(`${API_URL}/api/query`, {
+    const res = await fetch(`${API_URL}/api/query/events`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json', 'ngrok-skip-browser-warning': 'true' },
       body: JSON.stringify(payload)
     })
-    const json = await res.json()
-    if (!res.ok) throw new Error(json.detail || 'Query failed')
-    return json;
+    if (!res.ok || !res.body) {
+      const json = await res.json().catch(() => ({}))
+      throw new Error(json.detail || 'Query failed')
+    }
+
+    const decode = (json: any) => {
+      if (json.data && json.columns && json.data.format === 'columnar') {
+        json.data = decodeColumnar(json.columns, json.data)
+      }
+      return json
+    }
+
+    const reader = res.body.getReader()
+    const decoder = new TextDecoder()
+    let partial: Partial<QueryResult> = {}
+    let buffer = ''
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+      let end: number
+      while ((end = buffer.indexOf('\n\n')) >= 0) {
+        const block = buffer.slice(0, end)
+        buffer = buffer.slice(end + 2)
+        let event = 'message'
+        let data = ''
+        for (const line of block.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7)
+          else if (line.startsWith('data: ')) data += line.slice(6)
+        }
+        if (!data) continue   // keep-alive comment
+        const json = JSON.parse(data)
+        if (event === 'error') throw new Error(json.message || 'Query failed')
+        if (event === 'done') return decode(json) as QueryResult
+        if (event === 'answer_delta') {
+          // Chat / document answers arrive chunk by chunk while the model generates them
+          partial = { ...partial, answer: (partial.answer ?? '') + json.text }
+        } else if (event === 'sources') {
+          partial = { ...partial, insights: json.sources.map((s: string) => `Source: ${s}`) }
+        } else {
+          partial = { ...partial, ...decode(json) }
+        }
+        onPartial?.(partial)
+      }
+    }
+    throw new Error('Query stream ended unexpectedly')
   }
 
   if (!config) {
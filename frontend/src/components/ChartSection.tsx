@@ -104,6 +104,11 @@ export default function ChartSection({ chart }: { chart: any }) {
         <div style={{ display: 'flex', alignItems: 'center', gap: 8 }}>
           <div style={{ width: 8, height: 8, borderRadius: '50%', background: '#22c55e' }} />
           <span style={{ fontSize: 14, fontWeight: 600, color: '#1a1d2e' }}>Data Visualizations</span>
+          {chart.sample_rows && (
+            <span style={{ fontSize: 11, color: '#8b92a9' }}>
+              first {Number(chart.sample_rows).toLocaleString()} rows
+            </span>
+          )}
         </div>
         <div style={{ display: 'flex', gap: 6 }}>
           {/* Bar */}
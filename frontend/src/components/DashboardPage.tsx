@@ -10,7 +10,7 @@ import InsightsSuggestions from './InsightsSuggestions'
 type Props = {
   dbConfig: DBConfig
   schema: any
-  onQuery: (q: string, context?: string) => Promise<any>
+  onQuery: (q: string, context?: string, onPartial?: (partial: Partial<QueryResult>) => void) => Promise<any>
   onDisconnect: () => void
   onRefreshSchema: () => void
 }
@@ -46,13 +46,29 @@ export default function DashboardPage({
     
     setTimeout(() => resultsRef.current?.scrollIntoView({ behavior: 'smooth' }), 100)
 
+    // One assistant message, filled in stage by stage as the server reports progress
+    const assistantId = (Date.now() + 1).toString()
+    const upsert = (msg: Message) => setMessages(prev =>
+      prev.some(m => m.id === assistantId) ? prev.map(m => (m.id === assistantId ? msg : m)) : [...prev, msg]
+    )
+    const showPartial = (partial: Partial<QueryResult>) => {
+      if (!partial.mode) return
+      upsert({
+        id: assistantId,
+        role: 'assistant',
+        queryResult: {
+          answer: null, sql_query: null, columns: null, data: null, total_rows: null,
+          metrics: null, chart_config: null, insights: null, suggestions: null,
+          ...partial,
+        } as QueryResult,
+      })
+    }
+
     try {
-      const result = await onQuery(q, chatContext)
-      const assistantMsg: Message = { id: (Date.now() + 1).toString(), role: 'assistant', queryResult: result }
-      setMessages(prev => [...prev, assistantMsg])
+      const result = await onQuery(q, chatContext, showPartial)
+      upsert({ id: assistantId, role: 'assistant', queryResult: result })
     } catch (e: any) {
-      const errorMsg: Message = { id: (Date.now() + 1).toString(), role: 'assistant', isError: true, errorText: e.message || 'Query failed' }
-      setMessages(prev => [...prev, errorMsg])
+      upsert({ id: assistantId, role: 'assistant', isError: true, errorText: e.message || 'Query failed' })
     } finally {
       setQueryLoading(false)
       setTimeout(() => resultsRef.current?.scrollIntoView({ behavior: 'smooth' }), 300)
@@ -226,6 +242,10 @@ export default function DashboardPage({
                           columns={msg.queryResult.columns}
                           data={msg.queryResult.data}
                           totalRows={msg.queryResult.total_rows ?? 0}
+                          truncated={msg.queryResult.truncated ?? false}
+                          dbConfig={dbConfig}
+                          sql={msg.queryResult.sql_query}
+                          resultId={msg.queryResult.result_id}
                         />
                       )}
 
@@ -421,7 +441,7 @@ function SchemaExplorer({ schema, onAskQuestion }: { schema: any, onAskQuestion:
               }}
             >
               <span style={{ fontFamily: "'JetBrains Mono', monospace", color: '#6c47ff', fontSize: 13 }}>{table}</span>
-              <span style={{ fontSize: 12, color: '#8b92a9' }}>{info.row_count?.toLocaleString()} rows · {info.columns.length} cols</span>
+              <span style={{ fontSize: 12, color: '#8b92a9' }}>{info.row_count == null ? '?' : `${info.row_count_estimated ? '~' : ''}${info.row_count.toLocaleString()}`} rows · {info.columns.length} cols</span>
             </button>
             {open === table && (
               <div style={{ borderTop: '1px solid #e2e6f0', padding: '12px 16px', background: '#fafbfd', display: 'flex', flexWrap: 'wrap', gap: 8 }}>
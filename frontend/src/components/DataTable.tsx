@@ -1,23 +1,136 @@
 'use client'
-import { useState, useMemo } from 'react'
+import { useState, useMemo, useEffect } from 'react'
+import type { DBConfig } from '@/types'
 
 type Props = {
   columns: string[] | null
   data: Record<string, any>[] | null
   totalRows: number | null
+  truncated?: boolean
+  // When both are set and the result was capped, the full result can be streamed in
+  dbConfig?: DBConfig
+  sql?: string | null
+  // Server-side handle for paging past the rows included in the response
+  resultId?: string | null
 }
 
 
 const PAGE_SIZE = 10
+const STREAM_MAX_ROWS = 100000
 
-export default function DataTable({ columns, data, totalRows }: Props) {
+export default function DataTable({ columns, data, totalRows, truncated = false, dbConfig, sql, resultId }: Props) {
   const [search, setSearch] = useState('')
   const [page, setPage] = useState(0)
+  const [streamed, setStreamed] = useState<Record<string, any>[] | null>(null)
+  const [streaming, setStreaming] = useState(false)
+  const [streamError, setStreamError] = useState<string | null>(null)
+  const [remote, setRemote] = useState<{ page: number; rows: Record<string, any>[] } | null>(null)
+  const [remoteStatus, setRemoteStatus] = useState<string | null>(null)
+  const [retry, setRetry] = useState(0)
 
   // Guard: data can be null in chat/rag modes
-  const safeData = data ?? []
+  const safeData = streamed ?? data ?? []
   const safeColumns = columns ?? []
   const safeTotalRows = totalRows ?? 0
+  const canLoadAll = !!dbConfig && !!sql && !streamed && (truncated || safeTotalRows > (data?.length ?? 0))
+  // Pages beyond the rows we have are served from the stored result (/api/results/{id})
+  const serverPaging = !!resultId && !streamed && !search.trim() && safeTotalRows > safeData.length
+  const needsRemote = serverPaging && (page + 1) * PAGE_SIZE > safeData.length
+
+  useEffect(() => {
+    if (!needsRemote) return
+    let cancelled = false
+    fetch(`/api/results/${resultId}?offset=${page * PAGE_SIZE}&limit=${PAGE_SIZE}`, {
+      headers: { 'ngrok-skip-browser-warning': 'true' },
+    })
+      .then(res => res.json().then(json => ({ ok: res.ok, json })))
+      .then(({ ok, json }) => {
+        if (cancelled) return
+        if (!ok) {
+          setRemoteStatus(json.detail || 'Page unavailable')
+        } else if (json.status === 'materializing') {
+          // Full result is still being written server-side — poll until it is ready
+          setRemoteStatus('Preparing the full result…')
+          setTimeout(() => setRetry(r => r + 1), 1500)
+        } else {
+          setRemote({ page, rows: json.data })
+          setRemoteStatus(json.status === 'failed' ? json.error : null)
+        }
+      })
+      .catch(() => { if (!cancelled) setRemoteStatus('Page unavailable') })
+    return () => { cancelled = true }
+  }, [needsRemote, resultId, page, retry])
+
+  // Downloads the complete (uncapped) result as CSV from the export endpoint
+  const exportCsv = async () => {
+    setStreamError(null)
+    try {
+      const res = await fetch('/api/export', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'ngrok-skip-browser-warning': 'true' },
+        body: JSON.stringify({ db_config: dbConfig, sql, format: 'csv' }),
+      })
+      if (!res.ok) {
+        const json = await res.json().catch(() => ({}))
+        throw new Error(typeof json.detail === 'string' ? json.detail : json.detail?.message || 'Export failed')
+      }
+      const url = URL.createObjectURL(await res.blob())
+      const link = document.createElement('a')
+      link.href = url
+      link.download = 'query_result.csv'
+      link.click()
+      URL.revokeObjectURL(url)
+    } catch (e: any) {
+      setStreamError(e.message || 'Export failed')
+    }
+  }
+
+  // Streams the complete result as NDJSON and renders rows as each batch arrives
+  const loadAll = async () => {
+    setStreaming(true)
+    setStreamError(null)
+    const rows: Record<string, any>[] = []
+    try {
+      const res = await fetch('/api/query/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'ngrok-skip-browser-warning': 'true' },
+        body: JSON.stringify({ db_config: dbConfig, sql, format: 'ndjson', max_rows: STREAM_MAX_ROWS }),
+      })
+      if (!res.ok || !res.body) {
+        const json = await res.json().catch(() => ({}))
+        throw new Error(typeof json.detail === 'string' ? json.detail : json.detail?.message || 'Streaming failed')
+      }
+      const reader = res.body.getReader()
+      const decoder = new TextDecoder()
+      let buffered = ''
+      let cols = safeColumns
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffered += decoder.decode(value, { stream: true })
+        const lines = buffered.split('\n')
+        buffered = lines.pop() ?? ''
+        for (const line of lines) {
+          if (!line) continue
+          const msg = JSON.parse(line)
+          if (Array.isArray(msg)) {
+            const row: Record<string, any> = {}
+            cols.forEach((c, i) => { row[c] = msg[i] })
+            rows.push(row)
+          } else if (msg.type === 'columns') {
+            cols = msg.columns
+          } else if (msg.type === 'error') {
+            throw new Error(msg.message)
+          }
+        }
+        setStreamed(rows.slice())
+      }
+    } catch (e: any) {
+      setStreamError(e.message || 'Streaming failed')
+    } finally {
+      setStreaming(false)
+    }
+  }
 
   const filtered = useMemo(() => {
     if (!search.trim()) return safeData
@@ -30,11 +143,14 @@ export default function DataTable({ columns, data, totalRows }: Props) {
   // Don't render table at all if there's no data
   if (safeData.length === 0 || safeColumns.length === 0) return null
 
-  const pageData = filtered.slice(page * PAGE_SIZE, (page + 1) * PAGE_SIZE)
-  const totalPages = Math.ceil(filtered.length / PAGE_SIZE)
+  const rowCount = serverPaging ? safeTotalRows : filtered.length
+  const pageData = needsRemote
+    ? (remote?.page === page ? remote.rows : [])
+    : filtered.slice(page * PAGE_SIZE, (page + 1) * PAGE_SIZE)
+  const totalPages = Math.ceil(rowCount / PAGE_SIZE)
 
   const start = page * PAGE_SIZE + 1
-  const end = Math.min((page + 1) * PAGE_SIZE, filtered.length)
+  const end = Math.min((page + 1) * PAGE_SIZE, rowCount)
 
 
   return (
@@ -50,8 +166,15 @@ export default function DataTable({ columns, data, totalRows }: Props) {
             <ellipse cx="12" cy="5" rx="9" ry="3" /><path d="M21 12c0 1.66-4 3-9 3s-9-1.34-9-3" />
             <path d="M3 5v14c0 1.66 4 3 9 3s9-1.34 9-3V5" />
           </svg>
-          {start}–{end} of {filtered.length} results
-          {filtered.length < safeTotalRows && <span>(filtered from {safeTotalRows})</span>}
+          {start}–{end} of {rowCount} results
+          {rowCount < safeTotalRows && <span>(filtered from {safeTotalRows}{truncated ? '+' : ''})</span>}
+          {(canLoadAll || streaming) && (
+            <button onClick={loadAll} disabled={streaming} style={pgBtn}>
+              {streaming ? `Loading… ${safeData.length.toLocaleString()} rows` : 'Load all rows'}
+            </button>
+          )}
+          {dbConfig && sql && <button onClick={exportCsv} style={pgBtn}>Export CSV</button>}
+          {streamError && <span style={{ color: '#f43f5e' }}>{streamError}</span>}
         </div>
       </div>
 
@@ -93,7 +216,7 @@ export default function DataTable({ columns, data, totalRows }: Props) {
             {pageData.length === 0 ? (
               <tr>
                 <td colSpan={safeColumns.length} style={{ padding: '32px', textAlign: 'center', color: '#8b92a9', fontSize: 14 }}>
-                  No results found
+                  {needsRemote ? (remoteStatus ?? 'Loading…') : 'No results found'}
                 </td>
               </tr>
             ) : pageData.map((row, i) => (
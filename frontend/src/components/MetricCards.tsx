@@ -61,6 +61,8 @@ export default function MetricCards({ metrics }: { metrics: any }) {
 
   const h = metrics.kpis?.headline
   const total = metrics.kpis?.total_rows ?? 0
+  // Average / max / min are computed over the fetched rows only when the result was capped
+  const sampleNote = metrics.sampled ? ` · first ${Number(metrics.sample_rows ?? 0).toLocaleString()} rows` : ''
 
   const fmt = (v: number | undefined) => {
     if (v === undefined || v === null) return '—'
@@ -115,7 +117,7 @@ export default function MetricCards({ metrics }: { metrics: any }) {
           </div>
           <div style={{ display: 'flex', alignItems: 'center', gap: 6, fontSize: 11, color: '#8b92a9', marginBottom: 12 }}>
             <span style={{ width: 6, height: 6, borderRadius: '50%', background: card.color, display: 'inline-block' }} />
-            {card.sub}
+            {card.sub}{card.key === 'total_rows' ? '' : sampleNote}
           </div>
           <div style={{ height: 3, borderRadius: 2, background: '#f0f2f8' }}>
             <div style={{ height: '100%', borderRadius: 2, background: card.barColor, width: `${card.pct}%`, transition: 'width 1s ease' }} />
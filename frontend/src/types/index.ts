@@ -20,6 +20,16 @@ export interface ChartConfig {
   options?: any
 }
 
+// /api/query "data" when requested with result_format: 'columnar' — one entry per
+// column (aligned with `columns`), either plain values or dictionary-encoded text
+export type ColumnarColumn = { values: any[] } | { dictionary: (string | null)[]; codes: number[] }
+
+export interface ColumnarData {
+  format: 'columnar'
+  row_count: number
+  columns: ColumnarColumn[]
+}
+
 export interface QueryResult {
   // v2 fields — always present
   mode: 'chat' | 'sql' | 'rag' | 'hybrid'
@@ -29,10 +39,18 @@ export interface QueryResult {
   columns: string[] | null
   data: Record<string, any>[] | null
   total_rows: number | null
+  // true when the result had more rows than the backend fetch cap (total_rows is a lower bound)
+  truncated?: boolean | null
   metrics: Metric[] | null
   chart_config: ChartConfig | null
   insights: string[] | null
   suggestions: string[] | null
+  // Pipeline diagnostics (schema pruning, caches, timings) — informational only
+  meta?: Record<string, any> | null
+  // Handle for paging the full result via /api/results/{id}
+  result_id?: string | null
+  // Set when the query guard rejected or timed out the SQL (answer explains why)
+  error?: { type: 'query_rejected' | 'query_timeout'; message: string; details?: Record<string, any> } | null
 }
 
 export interface Message {